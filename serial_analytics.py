@@ -0,0 +1,432 @@
+"""Offline analysis of serial_transmission.log.
+
+Grepping a multi-GB log for gaps, weight excursions or error bursts reads
+and parses all of it for every question. Instead, build_index() reads the
+log once and writes a columnar index next to it (<log>.idx/), one raw
+array file per column:
+
+    time       float64  seconds since the epoch (millisecond resolution)
+    direction  uint8    RX, TX (capture file codes) or OTHER
+    level      uint8    index into LEVELS
+    weight     float64  decoded weight of '=' frames, NaN for other lines
+    bytes      uint32   frame size in bytes, 0 for other lines
+
+plus index.json with the row count and where parsing stopped. Parsing is
+streamed, with columns written out every CHUNK_ROWS lines, so memory does
+not grow with the log. Run it again after the log grew and only the new
+lines are parsed. If the log was rotated or rewritten, the index is
+rebuilt.
+
+LogIndex memory-maps the columns and answers queries with vectorized
+NumPy operations: frame rate over time, inter-frame gap histogram, errors
+per hour and weight statistics. NumPy is imported only by the queries and
+is not needed to build the index. The packaged app leaves it out, so the
+queries run from a Python install with NumPy:
+
+    python serial_analytics.py serial_transmission.log summary
+    python serial_analytics.py serial_transmission.log rate --bucket 60 --direction received
+    python serial_analytics.py serial_transmission.log gaps --direction sent
+    python serial_analytics.py serial_transmission.log errors
+    python serial_analytics.py serial_transmission.log weights --below 0 --above 5000
+
+Every query prints JSON and accepts --since/--until ("YYYY-MM-DD HH:MM:SS").
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from array import array
+
+from serial_capture import RX, TX
+from serial_framing import decode_weight
+from serial_logging import LOG_FILE
+
+OTHER = 2
+DIRECTIONS = {"received": RX, "sent": TX, "other": OTHER}
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+ERROR_LEVEL = LEVELS.index("ERROR")
+INDEX_VERSION = 1
+CHUNK_ROWS = 1 << 16
+HEAD_BYTES = 4096  # start of the log kept in the index, to notice a rotated or rewritten log
+
+# column -> (array typecode used while parsing, NumPy dtype used to map it)
+_ENDIAN = "<" if sys.byteorder == "little" else ">"
+COLUMNS = {
+    "time": ("d", _ENDIAN + "f8"),
+    "direction": ("B", "u1"),
+    "level": ("B", "u1"),
+    "weight": ("d", _ENDIAN + "f8"),
+    "bytes": ("I", _ENDIAN + "u4"),
+}
+GAP_BINS_MS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 60000, math.inf)
+
+_LEVEL_CODES = {name.encode(): code for code, name in enumerate(LEVELS)}
+_FRAME_PREFIXES = ((b"Sent: '", TX), (b"Sent command: '", TX), (b"Received: '", RX))
+
+
+class AnalyticsError(ValueError):
+    """A log that cannot be indexed, a missing index, or NumPy not installed"""
+
+
+def index_path(log_path):
+    return log_path + ".idx"
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise AnalyticsError("log queries need NumPy (pip install numpy); building the index does not") from None
+    return numpy
+
+
+def parse_line(line):
+    """(direction, level, weight, bytes) of one log line without its timestamp, or None if it is not a log line"""
+    # b"2024-01-02 03:04:05,678 - INFO - [port] Sent: '=654321' (7 bytes)"
+    level, separator, message = line[26:].partition(b" - ")
+    if not separator or line[23:26] != b" - ":
+        return None
+    level_code = _LEVEL_CODES.get(level)
+    if level_code is None:
+        return None
+    if message[:1] == b"[":
+        end = message.find(b"] ")
+        if end > 0:
+            message = message[end + 2:]  # session name
+    for prefix, direction in _FRAME_PREFIXES:
+        if message.startswith(prefix):
+            break
+    else:
+        return OTHER, level_code, math.nan, 0
+    size = 0
+    count_at = message.rfind(b" (")
+    if count_at > 0:
+        count = message[count_at + 2:].split(b" ", 1)[0]
+        if count.isdigit():
+            size = int(count)
+    weight = math.nan
+    weight_at = message.rfind(b", weight ")
+    if weight_at > 0:
+        try:
+            weight = float(message[weight_at + 9:])
+        except ValueError:
+            pass
+    elif message[len(prefix):len(prefix) + 1] == b"=":
+        text_end = message.find(b"'", len(prefix))
+        value = decode_weight(message[len(prefix):text_end])
+        if value is not None:
+            weight = float(value)
+    return direction, level_code, weight, size
+
+
+def build_index(log_path):
+    """Index the log, or only the lines added since the last call. Returns the index metadata"""
+    directory = index_path(log_path)
+    try:
+        size = os.path.getsize(log_path)
+        with open(log_path, "rb") as f:
+            head = f.read(HEAD_BYTES)
+    except OSError as e:
+        raise AnalyticsError(f"cannot read {log_path}: {e}") from None
+
+    meta = _read_meta(directory)
+    if meta and not _same_log(meta, size, head):
+        meta = None  # rotated or rewritten: start over
+    if meta is None:
+        os.makedirs(directory, exist_ok=True)
+        meta = {"version": INDEX_VERSION, "source": os.path.abspath(log_path), "parsed_bytes": 0, "rows": 0,
+                "head": "", "columns": {name: dtype for name, (_, dtype) in COLUMNS.items()},
+                "levels": LEVELS, "directions": DIRECTIONS}
+        mode = "wb"
+    else:
+        mode = "ab"
+    meta["head"] = head.decode("latin-1")
+
+    files = {name: open(os.path.join(directory, name), mode) for name in COLUMNS}
+    try:
+        # An append must line up with the rows already there, even if a previous run was interrupted
+        for name, f in files.items():
+            f.truncate(meta["rows"] * array(COLUMNS[name][0]).itemsize)
+            f.seek(0, os.SEEK_END)
+        parsed, rows = _parse_into(log_path, meta["parsed_bytes"], files)
+    finally:
+        for f in files.values():
+            f.close()
+    meta["parsed_bytes"] += parsed
+    meta["rows"] += rows
+    meta["indexed_at"] = round(time.time(), 3)
+    with open(os.path.join(directory, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=1)
+    return meta
+
+
+def _same_log(meta, size, head):
+    """True if the log is the one indexed, possibly grown since"""
+    if meta.get("version") != INDEX_VERSION or size < meta["parsed_bytes"]:
+        return False
+    indexed_head = meta["head"].encode("latin-1")
+    common = min(len(head), len(indexed_head))
+    return head[:common] == indexed_head[:common]
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, "index.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _parse_into(log_path, offset, files):
+    """Append the columns of the complete lines after offset. Returns (bytes parsed, rows added)"""
+    columns = {name: array(typecode) for name, (typecode, _) in COLUMNS.items()}
+    times, directions, levels, weights, sizes = (columns[name] for name in COLUMNS)
+    minute_text = None
+    minute_seconds = 0.0
+    parsed = 0
+    rows = 0
+    with open(log_path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # still being written; parsed on the next run
+            parsed += len(line)
+            fields = parse_line(line.rstrip(b"\r\n"))
+            if fields is None:
+                continue  # continuation of a multi-line message
+            # Parse each distinct minute once; clock changes (DST) happen on whole minutes
+            minute = line[:16]
+            if minute != minute_text:
+                try:
+                    minute_seconds = time.mktime(time.strptime(minute.decode("ascii"), "%Y-%m-%d %H:%M"))
+                except ValueError:
+                    continue
+                minute_text = minute
+            seconds = line[17:19]
+            milliseconds = line[20:23]
+            if not (seconds.isdigit() and milliseconds.isdigit()):
+                continue
+            times.append(minute_seconds + int(seconds) + int(milliseconds) / 1000.0)
+            direction, level, weight, size = fields
+            directions.append(direction)
+            levels.append(level)
+            weights.append(weight)
+            sizes.append(size)
+            rows += 1
+            if len(times) >= CHUNK_ROWS:
+                _flush_columns(columns, files)
+    _flush_columns(columns, files)
+    return parsed, rows
+
+
+def _flush_columns(columns, files):
+    for name, values in columns.items():
+        values.tofile(files[name])
+        del values[:]
+
+
+class LogIndex:
+    """Memory-mapped columns of an indexed log and the queries over them"""
+
+    def __init__(self, log_path):
+        np = _numpy()
+        directory = index_path(log_path)
+        self.meta = _read_meta(directory)
+        if self.meta is None:
+            raise AnalyticsError(f"no index for {log_path}, build it first")
+        self.np = np
+        rows = self.meta["rows"]
+        self.columns = {}
+        for name, dtype in self.meta["columns"].items():
+            if rows:
+                self.columns[name] = np.memmap(os.path.join(directory, name), dtype=dtype, mode="r", shape=(rows,))
+            else:
+                self.columns[name] = np.zeros(0, dtype=dtype)
+        self.mask = None
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def select(self, since=None, until=None):
+        """Restrict the following queries to since <= time < until (seconds since the epoch)"""
+        times = self.columns["time"]
+        self.mask = None
+        if since is not None or until is not None:
+            # Log lines are written in time order, so the window is a slice found by binary search
+            start = int(self.np.searchsorted(times, since, "left")) if since is not None else 0
+            end = int(self.np.searchsorted(times, until, "left")) if until is not None else len(times)
+            self.mask = slice(start, end)
+        return self
+
+    def _column(self, name):
+        column = self.columns[name]
+        return column if self.mask is None else column[self.mask]
+
+    def _frames(self, direction):
+        """Boolean mask of frame rows in one direction (None = both)"""
+        directions = self._column("direction")
+        if direction is None:
+            return directions != OTHER
+        return directions == DIRECTIONS[direction]
+
+    def summary(self):
+        """Rows, time span, frames each way and lines per level"""
+        np = self.np
+        times = self._column("time")
+        directions = self._column("direction")
+        levels = self._column("level")
+        counts = np.bincount(directions, minlength=len(DIRECTIONS))
+        per_level = np.bincount(levels, minlength=len(LEVELS))
+        span = float(times[-1] - times[0]) if len(times) else 0.0
+        return {
+            "rows": int(len(times)),
+            "first": _stamp(times[0]) if len(times) else None,
+            "last": _stamp(times[-1]) if len(times) else None,
+            "span_s": round(span, 3),
+            "received_frames": int(counts[RX]),
+            "sent_frames": int(counts[TX]),
+            "other_lines": int(counts[OTHER]),
+            "bytes": int(self._column("bytes").sum(dtype=np.uint64)),
+            "levels": {name: int(per_level[code]) for code, name in enumerate(LEVELS) if per_level[code]},
+            "indexed_bytes": self.meta["parsed_bytes"]
+        }
+
+    def rate(self, bucket=60.0, direction=None):
+        """Frames per bucket of seconds: [{"start", "frames", "frames_per_s"}], empty buckets included"""
+        np = self.np
+        times = self._column("time")[self._frames(direction)]
+        if not len(times):
+            return []
+        first = math.floor(times[0] / bucket) * bucket
+        counts = np.bincount(((times - first) // bucket).astype(np.int64))
+        return [{"start": _stamp(first + index * bucket), "frames": int(count),
+                 "frames_per_s": round(count / bucket, 3)} for index, count in enumerate(counts)]
+
+    def gaps(self, direction=None, largest=10):
+        """Histogram of the time between consecutive frames, in ms, and the largest gaps with where they start"""
+        np = self.np
+        times = self._column("time")[self._frames(direction)]
+        if len(times) < 2:
+            return {"frames": int(len(times)), "histogram": [], "largest": []}
+        gaps = np.round(np.diff(times) * 1000.0, 3)  # log times are whole milliseconds
+        counts, _ = np.histogram(gaps, bins=np.array(GAP_BINS_MS, dtype=float))
+        histogram = [{"from_ms": GAP_BINS_MS[index], "to_ms": GAP_BINS_MS[index + 1] if index + 2 < len(GAP_BINS_MS)
+                      else None, "count": int(count)} for index, count in enumerate(counts) if count]
+        top = min(largest, len(gaps))
+        indices = np.argpartition(gaps, -top)[-top:]
+        indices = indices[np.argsort(gaps[indices])[::-1]]
+        percentiles = np.percentile(gaps, [50, 99])
+        return {
+            "frames": int(len(times)),
+            "p50_ms": round(float(percentiles[0]), 3),
+            "p99_ms": round(float(percentiles[1]), 3),
+            "max_ms": round(float(gaps.max()), 3),
+            "histogram": histogram,
+            "largest": [{"after": _stamp(times[index]), "gap_ms": round(float(gaps[index]), 3)} for index in indices]
+        }
+
+    def errors_per_hour(self, min_level=ERROR_LEVEL):
+        """ERROR and CRITICAL lines per local clock hour, hours without errors left out"""
+        np = self.np
+        times = self._column("time")[self._column("level") >= min_level]
+        if not len(times):
+            return []
+        offset = time.localtime(float(times[0])).tm_gmtoff  # so buckets start on the local hour
+        hours, counts = np.unique(((times + offset) // 3600).astype(np.int64), return_counts=True)
+        return [{"hour": _stamp(hour * 3600 - offset)[:13] + ":00", "errors": int(count)}
+                for hour, count in zip(hours, counts)]
+
+    def weights(self, direction=None, below=None, above=None):
+        """min/max/mean/std of the decoded weights, and frames outside [below, above] if given"""
+        np = self.np
+        mask = self._frames(direction)
+        weights = self._column("weight")[mask]
+        valid = ~np.isnan(weights)
+        values = weights[valid]
+        if not len(values):
+            return {"frames": 0}
+        result = {
+            "frames": int(len(values)),
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "mean": round(float(values.mean()), 3),
+            "std": round(float(values.std()), 3)
+        }
+        if below is not None or above is not None:
+            outside = np.zeros(len(values), dtype=bool)
+            if below is not None:
+                outside |= values < below
+            if above is not None:
+                outside |= values > above
+            times = self._column("time")[mask][valid][outside]
+            result["excursions"] = int(outside.sum())
+            if len(times):
+                result["first_excursion"] = _stamp(times[0])
+                result["last_excursion"] = _stamp(times[-1])
+        return result
+
+
+def _stamp(seconds):
+    """Log-style local time with milliseconds"""
+    seconds = float(seconds)
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seconds)) + f",{int(round(seconds * 1000)) % 1000:03d}"
+
+
+def _parse_time(text):
+    try:
+        return time.mktime(time.strptime(text, "%Y-%m-%d %H:%M:%S"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected 'YYYY-MM-DD HH:MM:SS', got '{text}'") from None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="serial_analytics", description="Index and query a serial log file")
+    parser.add_argument("log", nargs="?", default=LOG_FILE)
+    parser.add_argument("query", nargs="?", default="summary", choices=["index", "summary", "rate", "gaps",
+                                                                        "errors", "weights"])
+    parser.add_argument("--since", type=_parse_time, default=None, metavar="TIME")
+    parser.add_argument("--until", type=_parse_time, default=None, metavar="TIME")
+    parser.add_argument("--direction", choices=list(DIRECTIONS)[:2], default=None,
+                        help="rate, gaps, weights: only frames sent or received (default both)")
+    parser.add_argument("--bucket", type=float, default=60.0, metavar="SECONDS", help="rate: bucket size")
+    parser.add_argument("--largest", type=int, default=10, metavar="N", help="gaps: list the N largest")
+    parser.add_argument("--below", type=float, default=None, help="weights: count weights below this")
+    parser.add_argument("--above", type=float, default=None, help="weights: count weights above this")
+    parser.add_argument("--no-update", action="store_true", help="query the index as it is, without parsing new lines")
+    args = parser.parse_args(argv)
+    if args.bucket <= 0:
+        parser.error("--bucket must be positive")
+
+    try:
+        if not args.no_update or not os.path.isdir(index_path(args.log)):
+            start = time.perf_counter()
+            before = (_read_meta(index_path(args.log)) or {}).get("rows", 0)
+            meta = build_index(args.log)
+            print(f"Indexed {meta['rows'] - before} new lines ({meta['rows']} total) "
+                  f"in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+        if args.query == "index":
+            return 0
+        start = time.perf_counter()
+        index = LogIndex(args.log).select(args.since, args.until)
+        if args.query == "summary":
+            result = index.summary()
+        elif args.query == "rate":
+            result = index.rate(args.bucket, args.direction)
+        elif args.query == "gaps":
+            result = index.gaps(args.direction, args.largest)
+        elif args.query == "errors":
+            result = index.errors_per_hour()
+        else:
+            result = index.weights(args.direction, args.below, args.above)
+        print(json.dumps(result, indent=2))
+        print(f"Query took {time.perf_counter() - start:.3f} s", file=sys.stderr)
+    except AnalyticsError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
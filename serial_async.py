@@ -0,0 +1,291 @@
+"""asyncio transport for the serial engine.
+
+AsyncSerialSession runs one SerialEngine session (transmit, receive or
+command mode) as a coroutine. Ports with a file descriptor (serial
+devices and socket:// on POSIX) are waited on with loop.add_reader and
+add_writer, so any number of sessions share the event loop's thread.
+Other ports (Windows COM ports, loop://) read in the loop's executor with
+a short timeout. Reads are always event driven; read_mode is not used.
+
+Stopping is cancellation: cancel the task running session.run() and the
+port is closed as soon as the task is resumed, not after a worker thread
+notices a flag. The awaitable API (write, read_line, command) is meant
+for scripted tests.
+
+LoopBridge runs an event loop on a background thread for callers that
+are not async themselves, such as the Tk GUI or the CLI.
+"""
+import asyncio
+import threading
+import time
+
+import serial
+
+from serial_engine import SerialEngine
+from serial_scheduler import RateScheduler
+
+# Read timeout for ports that have to be read in the executor
+EXECUTOR_READ_TIMEOUT = 0.05
+READ_SIZE = 4096
+
+
+class SerialTransport:
+    """Non-blocking reads and writes on an open pyserial port"""
+
+    def __init__(self, ser, loop=None):
+        self.ser = ser
+        self.loop = loop or asyncio.get_running_loop()
+        try:
+            self.fd = ser.fileno()
+        except Exception:
+            self.fd = None  # no descriptor: fall back to the executor
+        self.original_timeout = ser.timeout
+        ser.timeout = 0 if self.fd is not None else EXECUTOR_READ_TIMEOUT
+
+    async def _ready(self, add, remove):
+        """Wait until fd is readable (add_reader) or writable (add_writer)"""
+        future = self.loop.create_future()
+        add(self.fd, lambda: future.done() or future.set_result(None))
+        try:
+            await future
+        finally:
+            remove(self.fd)
+
+    async def read(self, size=READ_SIZE):
+        """Wait for data and return what has arrived (at least one byte)"""
+        if self.fd is None:
+            while True:
+                data = await self.loop.run_in_executor(None, self.ser.read, size)
+                if data:
+                    return data
+        while True:
+            data = self.ser.read(size)
+            if data:
+                return data
+            await self._ready(self.loop.add_reader, self.loop.remove_reader)
+
+    async def writable(self):
+        """Wait until the port can take more data"""
+        if self.fd is not None:
+            await self._ready(self.loop.add_writer, self.loop.remove_writer)
+
+    async def write(self, data):
+        """Write data once the port is writable. Returns bytes written"""
+        await self.writable()
+        written = self.ser.write(data)
+        self.ser.flush()
+        return written
+
+    def release(self):
+        """Give the port back with the timeout it had"""
+        try:
+            self.ser.timeout = self.original_timeout
+        except Exception:
+            pass
+
+
+class AsyncSerialSession:
+    """One port session driven by asyncio instead of worker threads"""
+
+    def __init__(self, settings=None, on_log=None, on_status=None, on_error=None):
+        self.engine = SerialEngine(settings, on_log=on_log, on_status=on_status, on_error=on_error)
+        self.settings = self.engine.settings
+        self.transport = None
+        self.line_buffer = bytearray()
+
+    def open(self):
+        """Open the port and capture. Returns True on success"""
+        if not self.engine.prepare():
+            return False
+        self.transport = SerialTransport(self.engine.ser)
+        return True
+
+    def close(self, message="Transmission/reception stopped by user."):
+        """Close the port and capture"""
+        engine = self.engine
+        if self.transport:
+            self.transport.release()
+            self.transport = None
+        if engine.is_open():
+            engine.close_serial_port()
+        engine.close_capture()
+        if message:
+            engine.log_message(message)
+        engine.set_running(False)
+
+    async def run(self, duration=None):
+        """Run the configured mode until cancelled or duration (seconds) has passed.
+
+        Command mode sends once and returns the response bytes.
+        """
+        if not self.transport and not self.open():
+            return None
+        mode = self.settings["mode"]
+        if mode == "command":
+            return await self.command()
+        try:
+            worker = self.transmit() if mode == "transmit" else self.receive()
+            if duration is None:
+                await worker
+            else:
+                try:
+                    await asyncio.wait_for(worker, duration)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.close()
+        return None
+
+    async def transmit(self):
+        """Send the payload at the configured rate (tx_batch frames per slot) until cancelled"""
+        engine = self.engine
+        engine.scheduler = scheduler = RateScheduler(self.settings["transmit_rate"],
+                                                     frames_per_slot=self.settings["tx_batch"])
+        engine.log_message("Transmission started.")
+        try:
+            while True:
+                if scheduler.period:
+                    delay = scheduler.next_deadline() - scheduler.clock()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                else:
+                    await self.transport.writable()
+                scheduler.take_slot()
+                engine.send_slot()
+        except serial.SerialException as e:
+            engine.serial_error(e)
+        finally:
+            engine.finish_writes()
+            engine.log_message(scheduler.summary())
+            engine.log_message(engine.write_summary())
+
+    async def receive(self):
+        """Log received lines until cancelled; a partial line is logged after inter_byte_timeout"""
+        engine = self.engine
+        idle = max(self.settings["inter_byte_timeout"], 1) / 1000.0
+        engine.log_message("Reception started.")
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(self.transport.read(), idle if engine.rx_buffer else None)
+                except asyncio.TimeoutError:
+                    engine.flush_partial()
+                    continue
+                engine.process_received(data)
+        except serial.SerialException as e:
+            engine.serial_error(e)
+        finally:
+            engine.flush_partial()
+
+    async def command(self):
+        """Send the selected command, collect the response for delay_time ms, then close
+        the port unless keep_port_open is set. Returns the response bytes"""
+        engine = self.engine
+        response = bytearray()
+        try:
+            engine.send_command()
+            deadline = time.monotonic() + self.settings["delay_time"] / 1000.0
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    data = await asyncio.wait_for(self.transport.read(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                response += data
+                engine.process_received(data)
+            engine.flush_partial()
+        except asyncio.CancelledError:
+            self.close()
+            raise
+        except Exception as e:
+            engine.log_message(f"Failed to send command: {e}", "ERROR")
+            self.close("Command sent and port closed after delay.")
+            return None
+        if self.settings["keep_port_open"]:
+            engine.log_message("Port kept open as requested.")
+            engine.set_running(False)
+        else:
+            self.close("Command sent and port closed after delay.")
+        return bytes(response)
+
+    # --- awaitable API for scripted tests ---------------------------------
+
+    async def write(self, data):
+        """Write raw bytes. Returns bytes written"""
+        if not self.transport and not self.open():
+            raise serial.SerialException(f"could not open {self.settings['com_port']}")
+        return await self.transport.write(data)
+
+    async def read_line(self, timeout=None):
+        """Next complete line (including the newline); raises asyncio.TimeoutError.
+
+        Not for use while run() is receiving on the same session.
+        """
+        if not self.transport and not self.open():
+            raise serial.SerialException(f"could not open {self.settings['com_port']}")
+
+        async def next_line():
+            buffer = self.line_buffer
+            end = buffer.find(b"\n")
+            while end < 0:
+                start = len(buffer)
+                buffer += await self.transport.read()
+                end = buffer.find(b"\n", start)
+            line = bytes(buffer[:end + 1])
+            del buffer[:end + 1]
+            return line
+
+        return await asyncio.wait_for(next_line(), timeout)
+
+
+class LoopBridge:
+    """An asyncio event loop on a daemon thread, driven from synchronous code"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="serial-asyncio", daemon=True)
+        self.thread.start()
+        self.tasks = {}
+
+    def submit(self, coroutine):
+        """Schedule a coroutine on the loop, returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call(self, function, *args):
+        """Run a plain function on the loop thread and return its result"""
+        async def wrapper():
+            return function(*args)
+        return self.submit(wrapper()).result()
+
+    def start_session(self, session, duration=None):
+        """Open the session's port and run it on the loop. Returns True if the port opened"""
+        if not self.call(session.open):
+            return False
+        self.tasks[session] = self.call(self.loop.create_task, session.run(duration))
+        return True
+
+    def stop_session(self, session, timeout=2.0):
+        """Cancel a running session and wait until its port is closed"""
+        task = self.tasks.pop(session, None)
+        if task is None:
+            return
+        self.loop.call_soon_threadsafe(task.cancel)
+        try:
+            self.submit(asyncio.wait([task])).result(timeout)
+        except Exception:
+            pass
+
+    def close(self):
+        """Stop every session and the loop"""
+        for session in list(self.tasks):
+            self.stop_session(session)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(2.0)
+        self.loop.close()
+
+
+async def run_sessions(sessions, duration=None):
+    """Run several sessions on the current loop; returns their results in order"""
+    return await asyncio.gather(*(session.run(duration) for session in sessions))
@@ -0,0 +1,89 @@
+"""Batched transmit writes.
+
+Unbatched, every frame costs one ser.write() and one ser.flush(). On
+POSIX pyserial's write() is an os.write() plus a select() on the port,
+and flush() is tcdrain(), which blocks until the UART has shifted out
+every byte. That adds up to three syscalls and a wait for the line per
+frame.
+
+With tx_batch N, transmit mode writes N frames with one ser.write(), and
+tx_flush_every M flushes after every M writes (0 = only when the run
+ends). The bytes of a batch are put together without per-frame work:
+    - a constant payload is repeated once, when the batcher is built, and
+      the same bytes object is written every time
+    - waveform frames are joined from their prebuilt bytes with one
+      b"".join() over a slice of the frame table, all C-level; a batch
+      that runs past the end of the table wraps around to its start, so
+      the table is never copied however long it is
+
+pyserial converts bytearray and memoryview arguments to bytes before
+writing. So a reused bytearray, or a list of memoryviews, would cost one
+more copy than passing bytes.
+
+thread_write_syscalls() reads the write syscalls made by one thread from
+/proc (Linux). The engine uses it to report measured write syscalls per
+frame next to its own count of write() and flush() calls.
+"""
+
+from operator import attrgetter
+
+# Offered in the GUI
+BATCH_SIZES = [1, 8, 32, 128, 512]
+FLUSH_INTERVALS = [1, 8, 64, "end"]
+
+
+_DATA = attrgetter("data")
+
+
+class FrameBatcher:
+    """The bytes and payloads of the next frames_per_write frames"""
+
+    def __init__(self, frames_per_write, table=(), payload=None):
+        self.count = frames_per_write
+        self.length = len(table)
+        if table:
+            self.frames = table
+            self.constant = None
+        else:
+            self.constant = (payload.data * frames_per_write, (payload,) * frames_per_write)
+
+    def batch(self, index):
+        """(data, payloads) of the batch starting at frame table index; index is ignored for a constant payload"""
+        if self.constant:
+            return self.constant
+        end = index + self.count
+        frames = self.frames
+        if end > self.length:
+            # Wrap around: the rest of the table, whole tables, then the start of the table
+            rest = end - self.length
+            frames = frames[index:] + frames * (rest // self.length) + frames[:rest % self.length]
+        else:
+            frames = frames[index:end]
+        return b"".join(map(_DATA, frames)), frames
+
+    def next_index(self, index):
+        """Table index of the frame after the batch starting at index"""
+        return (index + self.count) % self.length if self.length else 0
+
+
+def complete_frames(payloads, written):
+    """How many of payloads fit entirely in the first written bytes"""
+    count = 0
+    for payload in payloads:
+        written -= len(payload.data)
+        if written < 0:
+            break
+        count += 1
+    return count
+
+
+def thread_write_syscalls(native_id):
+    """write() syscalls made so far by the thread with this native id, or None where /proc has no count"""
+    try:
+        with open(f"/proc/self/task/{native_id}/io", "rb") as f:
+            for line in f:
+                if line.startswith(b"syscw:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
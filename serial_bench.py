@@ -0,0 +1,1099 @@
+"""Benchmarks for the serial engine that need no hardware.
+
+A Linux pty pair (or pyserial's loop:// where ptys are unavailable) stands
+in for the device; open_close also uses socket:// against a local TCP
+listener. Run all benchmarks, or name the ones you want:
+
+    python serial_bench.py
+    python serial_bench.py receive_latency
+
+Each result is printed as one JSON object per line.
+
+--suite runs the regression suite (SUITE: max transmit rate, receive
+latency, GUI log ingestion, command round trip, port open/close).
+--output writes a report with the results and the environment they were
+measured in. --baseline compares the headline numbers (REGRESSION_CHECKS)
+with an earlier report and exits with 1 if one got worse by more than
+--tolerance:
+
+    python serial_bench.py --suite --output baseline.json
+    python serial_bench.py --suite --output current.json --baseline baseline.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import subprocess
+import logging
+import shutil
+import tempfile
+import selectors
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+import serial
+from serial.urlhandler import protocol_loop
+
+from serial_engine import SerialEngine, weight_payload
+from serial_waveform import compile_waveform, build_frame_table
+from serial_sessions import SessionManager
+from serial_async import AsyncSerialSession, LoopBridge
+from serial_pool import PortPool
+from serial_commands import CommandClient, run_commands
+from serial_scheduler import percentile
+from serial_capture import CaptureWriter, CaptureReader, RX
+from serial_replay import open_recording
+from serial_framing import make_framer, decode_weight
+from serial_metrics import MetricsSampler
+from serial_trace import Tracer, WRITE
+from serial_logging import configure_logging, shutdown_logging, LOG_FORMAT
+from serial_logview import LogSink, LogRingBuffer, DRAIN_INTERVAL_MS, MAX_BATCH
+from serial_discovery import PortDiscovery, probe_port
+from serial_analytics import build_index, index_path, LogIndex, AnalyticsError
+from serial_simulator import DeviceSimulator, SimulatorError
+from serial_loopback import LoopbackTest, HEADER_SIZE
+
+
+def open_pty_pair():
+    """Open a raw pty pair, returns (master_fd, slave_fd, slave_path) or None if unsupported"""
+    try:
+        import pty
+        import tty
+    except ImportError:
+        return None
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(master_fd)
+    return master_fd, slave_fd, os.ttyname(slave_fd)
+
+
+def close_pty_pair(pair):
+    """Close both ends of a pair from open_pty_pair() (None: nothing to close)"""
+    if pair:
+        os.close(pair[0])
+        os.close(pair[1])
+
+
+@contextmanager
+def bench_engine(settings, drain=True, start=True, **kwargs):
+    """A SerialEngine with settings on a fresh pty, or loop:// where there are no ptys.
+
+    Yields (engine, pair), pair being None on loop://. drain discards what the
+    engine writes; start=False only prepares the engine instead of starting it.
+    On exit the engine is stopped (or its port closed) and the pty closed.
+    """
+    pair = open_pty_pair()
+    port = pair[2] if pair else "loop://"
+    if pair and drain:
+        start_drain(pair[0])
+    engine = SerialEngine(dict(settings, com_port=port), **kwargs)
+    if not (engine.start() if start else engine.prepare()):
+        close_pty_pair(pair)
+        raise RuntimeError(f"could not open {port}")
+    try:
+        yield engine, pair
+    finally:
+        if start:
+            engine.stop()
+        else:
+            engine.close_serial_port()
+        close_pty_pair(pair)
+
+
+def open_socket_device():
+    """Listen on a free localhost TCP port as the 'device' for socket:// URLs.
+
+    Returns (url, close); accepted connections are held open until close().
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    connections = []
+
+    def accept():
+        while True:
+            try:
+                connections.append(server.accept()[0])
+            except OSError:
+                return  # server closed
+
+    thread = threading.Thread(target=accept, daemon=True)
+    thread.start()
+
+    def close():
+        server.close()
+        thread.join(1.0)
+        for connection in connections:
+            connection.close()
+
+    return f"socket://127.0.0.1:{server.getsockname()[1]}", close
+
+
+def summarize_ms(samples):
+    """p50/p99/max of a list of durations in seconds, in milliseconds"""
+    ordered = sorted(samples)
+    return {
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0
+    }
+
+
+def bench_receive_latency(read_mode="event", samples=200, framing="line", frame=b"=654321\n"):
+    """Time from a frame being written by the 'device' to the engine logging it"""
+    received = threading.Event()
+
+    def on_log(message, level):
+        if message.startswith("Received"):
+            received.set()
+
+    latencies = []
+    missed = 0
+    with bench_engine({"mode": "receive", "read_mode": read_mode, "rx_framing": framing},
+                      drain=False, on_log=on_log) as (engine, pair):
+        def device_write(frame):
+            if pair:
+                os.write(pair[0], frame)
+            else:
+                engine.ser.write(frame)
+
+        time.sleep(0.05)  # let the reader settle
+        for _ in range(samples):
+            received.clear()
+            start = time.perf_counter()
+            device_write(frame)
+            if received.wait(2.0):
+                latencies.append(time.perf_counter() - start)
+            else:
+                missed += 1
+
+    result = {"benchmark": "receive_latency", "read_mode": read_mode, "framing": framing,
+              "frame": frame.decode("ascii", "backslashreplace"), "transport": "pty" if pair else "loop", "samples": len(latencies), "missed": missed}
+    result.update(summarize_ms(latencies))
+    return result
+
+
+def start_drain(fd):
+    """Read and discard everything from fd on a daemon thread (the 'device' side of a pty)"""
+    def drain():
+        try:
+            while os.read(fd, 65536):
+                pass
+        except OSError:
+            pass
+    thread = threading.Thread(target=drain, daemon=True)
+    thread.start()
+    return thread
+
+
+def bench_transmit_rate(rate, seconds=2.0):
+    """Achieved rate, jitter and missed deadlines of transmit mode at a target rate"""
+    with bench_engine({"mode": "transmit", "transmit_rate": rate, "baud_rate": 921600}) as (engine, pair):
+        time.sleep(seconds)
+
+    result = {"benchmark": "transmit_rate", "transport": "pty" if pair else "loop"}
+    result.update(engine.scheduler.stats())
+    return result
+
+
+def bench_replay(speed, frames=1000, gap_ms=2.0):
+    """Timing fidelity of replaying a capture: recorded gaps of gap_ms, sent at the given speed"""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "replay.spcap")
+        with CaptureWriter(path) as writer:
+            first = time.monotonic_ns()
+            for number in range(frames):
+                writer.write(f"={number % 1000000:06d}\r\n".encode("ascii"), RX, "COM1",
+                             first + int(number * gap_ms * 1e6))
+        with bench_engine({"mode": "transmit", "baud_rate": 921600, "replay_file": path,
+                           "replay_speed": speed}) as (engine, pair):
+            engine.join()
+
+    result = {"benchmark": "replay", "transport": "pty" if pair else "loop", "gap_ms": gap_ms}
+    result.update(engine.replay_player.stats())
+    del result["recording"]
+    return result
+
+
+def bench_replay_reader(frames=1000000):
+    """Streaming read of a large capture and log: frames/s and peak Python memory"""
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        capture_path = os.path.join(folder, "big.spcap")
+        log_path = os.path.join(folder, "big.log")
+        with CaptureWriter(capture_path) as writer, open(log_path, "w", encoding="utf-8") as log:
+            for number in range(frames):
+                writer.write(b"=654321\r\n", RX, "COM1")
+                log.write(f"2026-01-01 12:{number // 60000 % 60:02d}:{number // 1000 % 60:02d},{number % 1000:03d}"
+                          f" - INFO - Received: '=654321' (9 bytes)\n")
+        for kind, path in (("capture", capture_path), ("log", log_path)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            count = sum(1 for _ in open_recording(path))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append({"benchmark": "replay_reader", "source": kind, "frames": count,
+                            "file_mib": round(os.path.getsize(path) / 2 ** 20, 1),
+                            "frames_per_s": round(count / elapsed), "peak_python_kib": round(peak / 1024, 1)})
+    return results
+
+
+def bench_log_index(lines=1000000):
+    """Log analytics: index build lines/s and peak memory, then query times vs scanning the log for one answer"""
+    with tempfile.TemporaryDirectory() as folder:
+        log_path = os.path.join(folder, "big.log")
+        with open(log_path, "w", encoding="utf-8") as log:
+            for number in range(lines):
+                stamp = f"2026-01-01 {number // 3600000 % 24:02d}:{number // 60000 % 60:02d}:{number // 1000 % 60:02d}"
+                if number % 50 == 0:
+                    log.write(f"{stamp},{number % 1000:03d} - ERROR - Serial error: write failed\n")
+                else:
+                    log.write(f"{stamp},{number % 1000:03d} - INFO - Received: '={number % 9973:06d}' (8 bytes)\n")
+        start = time.perf_counter()
+        build_index(log_path)
+        build_s = time.perf_counter() - start
+        # Again from scratch for the memory peak; tracemalloc slows it down too much to time
+        shutil.rmtree(index_path(log_path))
+        tracemalloc.start()
+        build_index(log_path)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result = {"benchmark": "log_index", "lines": lines, "file_mib": round(os.path.getsize(log_path) / 2 ** 20, 1),
+                  "build_lines_per_s": round(lines / build_s), "build_peak_python_kib": round(peak / 1024, 1)}
+        # The question a grep answers by reading everything: errors per hour
+        start = time.perf_counter()
+        hours = {}
+        with open(log_path, "rb") as f:
+            for line in f:
+                if b" - ERROR - " in line:
+                    hours[line[:13]] = hours.get(line[:13], 0) + 1
+        result["scan_errors_per_hour_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        try:
+            index = LogIndex(log_path)
+        except AnalyticsError as e:
+            result["queries"] = f"skipped: {e}"
+            return result
+        for name, query in (("summary", index.summary), ("rate", lambda: index.rate(60)), ("gaps", index.gaps),
+                            ("errors_per_hour", index.errors_per_hour), ("weights", index.weights)):
+            start = time.perf_counter()
+            query()
+            result[f"{name}_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        index = None  # release the maps before the folder is removed
+    return result
+
+
+def _split_lines(buffer, data):
+    """The receive path before framers: append, then find/slice/delete one line at a time"""
+    frames = []
+    buffer += data
+    end = buffer.find(b"\n")
+    while end >= 0:
+        frames.append(bytes(buffer[:end + 1]))
+        del buffer[:end + 1]
+        end = buffer.find(b"\n")
+    return frames
+
+
+def bench_framing(frames=200000, chunk=4096):
+    """Framing throughput on read-sized chunks, per framing, plus weight decoding"""
+    streams = {
+        "line": b"".join(b"=%06d\r\n" % (n % 1000000) for n in range(frames)),
+        "weight": b"".join(b"=%06d" % (n % 1000000) for n in range(frames)),
+        "stx": b"".join(b"\x02=%06d\x03" % (n % 1000000) for n in range(frames)),
+        "fixed:7": b"".join(b"=%06d" % (n % 1000000) for n in range(frames)),
+    }
+    results = []
+    for framing, stream in streams.items():
+        chunks = [stream[start:start + chunk] for start in range(0, len(stream), chunk)]
+        framer = make_framer(framing)
+        start = time.perf_counter()
+        count = 0
+        for data in chunks:
+            count += len(framer.feed(data))
+        elapsed = time.perf_counter() - start
+        result = {"benchmark": "framing", "framing": framing, "chunk_bytes": chunk, "frames": count,
+                  "frames_per_s": round(count / elapsed), "mib_per_s": round(len(stream) / elapsed / 2 ** 20, 1)}
+        if framing == "line":
+            buffer = bytearray()
+            start = time.perf_counter()
+            for data in chunks:
+                _split_lines(buffer, data)
+            result["old_line_split_frames_per_s"] = round(frames / (time.perf_counter() - start))
+        results.append(result)
+
+    weights = make_framer("weight").feed(streams["weight"])
+    start = time.perf_counter()
+    for frame in weights:
+        decode_weight(frame)
+    results.append({"benchmark": "framing", "framing": "decode_weight", "frames": len(weights),
+                    "ns_per_frame": round((time.perf_counter() - start) / len(weights) * 1e9, 1)})
+    return results
+
+
+def bench_metrics(frames=200000):
+    """Hot-path cost of the counters, and of sampling them at the GUI rate and far above it"""
+    class Counter:
+        value = 0
+
+    counter = Counter()
+    lock = threading.Lock()
+    start = time.perf_counter()
+    for _ in range(frames):
+        counter.value += 1
+    plain_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(frames):
+        with lock:
+            counter.value += 1
+    locked_time = time.perf_counter() - start
+    results = [{"benchmark": "metrics", "increment_ns": round(plain_time / frames * 1e9, 1),
+                "locked_increment_ns": round(locked_time / frames * 1e9, 1)}]
+
+    for sample_hz in (0, 2, 1000):
+        with bench_engine({"mode": "transmit", "transmit_rate": 0, "baud_rate": 921600},
+                          start=False) as (engine, pair):
+            sampler = MetricsSampler(engine.throughput)
+            done = threading.Event()
+            samples = []
+
+            def reader():
+                while not done.wait(1.0 / sample_hz):
+                    start = time.perf_counter()
+                    sampler.sample()
+                    samples.append(time.perf_counter() - start)
+
+            thread = threading.Thread(target=reader, daemon=True)
+            if sample_hz:
+                thread.start()
+            try:
+                start = time.perf_counter()
+                for _ in range(frames):
+                    engine.send_payload()
+                    if not pair and engine.tx_frames % 1024 == 0:
+                        engine.ser.reset_input_buffer()  # loop:// holds at most 4096 bytes
+                elapsed = time.perf_counter() - start
+            finally:
+                done.set()
+                if sample_hz:
+                    thread.join()
+        result = {"benchmark": "metrics", "transport": "pty" if pair else "loop", "sample_hz": sample_hz, "frames": frames,
+                  "send_payload_ns": round(elapsed / frames * 1e9, 1)}
+        if samples:
+            result["samples"] = len(samples)
+            result["sample_us"] = round(sum(samples) / len(samples) * 1e6, 1)
+        results.append(result)
+    return results
+
+
+def bench_trace(frames=200000):
+    """Cost of one traced stage, send cost with tracing off and on, and export time of a full buffer"""
+    tracer = Tracer()
+    clock = tracer.clock
+    start = time.perf_counter()
+    for _ in range(frames):
+        tracer.lap(WRITE, clock())
+    record_time = time.perf_counter() - start
+    results = [{"benchmark": "trace", "stage_ns": round(record_time / frames * 1e9, 1)}]
+
+    for traced in (False, True):
+        with bench_engine({"mode": "transmit", "transmit_rate": 0, "baud_rate": 921600},
+                          start=False) as (engine, pair):
+            engine.tracer = Tracer() if traced else None
+            start = time.perf_counter()
+            for _ in range(frames):
+                engine.send_payload()
+                if not pair and engine.tx_frames % 1024 == 0:
+                    engine.ser.reset_input_buffer()  # loop:// holds at most 4096 bytes
+            elapsed = time.perf_counter() - start
+        results.append({"benchmark": "trace", "transport": "pty" if pair else "loop", "traced": traced,
+                        "frames": frames, "send_payload_ns": round(elapsed / frames * 1e9, 1)})
+
+    # engine.tracer from the traced run holds 3 spans per frame, enough to wrap the buffer
+    directory = tempfile.mkdtemp()
+    for name in ("trace.json", "trace.folded"):
+        path = os.path.join(directory, name)
+        start = time.perf_counter()
+        spans = engine.tracer.save(path)
+        results.append({"benchmark": "trace", "export": name, "spans": spans,
+                        "export_s": round(time.perf_counter() - start, 3),
+                        "file_kib": round(os.path.getsize(path) / 1024, 1)})
+        os.remove(path)
+    os.rmdir(directory)
+    return results
+
+
+def bench_file_logging(seconds=1.5):
+    """Max transmit frames/s with file logging off, synchronous (old FileHandler) and queued"""
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for setup in ("off", "sync", "async"):
+            log_file = os.path.join(folder, f"{setup}.log")
+            if setup == "off":
+                logging.basicConfig(level=logging.WARNING, handlers=[logging.NullHandler()], force=True)
+            elif setup == "sync":
+                logging.basicConfig(level=logging.INFO, format=LOG_FORMAT,
+                                    handlers=[logging.FileHandler(log_file)], force=True)
+            else:
+                configure_logging(log_file, console=False)
+            try:
+                stats = bench_transmit_rate(0, seconds)
+            finally:
+                shutdown_logging()
+                logging.basicConfig(level=logging.WARNING, handlers=[logging.NullHandler()], force=True)
+            written = os.path.getsize(log_file) if os.path.exists(log_file) else 0
+            results.append({"benchmark": "file_logging", "logging": setup,
+                            "achieved_rate": stats["achieved_rate"], "log_bytes": written})
+    return results
+
+
+def bench_capture(frames=500000, frame_size=8):
+    """Capture write and mmap read throughput vs what 921600 baud needs (92160 bytes/s)"""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "bench.spcap")
+        frame = b"=654321\n"[:frame_size].ljust(frame_size, b"0")
+        start = time.perf_counter()
+        with CaptureWriter(path) as writer:
+            for _ in range(frames):
+                writer.write(frame, RX, "COM1")
+        write_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        total = 0
+        with CaptureReader(path) as reader:
+            for _, _, _, data in reader.frames():
+                total += len(data)
+            del data
+        read_time = time.perf_counter() - start
+        file_bytes = os.path.getsize(path)
+
+    return {"benchmark": "capture", "frames": frames, "frame_bytes": frame_size,
+            "write_frames_per_s": round(frames / write_time),
+            "write_payload_bytes_per_s": round(frames * frame_size / write_time),
+            "read_frames_per_s": round(frames / read_time),
+            "file_bytes_per_frame": round(file_bytes / frames, 2),
+            "headroom_vs_921600_baud": round(frames * frame_size / write_time / 92160, 1)}
+
+
+def bench_payload(mode="transmit", frames=200000):
+    """Per-frame cost of rebuilding the payload (old transmit_loop) vs reading the cache"""
+    engine = SerialEngine({"mode": mode, "base_weight": 123456, "selected_command": "PV"})
+
+    def run(get_frame):
+        keep = []  # hold every frame so distinct objects can be counted
+        start = time.perf_counter()
+        for _ in range(frames):
+            keep.append(get_frame())
+        elapsed = time.perf_counter() - start
+        objects = len({id(payload.data) for payload in keep})
+        return elapsed, objects
+
+    rebuild_time, rebuild_objects = run(engine.build_payload)
+    cached_time, cached_objects = run(lambda: engine.payload)
+    return {"benchmark": "payload", "mode": mode, "frames": frames,
+            "rebuild_ns_per_frame": round(rebuild_time / frames * 1e9, 1),
+            "cached_ns_per_frame": round(cached_time / frames * 1e9, 1),
+            "rebuild_payload_objects": rebuild_objects,
+            "cached_payload_objects": cached_objects}
+
+
+def bench_waveform(spec="ramp(0,5000,1000) + settle(5000,6000,2000) + noise(6000,15,7000)", frames=1000000):
+    """Waveform frames: formatting each weight as it is sent vs stepping through the prebuilt table"""
+    start = time.perf_counter()
+    weights = compile_waveform(spec)
+    compile_time = time.perf_counter() - start
+    start = time.perf_counter()
+    table = build_frame_table(weights, weight_payload)
+    table_time = time.perf_counter() - start
+    distinct = {id(payload): payload for payload in table}
+    # Pointer array plus one Payload (tuple, two strings, bytes) per distinct weight
+    table_bytes = sys.getsizeof(table) + sum(sys.getsizeof(payload) + sys.getsizeof(payload.text) +
+                                             sys.getsizeof(payload.data) + sys.getsizeof(payload.sent_message)
+                                             for payload in distinct.values())
+
+    length = len(weights)
+    start = time.perf_counter()
+    index = 0
+    for _ in range(frames):
+        payload = weight_payload(weights[index])
+        index = (index + 1) % length
+    format_time = time.perf_counter() - start
+
+    # Same steps as SerialEngine.send_payload()
+    start = time.perf_counter()
+    index = 0
+    for _ in range(frames):
+        payload = table[index]
+        index = (index + 1) % length
+    table_lookup_time = time.perf_counter() - start
+    del payload
+
+    return {"benchmark": "waveform", "spec": spec, "table_frames": length, "distinct_weights": len(distinct),
+            "compile_ms": round(compile_time * 1000, 2), "table_build_ms": round(table_time * 1000, 2),
+            "table_kib": round(table_bytes / 1024, 1), "frames": frames,
+            "format_ns_per_frame": round(format_time / frames * 1e9, 1),
+            "table_ns_per_frame": round(table_lookup_time / frames * 1e9, 1)}
+
+
+def bench_log_sink(lines=200000):
+    """GUI log ingestion: cost of put() on a serial thread while the 'Tk thread' drains in batches"""
+    sink = LogSink()
+    done = threading.Event()
+    drained = []
+
+    def consumer():
+        # Stand-in for the Tk after() loop
+        while not done.is_set():
+            drained.append(len(sink.drain()))
+            time.sleep(DRAIN_INTERVAL_MS / 1000.0)
+        drained.append(len(sink.drain()))
+
+    thread = threading.Thread(target=consumer, daemon=True)
+    thread.start()
+    start = time.perf_counter()
+    for i in range(lines):
+        sink.put("Received: '=654321' (8 bytes)")
+    put_time = time.perf_counter() - start
+    done.set()
+    thread.join()
+
+    result = {"benchmark": "log_sink", "lines": lines,
+              "put_ns_per_line": round(put_time / lines * 1e9, 1),
+              "ingest_lines_per_s": round(lines / put_time),
+              "drains": sum(1 for size in drained if size)}
+    result.update(sink.counters())
+    return result
+
+
+def bench_log_ring(lines=1000000, capacity=100000):
+    """Memory held by the log history once full vs after far more lines than it keeps"""
+    ring = LogRingBuffer(capacity)
+    full_memory = 0
+    tracemalloc.start()
+    for i in range(0, lines, MAX_BATCH):
+        batch = [f"[2026/01/01 00:00:00] INFO: Received: '={n % 1000000:06d}' (8 bytes)" for n in range(i, i + MAX_BATCH)]
+        ring.extend(batch)
+        if i + MAX_BATCH == capacity:
+            full_memory = tracemalloc.get_traced_memory()[0]
+    del batch
+    end_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {"benchmark": "log_ring", "lines": lines, "capacity": capacity, "kept": len(ring),
+            "memory_mb_when_full": round(full_memory / 1e6, 2),
+            "memory_mb_at_end": round(end_memory / 1e6, 2)}
+
+
+def bench_multi_port(ports, shared=True, rate=50, seconds=2.0):
+    """Process CPU and per-port receive rate for N ports on the shared I/O thread vs two threads per port"""
+    pairs = [open_pty_pair() for _ in range(ports)]
+    if not pairs[0]:
+        return {"benchmark": "multi_port", "ports": ports, "skipped": "needs ptys"}
+
+    manager = SessionManager()
+    engines = []
+    for number, (_, _, path) in enumerate(pairs):
+        settings = {"com_port": path, "mode": "receive", "read_mode": "event"}
+        if shared:
+            engines.append(manager.add_session(settings, f"port{number}"))
+        else:
+            engines.append(SerialEngine(settings))
+
+    stop = threading.Event()
+
+    def device():
+        # Every 'device' sends one frame per period, from a single writer thread
+        period = 1.0 / rate
+        next_time = time.perf_counter()
+        while not stop.is_set():
+            for master_fd, _, _ in pairs:
+                os.write(master_fd, b"=000123\n")
+            next_time += period
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    try:
+        for number, engine in enumerate(engines):
+            started = manager.start(f"port{number}") if shared else engine.start()
+            if not started:
+                raise RuntimeError(f"could not open {engine.settings['com_port']}")
+        threads = threading.active_count()
+        writer = threading.Thread(target=device, daemon=True)
+        writer.start()
+        time.sleep(0.2)
+        for engine in engines:
+            engine.reset_counters()
+        cpu_start = time.process_time()
+        time.sleep(seconds)
+        cpu = time.process_time() - cpu_start
+        rx_rates = [engine.throughput()["rx_frames_per_s"] for engine in engines]
+    finally:
+        stop.set()
+        if shared:
+            manager.close()
+        else:
+            for engine in engines:
+                engine.stop()
+        for pair in pairs:
+            close_pty_pair(pair)
+
+    return {"benchmark": "multi_port", "ports": ports, "shared_io_thread": shared, "rate_per_port": rate,
+            "threads": threads, "cpu_percent": round(100 * cpu / seconds, 1),
+            "cpu_ms_per_port_s": round(1000 * cpu / seconds / ports, 3),
+            "min_rx_frames_per_s": min(rx_rates), "max_rx_frames_per_s": max(rx_rates)}
+
+
+def bench_tx_batch(batch, flush_every, seconds=1.5):
+    """Max transmit frames/s and port calls / write syscalls per frame with batched writes"""
+    if batch * len(weight_payload(5555).data) > 4096 and not open_pty_pair_available():
+        return {"benchmark": "tx_batch", "batch": batch, "skipped": "needs ptys"}  # loop:// holds 4096 bytes
+    with bench_engine({"mode": "transmit", "transmit_rate": 0, "baud_rate": 921600, "tx_batch": batch,
+                       "tx_flush_every": flush_every}) as (engine, pair):
+        time.sleep(seconds)
+    stats = engine.throughput()
+    return {"benchmark": "tx_batch", "transport": "pty" if pair else "loop", "batch": batch,
+            "flush_every": flush_every, "frames": stats["tx_frames"],
+            "frames_per_s": round(stats["tx_frames"] / engine.scheduler.stats()["elapsed_s"], 1),
+            "writes": stats["tx_writes"], "flushes": stats["tx_flushes"],
+            "port_calls_per_frame": stats["port_calls_per_frame"],
+            "write_syscalls_per_frame": stats["write_syscalls_per_frame"]}
+
+
+def bench_stop_latency(transport, mode, read_mode="event", repeats=10):
+    """Time for stop to return (port closed) with worker threads vs asyncio cancellation"""
+    pair = open_pty_pair()
+    port = pair[2] if pair else "loop://"
+    if pair:
+        start_drain(pair[0])
+    settings = {"com_port": port, "mode": mode, "read_mode": read_mode, "transmit_rate": 5}
+    bridge = LoopBridge() if transport == "asyncio" else None
+    durations = []
+    try:
+        for repeat in range(repeats):
+            # Vary the run time so stop does not always land at the same point of a poll cycle
+            run_time = 0.1 + (repeat % 5) * 0.023
+            if bridge:
+                session = AsyncSerialSession(settings)
+                if not bridge.start_session(session):
+                    raise RuntimeError(f"could not open {port}")
+                time.sleep(run_time)
+                start = time.perf_counter()
+                bridge.stop_session(session)
+            else:
+                engine = SerialEngine(settings)
+                if not engine.start():
+                    raise RuntimeError(f"could not open {port}")
+                time.sleep(run_time)
+                start = time.perf_counter()
+                engine.stop()
+            durations.append(time.perf_counter() - start)
+    finally:
+        if bridge:
+            bridge.close()
+        close_pty_pair(pair)
+    result = {"benchmark": "stop_latency", "transport": transport, "mode": mode, "repeats": repeats}
+    if mode == "receive":
+        result["read_mode"] = read_mode
+    result.update(summarize_ms(durations))
+    return result
+
+
+def start_responder(fd, reply=b"=012345\r\n", delay=0.0):
+    """Answer every line written to the 'device' side of a pty with reply, in order, on a daemon thread"""
+    def respond():
+        buffer = b""
+        while True:
+            try:
+                buffer += os.read(fd, 4096)
+            except OSError:
+                return
+            lines = buffer.count(b"\n")
+            if lines:
+                buffer = buffer[buffer.rindex(b"\n") + 1:]
+                for _ in range(lines):
+                    if delay:
+                        time.sleep(delay)
+                    os.write(fd, reply)
+    thread = threading.Thread(target=respond, daemon=True)
+    thread.start()
+    return thread
+
+
+def bench_command_rtt(window, commands=2000, device_delay=0.0005):
+    """Commands/s and round-trip percentiles against a pty 'device' that answers after device_delay"""
+    pair = open_pty_pair()
+    if not pair:
+        return {"benchmark": "command_rtt", "window": window, "skipped": "needs ptys"}
+    start_responder(pair[0], delay=device_delay)
+    engine = SerialEngine({"com_port": pair[2], "mode": "command"})
+    if not engine.open_serial_port():
+        raise RuntimeError(f"could not open {pair[2]}")
+    client = CommandClient(engine.ser, window=window).start()
+    try:
+        stats = run_commands(client, ["IP", "P", "SP"], commands)
+    finally:
+        client.close()
+        engine.close_serial_port()
+        close_pty_pair(pair)
+    result = {"benchmark": "command_rtt", "device_delay_ms": device_delay * 1000}
+    result.update({key: value for key, value in stats.items() if key != "commands"})
+    return result
+
+
+def bench_command_pool(pooled, commands=200):
+    """Time per command in command mode (open, send, close) with and without the handle pool"""
+    pair = open_pty_pair()
+    port = pair[2] if pair else "loop://"
+    if pair:
+        start_drain(pair[0])
+    pool = PortPool() if pooled else None
+    engine = SerialEngine({"com_port": port, "mode": "command", "delay_time": 0},
+                          schedule=lambda delay_ms, callback: callback(), pool=pool)
+    durations = []
+    try:
+        for _ in range(commands):
+            start = time.perf_counter()
+            if not engine.start():
+                raise RuntimeError(f"could not open {port}")
+            durations.append(time.perf_counter() - start)
+    finally:
+        if pool:
+            pool.close_all()
+        close_pty_pair(pair)
+    result = {"benchmark": "command_pool", "pooled": pooled, "commands": commands,
+              "commands_per_s": round(commands / sum(durations), 1)}
+    result.update(summarize_ms(durations))
+    if pool:
+        result.update(pool.stats())
+    return result
+
+
+def bench_open_close(transport, repeats=200):
+    """Time for open_serial_port() and close_serial_port() on a pty, loop:// and socket://"""
+    pair = None
+    close_device = None
+    if transport == "pty":
+        pair = open_pty_pair()
+        if not pair:
+            return {"benchmark": "open_close", "transport": transport, "skipped": "needs ptys"}
+        start_drain(pair[0])
+        port = pair[2]
+    elif transport == "socket":
+        port, close_device = open_socket_device()
+    else:
+        port = "loop://"
+    engine = SerialEngine({"com_port": port, "mode": "command"})
+    opens = []
+    closes = []
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            if not engine.open_serial_port():
+                raise RuntimeError(f"could not open {port}")
+            opened = time.perf_counter()
+            engine.close_serial_port()
+            opens.append(opened - start)
+            closes.append(time.perf_counter() - opened)
+    finally:
+        if close_device:
+            close_device()
+        close_pty_pair(pair)
+    result = {"benchmark": "open_close", "transport": transport, "repeats": repeats,
+              "cycles_per_s": round(repeats / (sum(opens) + sum(closes)), 1)}
+    result.update({f"open_{key}": value for key, value in summarize_ms(opens).items()})
+    result.update({f"close_{key}": value for key, value in summarize_ms(closes).items()})
+    return result
+
+
+def bench_port_probe(ports=16, repeats=5):
+    """Time to check N ports: full open/close each (old is_port_available) vs a probe each vs parallel probes"""
+    pairs = []
+    for _ in range(ports):
+        pair = open_pty_pair()
+        if not pair:
+            break
+        pairs.append(pair)
+    if len(pairs) < ports:
+        for pair in pairs:
+            close_pty_pair(pair)
+        return {"benchmark": "port_probe", "ports": ports, "skipped": "needs ptys"}
+
+    def full_open(device):
+        ser = serial.serial_for_url(device, timeout=1)
+        ser.close()
+
+    devices = [pair[2] for pair in pairs]
+    discovery = PortDiscovery()
+    timings = {"full_open": [], "probe": [], "parallel_probe": []}
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for device in devices:
+                full_open(device)
+            timings["full_open"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            for device in devices:
+                probe_port(device)
+            timings["probe"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            discovery.probe(devices)
+            timings["parallel_probe"].append(time.perf_counter() - start)
+    finally:
+        discovery.stop()
+        for pair in pairs:
+            close_pty_pair(pair)
+    result = {"benchmark": "port_probe", "ports": ports, "repeats": repeats}
+    for name, samples in timings.items():
+        result[f"{name}_ms"] = round(sorted(samples)[len(samples) // 2] * 1000, 3)
+    return result
+
+
+def bench_simulator(devices, rounds=50):
+    """Simulated indicators on ptys: replies/s and simulator CPU per command when every device is polled at once"""
+    simulator = DeviceSimulator()
+    fds = []
+    selector = selectors.DefaultSelector()
+    try:
+        try:
+            ports = [simulator.add_pty().port for _ in range(devices)]
+        except (OSError, SimulatorError):
+            return {"benchmark": "simulator", "devices": devices, "skipped": "needs ptys"}
+        import tty  # importable wherever add_pty() works
+        simulator.start()
+        for port in ports:
+            fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+            tty.setraw(fd)
+            fds.append(fd)
+            selector.register(fd, selectors.EVENT_READ)
+        replies = 0
+        round_trips = []
+        start = time.perf_counter()
+        for _ in range(rounds):
+            # One IP to every device, then wait for all the replies
+            sent = time.perf_counter()
+            for fd in fds:
+                os.write(fd, b"IP\r\n")
+            waiting = len(fds)
+            deadline = sent + 2.0
+            while waiting and time.perf_counter() < deadline:
+                for key, _ in selector.select(0.1):
+                    lines = os.read(key.fd, 4096).count(b"\n")
+                    replies += lines
+                    waiting -= lines
+            round_trips.append(time.perf_counter() - sent)
+        elapsed = time.perf_counter() - start
+    finally:
+        selector.close()
+        for fd in fds:
+            os.close(fd)
+        simulator.stop()
+    stats = simulator.stats()
+    result = {"benchmark": "simulator", "devices": devices, "commands": devices * rounds, "replies": replies,
+              "replies_per_s": round(replies / elapsed), "cpu_us_per_command": round(
+                  stats["thread_cpu_s"] / max(1, stats["commands"]) * 1e6, 1)}
+    result.update({f"all_replied_{key}": value for key, value in summarize_ms(round_trips).items()})
+    return result
+
+
+class DamagingLoop(protocol_loop.Serial):
+    """loop:// that flips a bit in the last byte of every nth block written"""
+
+    def __init__(self, *args, every=100, **kwargs):
+        self.every = every
+        self.written_blocks = 0
+        super().__init__(*args, **kwargs)
+
+    def write(self, data):
+        self.written_blocks += 1
+        if self.written_blocks % self.every == 0:
+            data = bytearray(data)
+            data[-1] ^= 0x10
+        return super().write(data)
+
+
+def bench_loopback(block_size, seconds=1.0):
+    """Loopback test on loop://, clean and with every 100th block damaged"""
+    results = {}
+    for name, ser in (("clean", serial.serial_for_url("loop://", timeout=1, write_timeout=1)),
+                      ("damaged", DamagingLoop("loop://", timeout=1, write_timeout=1))):
+        test = LoopbackTest(block_size)
+        try:
+            results[name] = test.run(ser, seconds)
+        finally:
+            ser.close()
+    stats, damaged = results["clean"], results["damaged"]
+    block_bytes = HEADER_SIZE + block_size
+    return {"benchmark": "loopback", "block_size": block_size, "passed": stats["passed"],
+            "blocks_per_s": round(stats["blocks_received"] / max(stats["elapsed_s"], 1e-9)),
+            "payload_bytes_per_s": stats["throughput_bytes_per_s"], "latency_p50_ms": stats["latency_p50_ms"],
+            "latency_p99_ms": stats["latency_p99_ms"],
+            "damaged_mb_per_s": round(damaged["blocks_received"] * block_bytes / max(damaged["elapsed_s"], 1e-9) / 1e6, 1),
+            "damaged_blocks": damaged["blocks_damaged"], "damaged_byte_errors": damaged["byte_errors"],
+            "damaged_expected": damaged["blocks_sent"] // 100}
+
+
+BENCHMARKS = {
+    "receive_latency": lambda: [bench_receive_latency("event", 200), bench_receive_latency("poll", 30),
+                                bench_receive_latency("event", 100, "line", b"=654321"),
+                                bench_receive_latency("event", 200, "weight", b"=654321")],
+    "payload": lambda: [bench_payload("transmit"), bench_payload("command")],
+    "waveform": lambda: [bench_waveform()],
+    "replay": lambda: [bench_replay(speed) for speed in (1, 10, 0)] + bench_replay_reader(),
+    "framing": bench_framing,
+    "metrics": bench_metrics,
+    "trace": bench_trace,
+    "log_sink": lambda: [bench_log_sink()],
+    "log_ring": lambda: [bench_log_ring()],
+    "file_logging": bench_file_logging,
+    "capture": lambda: [bench_capture()],
+    "transmit_rate": lambda: [bench_transmit_rate(rate) for rate in (5, 50, 200, 1000, 0)],
+    "stop_latency": lambda: [bench_stop_latency(transport, mode, read_mode)
+                             for transport in ("threads", "asyncio")
+                             for mode, read_mode in (("transmit", "event"), ("receive", "event"), ("receive", "poll"))],
+    "command_rtt": lambda: [bench_command_rtt(window) for window in (1, 4, 16)],
+    "command_pool": lambda: [bench_command_pool(False), bench_command_pool(True)],
+    "multi_port": lambda: [bench_multi_port(ports, shared) for ports in (1, 4, 16) for shared in (True, False)],
+    # pyserial's socket:// close() sleeps 0.3 s so a server can accept a quick reconnect
+    "open_close": lambda: [bench_open_close("pty"), bench_open_close("loop"), bench_open_close("socket", 20)],
+    "transmit_max": lambda: [bench_transmit_rate(0)],
+    "tx_batch": lambda: [bench_tx_batch(batch, flush_every)
+                         for batch, flush_every in ((1, 1), (1, 0), (8, 1), (32, 1), (128, 8), (512, 0))],
+    "log_index": lambda: [bench_log_index()],
+    "simulator": lambda: [bench_simulator(devices) for devices in (1, 64, 256)],
+    "port_probe": lambda: [bench_port_probe(ports) for ports in (1, 16, 64)],
+    "loopback": lambda: [bench_loopback(block_size) for block_size in (16, 64, 1024)],
+}
+
+# The paths a change is most likely to slow down, run by --suite
+SUITE = ("transmit_max", "receive_latency", "log_sink", "command_rtt", "open_close")
+
+# benchmark -> (fields that identify a result, {metric: 1 if higher is better, -1 if lower})
+# Nested metrics are written with a dot, e.g. rtt.p50_ms
+REGRESSION_CHECKS = {
+    "transmit_rate": (("transport", "target_rate"), {"achieved_rate": 1}),
+    "receive_latency": (("read_mode", "framing", "frame", "transport"), {"p50_ms": -1, "p99_ms": -1}),
+    "log_sink": (("lines",), {"ingest_lines_per_s": 1}),
+    "command_rtt": (("window", "device_delay_ms"), {"commands_per_s": 1, "rtt.p50_ms": -1}),
+    "open_close": (("transport",), {"open_p50_ms": -1, "close_p50_ms": -1}),
+}
+TOLERANCE = 0.25  # relative change counted as a regression; wall-clock numbers vary a few % run to run
+
+
+def environment():
+    """Where the results were measured, for comparing reports"""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        revision = ""
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": revision,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "pyserial": serial.VERSION,
+        "ptys": open_pty_pair_available()
+    }
+
+
+def open_pty_pair_available():
+    """True if benchmarks run against ptys here, False if they fall back to loop://"""
+    pair = open_pty_pair()
+    close_pty_pair(pair)
+    return pair is not None
+
+
+def _metric(result, name):
+    value = result
+    for part in name.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare(baseline, results, tolerance=TOLERANCE):
+    """Headline metrics that got worse than the baseline results by more than tolerance"""
+    def key(result):
+        fields = REGRESSION_CHECKS[result["benchmark"]][0]
+        return (result["benchmark"],) + tuple(result.get(field) for field in fields)
+
+    before = {key(result): result for result in baseline
+              if result.get("benchmark") in REGRESSION_CHECKS and "skipped" not in result}
+    regressions = []
+    for result in results:
+        if result.get("benchmark") not in REGRESSION_CHECKS or key(result) not in before:
+            continue
+        for name, better in REGRESSION_CHECKS[result["benchmark"]][1].items():
+            old = _metric(before[key(result)], name)
+            new = _metric(result, name)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change * better < -tolerance:
+                regressions.append({"benchmark": result["benchmark"],
+                                    "case": dict(zip(REGRESSION_CHECKS[result["benchmark"]][0], key(result)[1:])),
+                                    "metric": name, "baseline": old, "current": new,
+                                    "change_pct": round(change * 100, 1)})
+    return regressions
+
+
+def build_parser():
+    """Build the command line parser"""
+    parser = argparse.ArgumentParser(prog="serial_bench", description="Serial engine benchmarks, no hardware needed")
+    parser.add_argument("names", nargs="*", metavar="BENCHMARK",
+                        help=f"benchmarks to run (default: all): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--suite", action="store_true", help=f"run the regression suite: {', '.join(SUITE)}")
+    parser.add_argument("--output", default="", metavar="FILE",
+                        help="write a JSON report with the environment and all results")
+    parser.add_argument("--baseline", default="", metavar="FILE",
+                        help="compare with an earlier --output report, exit with 1 if a headline number regressed")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="relative change that counts as a regression (default 0.25 = 25%%)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(sys.argv[1:] if argv is None else argv)
+    names = list(args.names) + [name for name in SUITE if args.suite and name not in args.names]
+    names = names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}', choose from: {', '.join(BENCHMARKS)}", file=sys.stderr)
+            return 2
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Cannot read baseline {args.baseline}: {e}", file=sys.stderr)
+            return 2
+
+    report = {"environment": environment(), "benchmarks": names, "results": []}
+    for name in names:
+        for result in BENCHMARKS[name]():
+            print(json.dumps(result))
+            report["results"].append(result)
+
+    if baseline is not None:
+        report["baseline"] = args.baseline
+        report["regressions"] = compare(baseline, report["results"], args.tolerance)
+        for regression in report["regressions"]:
+            print(f"REGRESSION {regression['benchmark']} {regression['case']}: {regression['metric']} "
+                  f"{regression['baseline']} -> {regression['current']} ({regression['change_pct']:+}%)",
+                  file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if baseline is not None and report["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
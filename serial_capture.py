@@ -0,0 +1,283 @@
+"""Compact append-only capture of raw serial traffic.
+
+File layout (all integers little-endian):
+
+    header   MAGIC(8) wall_ns(q) monotonic_ns(q) reserved(8)
+    record   length(I) kind(B) direction(B) port_id(H) timestamp_ns(q) data[length]
+
+Record kinds:
+
+    FRAME  raw bytes as they crossed the wire; timestamp is time.monotonic_ns()
+    PORT   introduces a port name (data, utf-8) for port_id
+    INDEX  written every INDEX_INTERVAL frames; data is
+           INDEX_MARKER(8) prev_index(q) block_start(q) first_ts(q) last_ts(q) count(I)
+           port_count(H) then port_id(H) name_length(H) name per known port
+
+Index blocks are chained backwards, so a reader finds the last one by
+searching for INDEX_MARKER from the end of the file and can then jump to
+any point in time without reading the frames before it. A capture cut
+short by a crash is still readable up to its last complete record.
+
+    python serial_capture.py capture.spcap           # summary
+    python serial_capture.py capture.spcap --dump 20 # first 20 frames
+"""
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import bisect
+import argparse
+import threading
+
+MAGIC = b"SPCAP\x00\x01\x00"
+HEADER = struct.Struct("<8sqq8x")
+RECORD = struct.Struct("<IBBHq")
+INDEX_MARKER = b"\xffSPIDX\x00\xff"
+INDEX = struct.Struct("<8sqqqqIH")
+PORT_ENTRY = struct.Struct("<HH")
+
+FRAME, PORT, INDEX_BLOCK = 0, 1, 2
+RX, TX = 0, 1
+DIRECTIONS = {RX: "RX", TX: "TX"}
+
+INDEX_INTERVAL = 1024  # frames per index block
+WRITE_BUFFER = 1 << 20
+
+
+class CaptureWriter:
+    """Appends timestamped frames to a new capture file (an existing file is replaced); thread-safe"""
+
+    def __init__(self, path, buffer_size=WRITE_BUFFER):
+        self.path = path
+        self.file = open(path, "wb", buffering=buffer_size)
+        self.lock = threading.Lock()
+        self.ports = {}
+        self.frames = 0
+        self.prev_index = -1
+        self.block_start = None
+        self.block_first_ts = 0
+        self.block_last_ts = 0
+        self.block_count = 0
+        self.file.write(HEADER.pack(MAGIC, time.time_ns(), time.monotonic_ns()))
+        self.offset = HEADER.size
+
+    def _append(self, kind, direction, port_id, timestamp_ns, data):
+        self.file.write(RECORD.pack(len(data), kind, direction, port_id, timestamp_ns))
+        self.file.write(data)
+        self.offset += RECORD.size + len(data)
+
+    def _port_id(self, port):
+        port_id = self.ports.get(port)
+        if port_id is None:
+            port_id = self.ports[port] = len(self.ports)
+            self._append(PORT, 0, port_id, time.monotonic_ns(), port.encode("utf-8"))
+        return port_id
+
+    def write(self, data, direction=RX, port="", timestamp_ns=None):
+        """Append one frame of raw bytes; explicit timestamps must not go backwards"""
+        with self.lock:
+            # Stamped under the lock, so RX and TX threads append in time order (frames() relies on it)
+            if timestamp_ns is None:
+                timestamp_ns = time.monotonic_ns()
+            port_id = self._port_id(port)
+            if self.block_start is None:
+                self.block_start = self.offset
+                self.block_first_ts = timestamp_ns
+            self._append(FRAME, direction, port_id, timestamp_ns, data)
+            self.block_last_ts = timestamp_ns
+            self.block_count += 1
+            self.frames += 1
+            if self.block_count >= INDEX_INTERVAL:
+                self._write_index()
+
+    def _write_index(self):
+        if self.block_start is None:
+            return
+        parts = [INDEX.pack(INDEX_MARKER, self.prev_index, self.block_start, self.block_first_ts,
+                            self.block_last_ts, self.block_count, len(self.ports))]
+        for name, port_id in self.ports.items():
+            encoded = name.encode("utf-8")
+            parts.append(PORT_ENTRY.pack(port_id, len(encoded)) + encoded)
+        index_offset = self.offset
+        self._append(INDEX_BLOCK, 0, 0, self.block_last_ts, b"".join(parts))
+        self.prev_index = index_offset
+        self.block_start = None
+        self.block_count = 0
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        """Index the last partial block and close the file"""
+        with self.lock:
+            if self.file.closed:
+                return
+            self._write_index()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CaptureReader:
+    """Memory-mapped capture reader; nothing is loaded up front.
+
+    Frame data is yielded as memoryviews into the map. Copy with bytes()
+    anything that has to outlive the reader.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError(f"{path} is not a capture file (too short)")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.wall_ns, self.monotonic_ns = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a capture file")
+        self.size = size
+        self.ports = {}
+        self.blocks = self._load_index()
+
+    def _index_at(self, offset):
+        """Parse the INDEX record at offset, or None if there isn't a valid one"""
+        if offset < HEADER.size or offset + RECORD.size + INDEX.size > self.size:
+            return None
+        length, kind, _, _, _ = RECORD.unpack_from(self.map, offset)
+        data_start = offset + RECORD.size
+        if kind != INDEX_BLOCK or data_start + length > self.size or length < INDEX.size:
+            return None
+        marker, prev, block_start, first_ts, last_ts, count, port_count = INDEX.unpack_from(self.map, data_start)
+        if marker != INDEX_MARKER:
+            return None
+        position = data_start + INDEX.size
+        ports = {}
+        for _ in range(port_count):
+            port_id, name_length = PORT_ENTRY.unpack_from(self.map, position)
+            position += PORT_ENTRY.size
+            ports[port_id] = bytes(self.map[position:position + name_length]).decode("utf-8", "replace")
+            position += name_length
+        return prev, (block_start, first_ts, last_ts, count), ports, data_start + length
+
+    def _load_index(self):
+        """Find the last index block from the end of the file and follow the chain back"""
+        search_end = self.size
+        while True:
+            marker_at = self.map.rfind(INDEX_MARKER, HEADER.size, search_end)
+            if marker_at < 0:
+                self.tail_start = HEADER.size
+                return []
+            last = self._index_at(marker_at - RECORD.size)
+            if last:
+                break
+            search_end = marker_at  # marker bytes inside frame data, keep looking
+
+        prev, block, self.ports, self.tail_start = last
+        blocks = [block]
+        while prev >= 0:
+            entry = self._index_at(prev)
+            if entry is None:
+                break
+            prev, block, _, _ = entry
+            blocks.append(block)
+        blocks.reverse()
+        return blocks
+
+    def frames(self, start_ns=None, end_ns=None):
+        """Yield (timestamp_ns, direction, port, data) for frames in [start_ns, end_ns)"""
+        offset = HEADER.size
+        if start_ns is not None and self.blocks:
+            # Skip whole blocks that end before start_ns
+            position = bisect.bisect_left([block[2] for block in self.blocks], start_ns)
+            offset = self.blocks[position][0] if position < len(self.blocks) else self.tail_start
+
+        ports = self.ports
+        unpack = RECORD.unpack_from
+        view = memoryview(self.map)
+        size = self.size
+        try:
+            while offset + RECORD.size <= size:
+                length, kind, direction, port_id, timestamp = unpack(self.map, offset)
+                data_start = offset + RECORD.size
+                offset = data_start + length
+                if offset > size:
+                    break  # truncated last record
+                if kind == FRAME:
+                    if start_ns is not None and timestamp < start_ns:
+                        continue
+                    if end_ns is not None and timestamp >= end_ns:
+                        break
+                    yield timestamp, direction, ports.get(port_id, ""), view[data_start:offset]
+                elif kind == PORT:
+                    ports[port_id] = bytes(view[data_start:offset]).decode("utf-8", "replace")
+        finally:
+            view.release()
+
+    def to_wall_ns(self, timestamp_ns):
+        """Convert a frame timestamp to wall-clock ns since the epoch"""
+        return self.wall_ns + (timestamp_ns - self.monotonic_ns)
+
+    def summary(self):
+        """Frame and byte counts per port and direction, plus the time span"""
+        counts = {}
+        first = last = None
+        for timestamp, direction, port, data in self.frames():
+            key = (port, DIRECTIONS.get(direction, str(direction)))
+            frames, total = counts.get(key, (0, 0))
+            counts[key] = (frames + 1, total + len(data))
+            if first is None:
+                first = timestamp
+            last = timestamp
+        return {
+            "file_bytes": self.size,
+            "index_blocks": len(self.blocks),
+            "duration_s": round((last - first) / 1e9, 6) if first is not None else 0.0,
+            "streams": [{"port": port, "direction": direction, "frames": frames, "bytes": total}
+                        for (port, direction), (frames, total) in sorted(counts.items())]
+        }
+
+    def close(self):
+        if getattr(self, "map", None) is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass  # frame views still referenced; the map closes when they are collected
+            self.map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="serial_capture", description="Inspect a serial capture file")
+    parser.add_argument("path")
+    parser.add_argument("--dump", type=int, metavar="N", default=0, help="print the first N frames")
+    args = parser.parse_args(argv)
+
+    with CaptureReader(args.path) as reader:
+        if args.dump:
+            for count, (timestamp, direction, port, data) in enumerate(reader.frames()):
+                if count >= args.dump:
+                    break
+                wall = reader.to_wall_ns(timestamp) / 1e9
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(wall)) + f".{int(wall * 1e6) % 1000000:06d}"
+                print(f"{stamp} {DIRECTIONS.get(direction, direction)} {port} {bytes(data)!r}")
+        else:
+            print(json.dumps(reader.summary(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
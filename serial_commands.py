@@ -0,0 +1,316 @@
+"""Request/response commands with matched replies and round-trip latency.
+
+A CommandClient owns a reader thread on an open port. send() writes a
+command and returns a Future that resolves to the reply line. Replies are
+matched to requests in order: the device answers commands in the order
+it received them, so each terminated line belongs to the oldest command
+still waiting. A command with no reply within the timeout fails with
+TimeoutError and stops holding up the ones behind it.
+
+Only lines that started arriving after a command was written can be its
+reply. A line already on its way before that, such as the reply to a
+write() that expects none, is logged as unmatched instead of being
+charged to the next command. So is whatever the port had buffered when
+the client started, e.g. the reply to a command sent with the port kept
+open.
+
+Up to `window` commands may be outstanding at once (pipelining). Keep
+window=1 for devices that drop input while they are answering: with more
+outstanding, one lost reply shifts the matching of the replies after it
+until the queue drains.
+
+Round-trip times go into one LatencyHistogram per command, so p50/p99/max
+are available for any number of commands without storing each sample.
+"""
+import math
+import time
+import threading
+from array import array
+from collections import deque, namedtuple
+from concurrent.futures import Future
+
+import serial
+
+from serial_capture import RX, TX
+
+READ_TICK = 0.01  # seconds between timeout checks while no data arrives
+DEFAULT_TIMEOUT = 1.0
+
+Response = namedtuple("Response", ["command", "data", "rtt"])
+
+
+def encode_command(command):
+    """Bytes sent for a command: each character as its ASCII byte value, upper case, plus CR/LF"""
+    return bytes(ord(c) for c in command.upper()) + b'\r\n'
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram of durations in seconds (about 1% resolution, 1 us to 1000 s)"""
+
+    LOWEST = 1e-6
+    GROWTH = 1.01
+
+    def __init__(self):
+        self.buckets = array('L', [0]) * (self.bucket(1000.0) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @classmethod
+    def bucket(cls, seconds):
+        if seconds <= cls.LOWEST:
+            return 0
+        return int(math.log(seconds / cls.LOWEST) / math.log(cls.GROWTH)) + 1
+
+    def record(self, seconds):
+        index = min(self.bucket(seconds), len(self.buckets) - 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """Upper edge of the bucket holding the given fraction of samples (capped at max)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(self.LOWEST * self.GROWTH ** index, self.max)
+        return self.max
+
+    def merge(self, other):
+        for index, count in enumerate(other.buckets):
+            if count:
+                self.buckets[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def stats(self):
+        """Count, mean and p50/p99/max in milliseconds"""
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3)
+        }
+
+
+class CommandClient:
+    """Sends commands on an open port and matches each reply line to its request"""
+
+    def __init__(self, ser, timeout=DEFAULT_TIMEOUT, window=1, terminator=b"\n",
+                 on_log=None, capture=None, port=""):
+        self.ser = ser
+        self.timeout = timeout
+        self.window = max(1, window)
+        self.terminator = terminator
+        self.on_log = on_log  # on_log(message, level)
+        self.capture = capture
+        self.port = port
+
+        self.slots = threading.Semaphore(self.window)
+        self.lock = threading.Lock()
+        self.outstanding = deque()  # (command, sent_at, future, expires_at), oldest first
+        self.histograms = {}
+        self.sent = 0
+        self.answered = 0
+        self.timeouts = 0
+        self.unmatched = 0
+        self.started_at = None
+        self.running = False
+        self.thread = None
+        self.error = None
+        self.original_timeout = None
+
+    def log_message(self, message, level="INFO"):
+        if self.on_log:
+            self.on_log(message, level)
+
+    def start(self):
+        """Start the reader thread"""
+        self.original_timeout = self.ser.timeout
+        self.ser.timeout = READ_TICK
+        waiting = self.ser.in_waiting
+        if waiting:
+            # Arrived before any command of this client was sent
+            stale = self.ser.read(waiting)
+            if self.capture:
+                self.capture.write(stale, RX, self.port)
+            for line in stale.splitlines(keepends=True):
+                self._unmatched(line)
+        self.running = True
+        self.started_at = time.perf_counter()
+        self.thread = threading.Thread(target=self._read_loop, name="command-reader", daemon=True)
+        self.thread.start()
+        return self
+
+    def write(self, data):
+        """Write bytes that expect no reply (not matched, not timed)"""
+        self.ser.write(data)
+        if self.capture:
+            self.capture.write(data, TX, self.port)
+
+    def send(self, command, data=None, timeout=None):
+        """Write a command (encoded like command mode unless data is given). Returns a Future.
+
+        timeout overrides the client's reply timeout for this command.
+        Blocks while `window` commands are already outstanding.
+        """
+        if data is None:
+            data = encode_command(command)
+        if timeout is None:
+            timeout = self.timeout
+        future = Future()
+        while not self.slots.acquire(timeout=READ_TICK):
+            if not self.running:
+                raise serial.SerialException(self.error or "command client is closed")
+        sent_at = time.perf_counter()
+        with self.lock:
+            if not self.running:
+                self.slots.release()
+                raise serial.SerialException(self.error or "command client is closed")
+            # Queued before writing: a fast reply must find its request
+            entry = (command, sent_at, future, sent_at + timeout)
+            self.outstanding.append(entry)
+        try:
+            self.ser.write(data)
+        except Exception:
+            with self.lock:
+                self.outstanding.remove(entry)
+            self.slots.release()
+            raise
+        if self.capture:
+            self.capture.write(data, TX, self.port)
+        self.sent += 1
+        return future
+
+    def request(self, command, data=None):
+        """Send one command and wait for its reply. Returns a Response, raises TimeoutError"""
+        return self.send(command, data).result()
+
+    def _read_loop(self):
+        buffer = bytearray()
+        terminator = self.terminator
+        started = 0.0  # when the first byte of the line in buffer was read
+        while self.running:
+            try:
+                data = self.ser.read(self.ser.in_waiting or 1)
+            except Exception as e:
+                if self.running:
+                    self.error = str(e)
+                    self.log_message(f"Serial error: {e}", "ERROR")
+                break
+            now = time.perf_counter()
+            if data:
+                if self.capture:
+                    self.capture.write(data, RX, self.port)
+                if not buffer:
+                    started = now
+                buffer += data
+                end = buffer.find(terminator)
+                while end >= 0:
+                    self._resolve(bytes(buffer[:end + len(terminator)]), started, now)
+                    del buffer[:end + len(terminator)]
+                    started = now  # the rest came with this chunk
+                    end = buffer.find(terminator)
+            self._expire(now)
+        self.running = False
+        self._fail_all(serial.SerialException(self.error or "command client closed"))
+
+    def _unmatched(self, line):
+        """A line no command waits for (e.g. the reply to a write()) or that came after a timeout"""
+        self.unmatched += 1
+        text = line.decode('ascii', errors='ignore').strip()
+        if text:
+            self.log_message(f"Received: '{text}' ({len(line)} bytes)")
+
+    def _resolve(self, line, started, now):
+        with self.lock:
+            # A line that started arriving before the oldest command was written is not its reply
+            entry = self.outstanding.popleft() if self.outstanding and started >= self.outstanding[0][1] else None
+        if entry is None:
+            self._unmatched(line)
+            return
+        command, sent_at, future, _ = entry
+        rtt = now - sent_at
+        histogram = self.histograms.get(command)
+        if histogram is None:
+            histogram = self.histograms[command] = LatencyHistogram()
+        histogram.record(rtt)
+        self.answered += 1
+        self.slots.release()
+        future.set_result(Response(command, line, rtt))
+
+    def _expire(self, now):
+        while True:
+            with self.lock:
+                if not self.outstanding or now < self.outstanding[0][3]:
+                    return
+                command, sent_at, future, expires_at = self.outstanding.popleft()
+            self.timeouts += 1
+            self.slots.release()
+            self.log_message(f"No reply to '{command}' within {(expires_at - sent_at) * 1000:g} ms", "WARNING")
+            future.set_exception(TimeoutError(f"no reply to '{command}'"))
+
+    def _fail_all(self, error):
+        with self.lock:
+            pending, self.outstanding = list(self.outstanding), deque()
+        for _, _, future, _ in pending:
+            self.slots.release()
+            future.set_exception(error)
+
+    def close(self):
+        """Stop the reader thread; commands still waiting fail. The port stays open"""
+        self.running = False
+        if self.thread:
+            self.thread.join(max(1.0, READ_TICK * 10))
+            self.thread = None
+        try:
+            self.ser.timeout = self.original_timeout
+        except Exception:
+            pass
+
+    def stats(self):
+        """Counts, throughput and per-command round-trip percentiles"""
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        overall = LatencyHistogram()
+        for histogram in self.histograms.values():
+            overall.merge(histogram)
+        return {
+            "window": self.window,
+            "sent": self.sent,
+            "answered": self.answered,
+            "timeouts": self.timeouts,
+            "unmatched": self.unmatched,
+            "elapsed_s": round(elapsed, 3),
+            "commands_per_s": round(self.answered / elapsed, 1) if elapsed > 0 else 0.0,
+            "rtt": overall.stats(),
+            "commands": {command: histogram.stats() for command, histogram in sorted(self.histograms.items())}
+        }
+
+
+def run_commands(client, commands, count):
+    """Send count commands, cycling through the list, as fast as the window allows.
+
+    Waits for every reply or timeout and returns the client's stats().
+    """
+    futures = []
+    for number in range(count):
+        if not client.running:
+            break
+        try:
+            futures.append(client.send(commands[number % len(commands)]))
+        except serial.SerialException:
+            break  # the port failed between the check and the send
+    for future in futures:
+        try:
+            future.result()
+        except Exception:
+            pass  # counted as a timeout or error by the client
+    return client.stats()
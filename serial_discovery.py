@@ -0,0 +1,284 @@
+"""Port discovery off the Tk thread.
+
+Enumerating ports (serial.tools.list_ports) and checking whether a port
+can be opened both touch the OS, and on a host with many ttyUSB/ttyACM
+devices that adds up to seconds. PortDiscovery keeps a cached table of
+PortInfo (device, USB VID/PID/serial number, description, state) that a
+background thread refreshes. Readers such as the GUI take the current
+table without waiting. Only what changed is reported, through the
+on_change callback on the discovery thread.
+
+The thread wakes every SCAN_INTERVAL seconds. On Linux and macOS the
+ports are enumerated again only if the /dev directory changed (device
+nodes come and go when adapters are plugged in and out, like udev events)
+or RESCAN_INTERVAL has passed. Elsewhere every wake enumerates, which on
+Windows is one SetupAPI query. A port is probed when it is first seen,
+when probe_soon() asks for it (the GUI does when a port is selected) and
+on refresh(). Known ports are not probed again on a timer unless
+probe_interval is set: even a probe opens the port, which on POSIX
+raises DTR/RTS and resets Arduino-style boards, and on Windows briefly
+holds a port another application may be opening.
+
+A probe is lightweight. On POSIX it is an os.open() with O_NONBLOCK (no
+wait for carrier, no line settings) and a non-blocking flock(), the lock
+pyserial takes with exclusive=True. On Windows it opens the port, since
+Windows refuses a second open. Probes run in parallel on PROBE_WORKERS
+threads. A probe that has not returned after PROBE_TIMEOUT leaves the
+state unknown rather than holding up the table.
+
+Run `python serial_discovery.py` to print the table, or add --watch to
+print ports as they come and go.
+"""
+import os
+import sys
+import json
+import time
+import errno
+import argparse
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import serial
+import serial.tools.list_ports
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SCAN_INTERVAL = 2.0
+RESCAN_INTERVAL = 30.0  # enumerate even if /dev looks unchanged
+PROBE_INTERVAL = 0  # seconds between probes of every known port, 0 = none
+PROBE_WORKERS = 8
+PROBE_TIMEOUT = 1.0
+
+# Port states
+FREE = "free"
+BUSY = "busy"
+NO_ACCESS = "no access"
+MISSING = "missing"
+UNKNOWN = None  # not probed yet, probe still running, or a URL such as socket://
+
+PortInfo = namedtuple("PortInfo", ["device", "vid", "pid", "serial_number", "description", "state"])
+
+
+def probe_port(device):
+    """State of device (FREE, BUSY, NO_ACCESS, MISSING), or UNKNOWN for a URL, which only a real open can tell"""
+    if "://" in device:
+        return UNKNOWN
+    if fcntl is None:
+        try:
+            serial.Serial(device).close()
+            return FREE
+        except (serial.SerialException, OSError, ValueError):
+            return BUSY
+    try:
+        fd = os.open(device, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    except OSError as e:
+        if e.errno in (errno.ENOENT, errno.ENXIO, errno.ENODEV):
+            return MISSING
+        if e.errno in (errno.EACCES, errno.EPERM):
+            return NO_ACCESS
+        return BUSY  # EBUSY: opened with TIOCEXCL
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return FREE
+    except OSError:
+        return BUSY
+    finally:
+        os.close(fd)
+
+
+def describe(info):
+    """e.g. 'FT232R USB UART (0403:6001), free'"""
+    parts = [info.description if info.description and info.description != "n/a" else info.device]
+    if info.vid is not None:
+        parts[0] += f" ({info.vid:04X}:{info.pid:04X})"
+    if info.state:
+        parts.append(info.state)
+    return ", ".join(parts)
+
+
+def _dev_stamp():
+    """Modification time of /dev, or None where there is none to watch"""
+    try:
+        return os.stat("/dev").st_mtime_ns
+    except OSError:
+        return None
+
+
+class PortDiscovery:
+    """Cached port table, refreshed by a background thread"""
+
+    def __init__(self, on_change=None, interval=SCAN_INTERVAL, probe_interval=PROBE_INTERVAL,
+                 workers=PROBE_WORKERS, clock=time.monotonic):
+        self.on_change = on_change  # called as on_change(table, added, removed) from the discovery thread
+        self.interval = interval
+        self.probe_interval = probe_interval
+        self.workers = workers
+        self.clock = clock
+        # device -> PortInfo; replaced as a whole, never changed in place, so readers take no lock
+        self.ports = {}
+        self.scans = 0  # enumerations
+        self.probes = 0
+        self.executor = None
+        self.thread = None
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.force = True
+        self.wanted = set()  # devices to probe on the next pass
+        self.dev_stamp = None
+        self.enumerated_at = None
+        self.probed_at = None
+
+    def start(self):
+        """Scan now and then in the background"""
+        self.thread = threading.Thread(target=self._run, name="port-discovery", daemon=True)
+        self.thread.start()
+        return self
+
+    def refresh(self):
+        """Enumerate and probe every port on the next pass, which starts at once"""
+        self.force = True
+        self.wake.set()
+
+    def probe_soon(self, device):
+        """Probe one known port on the next pass, which starts at once"""
+        if device in self.ports:
+            self.wanted.add(device)
+            self.wake.set()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def table(self):
+        """PortInfo of every known port, sorted by device"""
+        ports = self.ports
+        return [ports[device] for device in sorted(ports)]
+
+    def devices(self):
+        return sorted(self.ports)
+
+    def get(self, device):
+        """PortInfo of device, or None if it is not a known port"""
+        return self.ports.get(device)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                sys.stderr.write(f"Port discovery failed: {e}\n")
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def scan(self):
+        """One pass: enumerate if something may have changed, probe what is due. Returns (added, removed)"""
+        force = self.force
+        self.force = False
+        now = self.clock()
+        stamp = _dev_stamp()
+        old = self.ports
+        if force or stamp is None or stamp != self.dev_stamp or self.enumerated_at is None \
+                or now - self.enumerated_at >= RESCAN_INTERVAL:
+            try:
+                found = {port.device: port for port in serial.tools.list_ports.comports()}
+            except Exception:
+                found = None
+            self.dev_stamp = stamp
+            self.enumerated_at = now
+            self.scans += 1
+        else:
+            found = None
+        if found is None:
+            found = old  # keep the table as it was
+
+        added = sorted(device for device in found if device not in old)
+        removed = sorted(device for device in old if device not in found)
+        wanted, self.wanted = self.wanted, set()
+        if force or self.probe_interval and (self.probed_at is None or now - self.probed_at >= self.probe_interval):
+            to_probe = list(found)
+            self.probed_at = now
+        else:
+            to_probe = added + sorted(device for device in wanted if device in found and device not in added)
+        states = self.probe(to_probe)
+
+        ports = {}
+        changed = False
+        for device, port in found.items():
+            before = old.get(device)
+            state = states.get(device, before.state if before else UNKNOWN)
+            if isinstance(port, PortInfo):
+                info = port._replace(state=state)
+            else:
+                info = PortInfo(device, port.vid, port.pid, port.serial_number, port.description, state)
+            changed = changed or info != before
+            ports[device] = info
+        self.ports = ports
+        if self.on_change and (changed or removed or force):
+            self.on_change(self.table(), added, removed)
+        return added, removed
+
+    def probe(self, devices):
+        """{device: state} of devices, probed in parallel; probes still running after PROBE_TIMEOUT are left out"""
+        if not devices:
+            return {}
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="port-probe")
+        futures = {self.executor.submit(probe_port, device): device for device in devices}
+        done, _ = wait(futures, timeout=PROBE_TIMEOUT)
+        self.probes += len(futures)
+        return {futures[future]: future.result() for future in done if future.exception() is None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="serial_discovery", description="List serial ports and whether they are free")
+    parser.add_argument("--json", action="store_true", help="one JSON object per port")
+    parser.add_argument("--watch", action="store_true", help="keep running and print ports as they come and go")
+    parser.add_argument("--probe-interval", type=float, default=PROBE_INTERVAL, metavar="SECONDS",
+                        help="with --watch, probe every port this often (opens each port), 0 = only new ports")
+    args = parser.parse_args(argv)
+
+    def show(info, prefix=""):
+        if args.json:
+            print(json.dumps(info._asdict()), flush=True)
+        else:
+            print(f"{prefix}{info.device}: {describe(info)}", flush=True)
+
+    discovery = PortDiscovery(probe_interval=args.probe_interval)
+    discovery.scan()
+    for info in discovery.table():
+        show(info)
+    if not args.watch:
+        discovery.stop()
+        return 0
+
+    def changes(table, added, removed):
+        for device in removed:
+            print(f"- {device}" if not args.json else json.dumps({"device": device, "state": MISSING}), flush=True)
+        for info in table:
+            if info.device in added:
+                show(info, "+ ")
+
+    discovery.on_change = changes
+    discovery.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    discovery.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1144 @@
+import serial
+import time
+import threading
+from collections import namedtuple
+
+from serial_scheduler import RateScheduler
+from serial_logging import write_log
+from serial_capture import CaptureWriter, RX, TX
+from serial_commands import CommandClient, encode_command
+from serial_sequence import SequenceRunner, SequenceError, load_sequence
+from serial_waveform import WaveformError, compile_waveform, build_frame_table
+from serial_replay import ReplayPlayer, open_recording
+from serial_framing import FramingError, make_framer, decode_weight
+from serial_trace import WAIT, WRITE, FLUSH, LOG, READ, PROCESS
+from serial_batch import FrameBatcher, complete_frames, thread_write_syscalls
+from serial_reconnect import ReconnectSupervisor, port_identity, find_port, describe, NO_OUTAGES
+from serial_discovery import probe_port, FREE, UNKNOWN
+from serial_loopback import LoopbackTest, LoopbackError
+
+# Serial parameter lookups shared by the GUI and the CLI
+PARITY_MAP = {"None": serial.PARITY_NONE, "Even": serial.PARITY_EVEN, "Odd": serial.PARITY_ODD}
+STOP_BITS_MAP = {"One": serial.STOPBITS_ONE, "Two": serial.STOPBITS_TWO}
+
+# Offered in the GUI and swept by the loopback test
+BAUD_RATES = [300, 600, 1200, 2400, 4800, 9600, 14400, 19200, 38400, 57600, 115200]
+
+MODES = ["transmit", "receive", "command", "loopback"]
+
+# Receive strategies: "event" blocks in read() until bytes arrive,
+# "poll" is the original in_waiting + sleep(0.1) loop
+READ_MODES = ["event", "poll"]
+
+# Define available commands
+COMMAND_LIST = [
+    "IP", "P", "CP", "SP", "xS", "xP", "Z", "T", "xT", "PU", "xU", "xM", "PV", "Esc R"
+]
+
+# Default settings
+DEFAULT_SETTINGS = {
+    "com_port": "COM4",
+    "baud_rate": 9600,
+    "parity": "None",
+    "data_bits": 8,
+    "stop_bits": "One",
+    "base_weight": 5555,
+    "mode": "transmit",  # "transmit", "receive", "command" or "loopback"
+    "selected_command": "IP",  # default command
+    "custom_command": "",  # custom command input
+    "delay_time": 1000,  # default delay in milliseconds
+    "transmit_rate": 5,  # frames/s in transmit mode, 0 = as fast as the line allows
+    "keep_port_open": False,  # command mode: leave port open after sending
+    "read_mode": "event",  # receive strategy, see READ_MODES
+    "inter_byte_timeout": 50,  # ms of silence that ends a line without a newline
+    "capture_file": "",  # record raw traffic to this capture file ("" = off)
+    "sequence_file": "",  # command mode: run this command sequence instead of one command
+    "waveform": "",  # transmit mode: weight waveform spec (see serial_waveform.py), "" = constant base_weight
+    "replay_file": "",  # transmit mode: send the frames of this capture or log file instead
+    "replay_speed": 1.0,  # 1 = recorded timing, N = N times faster, 0 = as fast as the line allows
+    "replay_direction": "all",  # recorded frames to send: "all", "sent" or "received"
+    "tx_batch": 1,  # transmit mode: frames per write, see serial_batch.py
+    "tx_flush_every": 1,  # writes between ser.flush() calls, 0 = only when the run ends
+    "auto_reconnect": False,  # transmit/receive: reopen a dropped port with backoff, see serial_reconnect.py
+    "reconnect_max_delay": 30.0,  # longest wait in seconds between reconnect attempts
+    "resend_queue": 1000,  # transmit frames held while the port is down
+    "loopback_block": 64,  # loopback mode: payload bytes per test block, see serial_loopback.py
+    "loopback_pattern": "prbs",  # "prbs" or "sequence"
+    "loopback_seconds": 5.0,  # test time per baud rate
+    "loopback_sweep": False,  # test every rate in BAUD_RATES instead of baud_rate
+    "rx_framing": "line"  # how received bytes are split into frames, see serial_framing.FRAMINGS
+}
+
+
+# Settings that change what transmit_loop sends
+PAYLOAD_KEYS = ("mode", "base_weight", "selected_command", "custom_command", "waveform")
+
+# Prebuilt frame: display string, wire bytes and the log line for a full write
+Payload = namedtuple("Payload", ["text", "data", "sent_message"])
+
+
+def weight_payload(weight):
+    """Transmit frame for a weight: '=' followed by the six digits reversed"""
+    weight_str = f"{weight:06d}"
+    reversed_digits = weight_str[::-1]
+    payload_str = f"={reversed_digits}".strip()
+    # For transmit mode, send as string (not ASCII bytes)
+    payload_bytes = payload_str.encode('ascii')
+    return Payload(payload_str, payload_bytes, f"Sent: '{payload_str}' ({len(payload_bytes)} bytes)")
+
+
+def replay_payload(data):
+    """Transmit frame for recorded bytes"""
+    text = data.decode('ascii', errors='ignore').strip()
+    return Payload(text, data, f"Sent: '{text}' ({len(data)} bytes)")
+
+
+def _timer_schedule(delay_ms, callback):
+    """Default scheduler: run callback on a timer thread after delay_ms"""
+    timer = threading.Timer(delay_ms / 1000.0, callback)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class SerialEngine:
+    """GUI-free transmit/receive/command engine for one serial port.
+
+    The engine reports back through optional callbacks so it can be driven
+    headless from the CLI or wrapped by the Tk front end:
+
+    - on_log(message, level): every log line
+    - on_status(text, color): connection status changes
+    - on_error(title, message): errors that should be shown to the user
+    - on_state(running): the running flag changed
+    - schedule(delay_ms, callback): deferred calls (Tk passes root.after)
+    """
+
+    def __init__(self, settings=None, on_log=None, on_status=None, on_error=None,
+                 on_state=None, schedule=None, pool=None):
+        # Serial connection variables
+        self.ser = None
+        self.running = False
+        self.thread = None
+        self.receive_thread = None
+        self.close_timer = None
+        self.command_client = None
+        self.sequence_runner = None
+        self.replay_player = None
+        self.loopback_test = None
+        self.loopback_results = []  # stats of each baud rate tested by the last loopback run
+        self.stop_event = threading.Event()
+        self.scheduler = None
+        self.capture = None
+        self.tracer = None  # serial_trace.Tracer while stage timing is on
+        self.supervisor = None  # ReconnectSupervisor for the run when auto_reconnect is on
+
+        # Receive framer (its buffer holds a partial frame) and traffic counters, reset by start()
+        self.framer = make_framer("line")
+        self.rx_buffer = self.framer.buffer
+        self.rx_last = 0.0
+        self.rx_weight = None  # last weight decoded from a '=' frame
+        # Kept across runs: reconnects happen between them
+        self.reconnects = 0
+        self.reconnect_failures = 0
+        self.reset_counters()
+
+        self.settings = dict(DEFAULT_SETTINGS)
+        if settings:
+            self.settings.update(settings)
+
+        self.log_prefix = ""  # e.g. "[COM4] " when several sessions share the log file
+        self.on_log = on_log
+        self.on_status = on_status
+        self.on_error = on_error
+        self.on_state = on_state
+        self.schedule = schedule or _timer_schedule
+        self.pool = pool  # PortPool keeping command-mode handles open between commands
+
+        # Waveform frames for transmit mode, built by refresh_payload()
+        self.frame_table = ()
+        self.frame_table_spec = ""
+        self.frame_index = 0
+        self.batcher = None  # FrameBatcher for tx_batch > 1, rebuilt with the payload
+        self.payload = self.build_payload()
+
+    def log_message(self, message, level="INFO"):
+        """Write message to the log and forward it to the front end"""
+        tracer = self.tracer
+        start = tracer.clock() if tracer else 0
+        write_log(self.log_prefix + message if self.log_prefix else message, level)
+        if self.on_log:
+            self.on_log(message, level)
+        if tracer:
+            tracer.lap(LOG, start)
+
+    def update_status(self, status_text, color="blue"):
+        """Report connection status"""
+        if self.on_status:
+            self.on_status(status_text, color)
+
+    def report_error(self, title, message):
+        """Surface an error to the user, if a front end is attached"""
+        if self.on_error:
+            self.on_error(title, message)
+
+    def set_running(self, running):
+        """Set the running flag and notify the front end"""
+        self.running = running
+        if self.on_state:
+            self.on_state(running)
+
+    def build_payload(self):
+        """Build the Payload for the current mode"""
+        if self.settings["mode"] == "transmit":
+            return weight_payload(self.settings["base_weight"])
+        elif self.settings["mode"] == "command":
+            # Check if custom command is provided
+            if self.settings["custom_command"]:
+                payload_str = self.settings["custom_command"]
+            else:
+                payload_str = self.settings["selected_command"]
+            payload_bytes = encode_command(payload_str)
+            return Payload(payload_str, payload_bytes,
+                           f"Sent: '{payload_str}' → bytes {list(payload_bytes)} ({len(payload_bytes)} bytes)")
+        # Should not happen, but just in case
+        return Payload("", b"", "")
+
+    def refresh_payload(self):
+        """Rebuild the cached payload (and waveform frame table) from the current settings.
+
+        Raises WaveformError for a bad waveform spec.
+        """
+        self.payload = self.build_payload()
+        spec = self.settings["waveform"] if self.settings["mode"] == "transmit" else ""
+        if spec != self.frame_table_spec:
+            # Compiled once per spec; every frame after that is a table lookup
+            self.frame_table = build_frame_table(compile_waveform(spec), weight_payload) if spec else ()
+            self.frame_table_spec = spec
+        self.frame_index = 0
+        self.batcher = None
+
+    def check_payload(self):
+        """Rebuild the payload now, returns False (error reported) if the waveform spec is bad"""
+        try:
+            self.refresh_payload()
+            return True
+        except WaveformError as e:
+            self.report_error("Waveform Error", str(e))
+            self.log_message(f"ERROR: Invalid waveform '{self.settings['waveform']}': {e}", "ERROR")
+            return False
+
+    def update_settings(self, new_settings):
+        """Apply new settings, rebuilding the payload only if it is affected"""
+        changed = any(self.settings.get(key) != value
+                      for key, value in new_settings.items() if key in PAYLOAD_KEYS)
+        self.settings.update(new_settings)
+        if changed:
+            try:
+                self.refresh_payload()
+            except WaveformError:
+                self.frame_table_spec = None  # reported when transmission starts
+
+    def is_port_available(self, port_name):
+        """Check if a port is available"""
+        # A lightweight probe, not a full open; URLs are left to the real open
+        return probe_port(port_name) in (FREE, UNKNOWN)
+
+    def port_attributes(self):
+        """pyserial line settings for the current settings"""
+        return {
+            "baudrate": self.settings["baud_rate"],
+            "parity": PARITY_MAP.get(self.settings["parity"], serial.PARITY_NONE),
+            "bytesize": self.settings["data_bits"],
+            "stopbits": STOP_BITS_MAP.get(self.settings["stop_bits"], serial.STOPBITS_ONE)
+        }
+
+    def open_handle(self, port):
+        """pyserial handle for port with the current line settings; raises if it cannot be opened"""
+        # A failed open raises; no test write needed (it only cost a flush per open)
+        return serial.serial_for_url(
+            port,
+            timeout=1,
+            write_timeout=1,  # Added write timeout
+            **self.port_attributes()
+        )
+
+    def open_serial_port(self):
+        """Open serial port with current settings - with better error handling"""
+        if self.pool is not None:
+            self.pool.discard(self.settings["com_port"])  # its idle handle would keep the port busy
+        try:
+            self.ser = self.open_handle(self.settings["com_port"])
+
+            self.log_message(f"SUCCESS: Opened {self.settings['com_port']} at {self.settings['baud_rate']} baud")
+            self.update_status("Connected", "green")
+            return True
+
+        except PermissionError:
+            error_msg = f"Port '{self.settings['com_port']}' is in use by another program. Please close any other applications using this port."
+            self.report_error("Port Access Denied", error_msg)
+            self.log_message(f"ERROR: Port access denied - {error_msg}", "ERROR")
+            self.update_status("Connection Failed", "red")
+            return False
+
+        except serial.SerialException as e:
+            error_msg = f"Serial error: {e}"
+            self.report_error("Serial Error", error_msg)
+            self.log_message(f"ERROR: Serial exception - {error_msg}", "ERROR")
+            self.update_status("Connection Failed", "red")
+            return False
+
+        except Exception as e:
+            error_msg = f"Unexpected error: {e}"
+            self.report_error("Connection Error", error_msg)
+            self.log_message(f"ERROR: Unexpected error - {error_msg}", "ERROR")
+            self.update_status("Connection Failed", "red")
+            return False
+
+    def close_serial_port(self):
+        """Close serial port safely"""
+        if self.ser and self.ser.is_open:
+            try:
+                self.ser.close()
+                self.log_message("Port closed successfully")
+                self.update_status("Not Connected", "blue")
+            except Exception as e:
+                self.log_message(f"Error closing port: {e}", "ERROR")
+
+    def open_capture(self):
+        """Start recording raw traffic if a capture file is configured, returns False on failure"""
+        if self.capture or not self.settings["capture_file"]:
+            return True
+        try:
+            self.capture = CaptureWriter(self.settings["capture_file"])
+            self.log_message(f"Capturing raw traffic to {self.settings['capture_file']}")
+            return True
+        except OSError as e:
+            self.report_error("Capture Error", f"Cannot create capture file: {e}")
+            self.log_message(f"ERROR: Cannot create capture file - {e}", "ERROR")
+            return False
+
+    def close_capture(self):
+        """Finish the capture file, if one is being written"""
+        if self.capture:
+            capture, self.capture = self.capture, None
+            capture.close()
+            self.log_message(f"Capture saved to {capture.path} ({capture.frames} frames)")
+
+    def is_open(self):
+        """Return True if the serial port is open"""
+        return bool(self.ser and self.ser.is_open)
+
+    def reset_counters(self):
+        """Zero the traffic counters"""
+        self.tx_bytes = 0
+        self.tx_frames = 0
+        self.rx_bytes = 0
+        self.rx_frames = 0
+        self.rx_weights = 0
+        self.decode_errors = 0  # non-ASCII bytes or an unreadable '=' weight
+        self.zero_writes = 0
+        self.partial_writes = 0
+        self.serial_errors = 0
+        # Port calls, and write syscalls measured for the transmit thread (Linux) while it runs
+        self.tx_writes = 0
+        self.tx_flushes = 0
+        self.unflushed = 0
+        self.tx_thread = None
+        self.tx_syscalls_start = None
+        self.tx_write_syscalls = None
+        self.started_at = time.monotonic()
+
+    def throughput(self):
+        """Traffic counters and rates since start()"""
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        syscalls = self.write_syscalls()
+        stats = {
+            "port": self.settings["com_port"],
+            "mode": self.settings["mode"],
+            "running": self.running,
+            "elapsed_s": round(elapsed, 3),
+            "tx_frames": self.tx_frames,
+            "tx_bytes": self.tx_bytes,
+            "rx_frames": self.rx_frames,
+            "rx_bytes": self.rx_bytes,
+            "rx_weights": self.rx_weights,
+            "last_weight": self.rx_weight,
+            "rx_dropped_bytes": self.framer.dropped,
+            "decode_errors": self.decode_errors,
+            "zero_writes": self.zero_writes,
+            "partial_writes": self.partial_writes,
+            "serial_errors": self.serial_errors,
+            "missed_deadlines": self.scheduler.missed if self.scheduler else 0,
+            "reconnects": self.reconnects,
+            "reconnect_failures": self.reconnect_failures,
+            "tx_writes": self.tx_writes,
+            "tx_flushes": self.tx_flushes,
+            "tx_write_syscalls": syscalls,
+            "port_calls_per_frame": round((self.tx_writes + self.tx_flushes) / self.tx_frames, 3) if self.tx_frames else 0.0,
+            "write_syscalls_per_frame": round(syscalls / self.tx_frames, 3) if syscalls is not None and self.tx_frames else None,
+            "tx_frames_per_s": round(self.tx_frames / elapsed, 2),
+            "rx_frames_per_s": round(self.rx_frames / elapsed, 2),
+            "tx_bytes_per_s": round(self.tx_bytes / elapsed, 1),
+            "rx_bytes_per_s": round(self.rx_bytes / elapsed, 1)
+        }
+        supervisor = self.supervisor
+        stats.update(supervisor.stats() if supervisor else NO_OUTAGES)
+        return stats
+
+    def write_syscalls(self):
+        """write() syscalls made by the transmit thread this run (Linux), or None"""
+        thread = self.tx_thread
+        if thread is None or self.tx_syscalls_start is None:
+            return self.tx_write_syscalls
+        now = thread_write_syscalls(thread)
+        return None if now is None else now - self.tx_syscalls_start
+
+    def serial_error(self, error):
+        """Count and log an error on the open port"""
+        self.serial_errors += 1
+        self.log_message(f"Serial error: {error}", "ERROR")
+
+    def next_payload(self):
+        """The next waveform frame, or the cached payload"""
+        # Prebuilt by update_settings(); a single reference read per frame
+        table = self.frame_table
+        if table:
+            payload = table[self.frame_index]
+            self.frame_index = (self.frame_index + 1) % len(table)
+            return payload
+        return self.payload
+
+    def send_payload(self, payload=None):
+        """Write a payload (default: the next one) once, record and log it. Returns bytes written"""
+        if payload is None:
+            payload = self.next_payload()
+
+        bytes_written = self.write_tx(payload.data)
+        if bytes_written:
+            self.tx_bytes += bytes_written
+            self.tx_frames += 1
+            if self.capture:
+                self.capture.write(payload.data[:bytes_written], TX, self.settings["com_port"])
+
+        if bytes_written == 0:
+            self.zero_writes += 1
+            self.log_message("No bytes written - possible serial issue", "WARNING")
+        elif bytes_written == len(payload.data):
+            if self.scheduler:
+                self.scheduler.count_sent()
+            self.log_message(payload.sent_message)
+        else:
+            # Partial write: show the actual count
+            self.partial_writes += 1
+            self.log_message(f"Sent: '{payload.text}' ({bytes_written} of {len(payload.data)} bytes)")
+        return bytes_written
+
+    def write_tx(self, data):
+        """Write data, flushing every tx_flush_every writes. Returns bytes written"""
+        tracer = self.tracer
+        start = tracer.clock() if tracer else 0
+        bytes_written = self.ser.write(data)
+        self.tx_writes += 1
+        self.unflushed += 1
+        if tracer:
+            start = tracer.lap(WRITE, start)
+        flush_every = self.settings["tx_flush_every"]
+        if flush_every and self.unflushed >= flush_every:
+            self.flush_tx()
+            if tracer:
+                tracer.lap(FLUSH, start)
+        return bytes_written
+
+    def flush_tx(self):
+        """Block until the OS has sent everything written so far"""
+        self.ser.flush()
+        self.tx_flushes += 1
+        self.unflushed = 0
+
+    def send_batch(self):
+        """Write the next tx_batch frames with one write, record and log them. Returns bytes written"""
+        batcher = self.batcher
+        if batcher is None:
+            batcher = self.batcher = FrameBatcher(self.settings["tx_batch"], self.frame_table, self.payload)
+        data, payloads = batcher.batch(self.frame_index)
+        self.frame_index = batcher.next_index(self.frame_index)
+
+        bytes_written = self.write_tx(data)
+        if not bytes_written:
+            self.zero_writes += 1
+            self.log_message("No bytes written - possible serial issue", "WARNING")
+            return 0
+        sent = len(payloads) if bytes_written == len(data) else complete_frames(payloads, bytes_written)
+        self.tx_bytes += bytes_written
+        self.tx_frames += sent
+        if self.scheduler:
+            self.scheduler.count_sent(sent)
+        capture = self.capture
+        port = self.settings["com_port"]
+        for payload in payloads[:sent]:
+            if capture:
+                capture.write(payload.data, TX, port)
+            self.log_message(payload.sent_message)
+        if sent < len(payloads):
+            # Partial write: the frame that was cut off, with its actual count
+            self.partial_writes += 1
+            payload = payloads[sent]
+            cut = bytes_written - sum(len(frame.data) for frame in payloads[:sent])
+            if capture:
+                capture.write(payload.data[:cut], TX, port)
+            self.log_message(f"Sent: '{payload.text}' ({cut} of {len(payload.data)} bytes)")
+        return bytes_written
+
+    def send_slot(self):
+        """Send the frames of one scheduler slot: tx_batch frames with one write, or one frame"""
+        if self.settings["tx_batch"] > 1:
+            return self.send_batch()
+        return self.send_payload()
+
+    def finish_writes(self):
+        """Flush what the last writes left unflushed, before the port is closed"""
+        if self.unflushed and self.is_open():
+            try:
+                self.flush_tx()
+            except serial.SerialException as e:
+                self.serial_error(e)
+
+    def write_summary(self):
+        """One-line count of port calls and write syscalls per frame for the run"""
+        stats = self.throughput()
+        syscalls = "" if stats["tx_write_syscalls"] is None else \
+            f", {stats['tx_write_syscalls']} write syscalls ({stats['write_syscalls_per_frame']}/frame)"
+        flush_every = self.settings["tx_flush_every"]
+        flushes = f"flush every {flush_every} writes" if flush_every else "flush at the end"
+        return (f"TX writes: {self.settings['tx_batch']} frames per write, {flushes}: {stats['tx_writes']} write() and "
+                f"{stats['tx_flushes']} flush() calls for {stats['tx_frames']} frames "
+                f"({stats['port_calls_per_frame']}/frame){syscalls}")
+
+    def process_received(self, data):
+        """Record a received chunk and log every complete frame in it"""
+        if self.capture:
+            self.capture.write(data, RX, self.settings["com_port"])
+        self.rx_bytes += len(data)
+        self.rx_last = time.monotonic()
+        frames = self.framer.feed(data)
+        if frames:
+            self.rx_frames += len(frames)
+            for frame in frames:
+                self.log_received(frame)
+
+    def flush_partial(self):
+        """Log the incomplete frame left in the receive buffer, if any"""
+        frame = self.framer.flush()
+        if frame:
+            self.rx_frames += 1
+            self.log_received(frame)
+
+    def build_framer(self):
+        """Framer for the rx_framing setting, or None (error reported)"""
+        try:
+            return make_framer(self.settings["rx_framing"])
+        except FramingError as e:
+            self.report_error("Framing Error", str(e))
+            self.log_message(f"ERROR: Invalid framing '{self.settings['rx_framing']}': {e}", "ERROR")
+            return None
+
+    def port_lost(self, error):
+        """Serial error on a worker thread: start reconnecting if auto_reconnect is on, else end the run.
+
+        Returns True if the loop should keep going.
+        """
+        self.serial_error(error)
+        supervisor = self.supervisor
+        if supervisor is None or not self.running:
+            self.set_running(False)
+            return False
+        if not supervisor.down:
+            supervisor.went_down()
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+            self.log_message(f"Port {describe(supervisor.identity)} lost, reconnecting "
+                             f"(backoff up to {supervisor.max_delay:g} s)", "WARNING")
+            self.update_status("Reconnecting...", "orange")
+        return True
+
+    def try_reconnect(self):
+        """Reopen the port if a reconnect attempt is due. Returns True once it is open again"""
+        supervisor = self.supervisor
+        if not self.running or not supervisor.attempt_due():
+            return False
+        device = find_port(supervisor.identity)
+        try:
+            if device is None:
+                raise serial.SerialException("not present")
+            ser = self.open_handle(device)
+        except (serial.SerialException, OSError, ValueError) as e:
+            self.reconnect_failures += 1
+            delay = supervisor.failed()
+            self.log_message(f"Reconnect attempt {supervisor.attempts} failed ({e}), next in {delay:.1f} s", "WARNING")
+            return False
+        self.ser = ser
+        if device != self.settings["com_port"]:
+            self.log_message(f"{describe(supervisor.identity)} is back as {device}")
+            self.settings["com_port"] = device
+        downtime = supervisor.came_back()
+        self.reconnects += 1
+        self.log_message(f"Reconnected to {device} after {downtime:.1f} s ({supervisor.attempts} attempts)")
+        self.update_status("Connected", "green")
+        return True
+
+    def resend_held(self):
+        """Send the frames held while the port was down, oldest first"""
+        held = self.supervisor.held
+        count = len(held)
+        while held:
+            self.send_payload(held[0])
+            held.popleft()  # only once it was written: a new outage keeps it held
+            self.supervisor.frames_resent += 1
+        if count:
+            self.log_message(f"Resent {count} frames held while the port was down, "
+                             f"{self.supervisor.stats()['frames_lost']} lost so far")
+
+    def transmit_while_down(self):
+        """One transmit slot with the port down: hold the frames due, reconnect when an attempt is due"""
+        supervisor = self.supervisor
+        if self.scheduler.period:
+            for _ in range(self.scheduler.frames_per_slot):
+                supervisor.hold(self.next_payload())
+        elif self.stop_event.wait(supervisor.until_next_attempt()):
+            return  # unpaced: no frames fall due, just wait for the attempt
+        if self.try_reconnect():
+            self.resend_held()
+
+    def transmit_loop(self):
+        """Continuously send payload in background thread at the configured rate"""
+        batch = self.settings["tx_batch"]
+        send = self.send_batch if batch > 1 else self.send_payload
+        self.scheduler = RateScheduler(self.settings["transmit_rate"], frames_per_slot=batch)
+        self.tx_thread = threading.get_native_id()
+        self.tx_syscalls_start = thread_write_syscalls(self.tx_thread)
+        while self.running:
+            try:
+                tracer = self.tracer  # read every frame: tracing can be switched on while running
+                start = tracer.clock() if tracer else 0
+                if not self.scheduler.wait(self.stop_event):
+                    break
+                if tracer:
+                    tracer.lap(WAIT, start)
+                if self.supervisor and self.supervisor.down:
+                    self.transmit_while_down()
+                    continue
+                send()
+
+            except serial.SerialException as e:
+                if not self.port_lost(e):
+                    break
+            except Exception as e:
+                self.log_message(f"Unexpected error: {e}", "ERROR")
+                self.set_running(False)
+                break
+
+        self.finish_writes()
+        self.tx_write_syscalls = self.write_syscalls()
+        self.tx_thread = None
+        self.log_message(self.scheduler.summary())
+        self.log_message(self.write_summary())
+
+    def log_received(self, data):
+        """Log one received frame, with its weight if it is a '=' weight frame"""
+        try:
+            if not data.isascii():
+                self.decode_errors += 1  # the non-ASCII bytes are left out of the log line
+            decoded_data = data.decode('ascii', errors='ignore').strip()
+            weight = decode_weight(data)
+            if weight is not None:
+                self.rx_weight = weight
+                self.rx_weights += 1
+                self.log_message(f"Received: '{decoded_data}' ({len(data)} bytes), weight {weight}")
+            else:
+                if data[:1] == b"=":
+                    self.decode_errors += 1
+                if decoded_data:
+                    self.log_message(f"Received: '{decoded_data}' ({len(data)} bytes)")
+        except Exception as decode_error:
+            self.decode_errors += 1
+            self.log_message(f"Received raw: {data} (decode error: {decode_error})", "WARNING")
+
+    def receive_loop(self):
+        """Continuously read data from serial port"""
+        if self.settings["read_mode"] == "event":
+            self.receive_loop_event()
+        else:
+            self.receive_loop_poll()
+
+    def receive_loop_event(self):
+        """Read data as soon as it arrives.
+
+        read() blocks in the OS (select on POSIX, overlapped I/O on Windows)
+        until at least one byte is there, so there is no polling delay. The
+        port timeout doubles as the inter-byte timeout: a partial line is
+        logged once the line has been silent for that long, and stop()
+        is noticed within the same interval.
+        """
+        original_timeout = self.ser.timeout
+        try:
+            self.ser.timeout = max(self.settings["inter_byte_timeout"], 1) / 1000.0
+        except Exception as e:
+            self.log_message(f"Unexpected error: {e}", "ERROR")
+            self.set_running(False)
+            return
+
+        while self.running:
+            try:
+                if self.supervisor and self.supervisor.down:
+                    if self.wait_reconnect():
+                        self.ser.timeout = max(self.settings["inter_byte_timeout"], 1) / 1000.0
+                    continue
+                tracer = self.tracer
+                start = tracer.clock() if tracer else 0
+                data = self.ser.read(self.ser.in_waiting or 1)
+                if tracer:
+                    start = tracer.lap(READ, start)
+                if data:
+                    self.process_received(data)
+                else:
+                    # Line went quiet without a newline
+                    self.flush_partial()
+                if tracer:
+                    tracer.lap(PROCESS, start)
+
+            except serial.SerialException as e:
+                if not self.running:
+                    break  # read cancelled by stop()
+                if not self.port_lost(e):
+                    break
+            except Exception as e:
+                self.log_message(f"Unexpected error: {e}", "ERROR")
+                self.set_running(False)
+                break
+
+        # Leave the port as open_serial_port() configured it
+        try:
+            self.ser.timeout = original_timeout
+        except Exception:
+            pass
+
+    def wait_reconnect(self):
+        """Receive side of an outage: sleep until the next attempt is due and make it. True once reconnected"""
+        if self.stop_event.wait(self.supervisor.until_next_attempt()):
+            return False
+        return self.try_reconnect()
+
+    def receive_loop_poll(self):
+        """Poll in_waiting every 100 ms and read what has arrived (original timing)"""
+        idle = self.settings["inter_byte_timeout"] / 1000.0
+        while self.running:
+            try:
+                if self.supervisor and self.supervisor.down:
+                    self.wait_reconnect()
+                    continue
+                tracer = self.tracer
+                start = tracer.clock() if tracer else 0
+                waiting = self.ser.in_waiting if self.ser else 0
+                if waiting > 0:
+                    data = self.ser.read(waiting)
+                    if tracer:
+                        start = tracer.lap(READ, start)
+                    self.process_received(data)
+                    if tracer:
+                        start = tracer.lap(PROCESS, start)
+                elif self.rx_buffer and time.monotonic() - self.rx_last >= idle:
+                    # Line went quiet without completing a frame
+                    self.flush_partial()
+                    if tracer:
+                        start = tracer.lap(PROCESS, start)
+                time.sleep(0.1)
+                if tracer:
+                    tracer.lap(WAIT, start)
+
+            except serial.SerialException as e:
+                if not self.port_lost(e):
+                    break
+            except Exception as e:
+                self.log_message(f"Unexpected error: {e}", "ERROR")
+                self.set_running(False)
+                break
+
+    def start(self, spawn_threads=True):
+        """Start transmission/reception, opening the port if needed. Returns True on success.
+
+        With spawn_threads=False no worker thread is started; the caller
+        (e.g. SessionManager) drives send_payload()/process_received() itself.
+        """
+        program = None
+        if self.settings["mode"] == "command" and self.settings["sequence_file"]:
+            # Compile before opening the port, so a bad file costs nothing
+            program = self.load_sequence()
+            if program is None:
+                return False
+        player = None
+        if self.settings["mode"] == "transmit" and self.settings["replay_file"]:
+            player = self.open_replay()
+            if player is None:
+                return False
+        test = None
+        if self.settings["mode"] == "loopback":
+            test = self.make_loopback()
+            if test is None:
+                return False
+
+        if not self.prepare():
+            return False
+
+        if program is not None:
+            self.start_sequence(program)
+            return True
+        if player is not None:
+            self.start_replay(player)
+            return True
+        if test is not None:
+            self.start_loopback(test)
+            return True
+        if self.settings["mode"] == "command":
+            # Send command once
+            self.send_single_command_with_delay()
+            return True
+
+        if spawn_threads:
+            self.start_workers()
+        if self.settings["mode"] == "transmit":
+            self.log_message("Transmission started.")
+        else:
+            self.log_message("Reception started.")
+        return True
+
+    def open_checked(self):
+        """Check the port is free, then open it. Returns True on success"""
+        if not self.is_port_available(self.settings["com_port"]):
+            self.report_error("Port Unavailable",
+                              f"Port {self.settings['com_port']} is currently in use.\n"
+                              "Please close other applications using this port.")
+            self.log_message(f"ERROR: Port {self.settings['com_port']} is unavailable", "ERROR")
+            return False
+        return self.open_serial_port()
+
+    def prepare(self):
+        """Open the port (if needed) and the capture, and reset state for a new run. Returns True on success"""
+        # Settings may have been edited in place since the last update_settings();
+        # a bad waveform is reported before the port is touched
+        if not self.check_payload():
+            return False
+        framer = self.build_framer()
+        if framer is None:
+            return False
+
+        # If port is not open, try to open it
+        if not self.is_open():
+            port = self.settings["com_port"]
+            if self.pool is not None and self.settings["mode"] == "command":
+                self.ser, reused = self.pool.acquire(port, self.port_attributes(),
+                                                     lambda: self.ser if self.open_checked() else None)
+                if self.ser is None:
+                    return False
+                if reused:
+                    stats = self.pool.stats()
+                    self.log_message(f"Reusing open handle for {port} "
+                                     f"(opened {stats['opened']}, reused {stats['reused']})")
+                    self.update_status("Connected", "green")
+            else:
+                if self.pool is not None:
+                    self.pool.discard(port)  # the pool's idle handle would keep the port busy
+                if not self.open_checked():
+                    return False
+
+        if not self.open_capture():
+            return False
+
+        self.reset_counters()
+        self.scheduler = None  # missed deadlines belong to the run that made them
+        self.supervisor = None
+        if self.settings["auto_reconnect"] and self.settings["mode"] in ("transmit", "receive"):
+            self.supervisor = ReconnectSupervisor(port_identity(self.settings["com_port"]),
+                                                  self.settings["reconnect_max_delay"], self.settings["resend_queue"])
+        self.framer = framer
+        self.rx_buffer = framer.buffer
+        self.rx_weight = None
+        self.stop_event.clear()
+        self.set_running(True)
+        return True
+
+    def start_workers(self):
+        """Start the worker thread for the current mode"""
+        if self.settings["mode"] == "transmit":
+            self.thread = threading.Thread(target=self.transmit_loop, name="serial-transmit", daemon=True)
+            self.thread.start()
+        else:
+            self.receive_thread = threading.Thread(target=self.receive_loop, name="serial-receive", daemon=True)
+            self.receive_thread.start()
+
+    def send_command(self):
+        """Write the selected command once, record and log it. Returns bytes written"""
+        payload = self.payload
+
+        bytes_written = self.ser.write(payload.data)
+        self.ser.flush()
+        if bytes_written:
+            self.tx_bytes += bytes_written
+            self.tx_frames += 1
+            if self.capture:
+                self.capture.write(payload.data[:bytes_written], TX, self.settings["com_port"])
+        self.log_message(f"Sent command: '{payload.text}' → bytes {list(payload.data)} ({bytes_written} bytes)")
+        return bytes_written
+
+    def load_sequence(self):
+        """Compile the sequence file, returns the Program or None (error reported)"""
+        path = self.settings["sequence_file"]
+        try:
+            return load_sequence(path)
+        except (OSError, SequenceError) as e:
+            self.report_error("Sequence Error", str(e))
+            self.log_message(f"ERROR: Could not load sequence {path}: {e}", "ERROR")
+            return None
+
+    def start_sequence(self, program):
+        """Run a compiled sequence on a worker thread"""
+        self.sequence_runner = SequenceRunner(program, self.ser, on_log=self.log_message, capture=self.capture,
+                                              port=self.settings["com_port"])
+        # stop() closes the client, which ends a wait for a reply at once
+        self.command_client = self.sequence_runner.client
+        self.thread = threading.Thread(target=self.sequence_loop, daemon=True)
+        self.thread.start()
+        self.log_message(f"Sequence started: {program.name} ({len(program.steps)} steps)")
+
+    def sequence_loop(self):
+        """Worker thread: run the sequence, then close the port unless it should stay open"""
+        runner = self.sequence_runner
+        try:
+            runner.run(self.stop_event)
+        except serial.SerialException as e:
+            if self.running:
+                self.serial_error(e)
+        except Exception as e:
+            self.log_message(f"Unexpected error: {e}", "ERROR")
+        self.tx_frames += runner.sends
+        self.log_message(runner.summary())
+        if not self.running:
+            return  # stop() closes the port
+        self.command_client = None
+        if self.settings["keep_port_open"]:
+            self.log_message("Port kept open as requested.")
+            self.set_running(False)
+        else:
+            self.finish_command(message="Sequence finished and port closed.")
+
+    def open_replay(self):
+        """Open the replay recording, returns a ReplayPlayer or None (error reported)"""
+        path = self.settings["replay_file"]
+        try:
+            frames = open_recording(path, self.settings["replay_direction"])
+        except (OSError, ValueError) as e:
+            self.report_error("Replay Error", str(e))
+            self.log_message(f"ERROR: Could not open recording {path}: {e}", "ERROR")
+            return None
+        return ReplayPlayer(frames, speed=self.settings["replay_speed"], name=path)
+
+    def start_replay(self, player):
+        """Send a recording on a worker thread"""
+        self.replay_player = player
+        self.thread = threading.Thread(target=self.replay_loop, daemon=True)
+        self.thread.start()
+        speed = f"{player.speed:g}x speed" if player.speed else "max rate"
+        self.log_message(f"Replay started: {player.name} at {speed}")
+
+    def replay_loop(self):
+        """Worker thread: send the recorded frames on their schedule, then close the port"""
+        player = self.replay_player
+        frames = player.play(self.stop_event)
+        try:
+            for data in frames:
+                self.send_payload(replay_payload(data))
+        except serial.SerialException as e:
+            if self.running:
+                self.serial_error(e)
+        except Exception as e:
+            self.log_message(f"Unexpected error: {e}", "ERROR")
+        frames.close()  # ends the timing and closes the recording after an error
+        self.log_message(player.summary())
+        if self.running:
+            self.finish_command(reuse=False, message="Replay finished and port closed.")
+
+    def make_loopback(self):
+        """LoopbackTest for the current settings, or None (error reported)"""
+        settings = self.settings
+        try:
+            if settings["loopback_seconds"] <= 0:
+                raise LoopbackError("test time per baud rate must be positive")
+            return LoopbackTest(settings["loopback_block"], settings["loopback_pattern"], settings["data_bits"],
+                                settings["parity"], settings["stop_bits"])
+        except LoopbackError as e:
+            self.report_error("Loopback Error", str(e))
+            self.log_message(f"ERROR: Invalid loopback test: {e}", "ERROR")
+            return None
+
+    def loopback_rates(self):
+        """Baud rates to test: all of BAUD_RATES when sweeping, else the configured one"""
+        return list(BAUD_RATES) if self.settings["loopback_sweep"] else [self.settings["baud_rate"]]
+
+    def start_loopback(self, test):
+        """Run the loopback test on a worker thread"""
+        self.loopback_test = test
+        self.loopback_results = []
+        self.thread = threading.Thread(target=self.loopback_loop, name="serial-loopback", daemon=True)
+        self.thread.start()
+        rates = self.loopback_rates()
+        at = f"{len(rates)} baud rates" if len(rates) > 1 else f"{rates[0]} baud"
+        self.log_message(f"Loopback test started: {test.block_size} byte {test.pattern} blocks at {at}, "
+                         f"{self.settings['loopback_seconds']:g} s each")
+
+    def loopback_loop(self):
+        """Worker thread: run the loopback test at each baud rate, then close the port"""
+        test = self.loopback_test
+        try:
+            for baud in self.loopback_rates():
+                if self.stop_event.is_set():
+                    break
+                self.ser.baudrate = baud
+                stats = test.run(self.ser, self.settings["loopback_seconds"], self.stop_event)
+                self.tx_bytes += stats["bytes_sent"]
+                self.tx_frames += stats["blocks_sent"]
+                self.rx_bytes += stats["bytes_received"]
+                self.rx_frames += stats["blocks_received"]
+                self.loopback_results.append(stats)
+                self.log_message(test.summary(), "INFO" if stats["passed"] or not stats["completed"] else "WARNING")
+        except serial.SerialException as e:
+            if self.running:
+                self.serial_error(e)
+        except Exception as e:
+            self.log_message(f"Unexpected error: {e}", "ERROR")
+        if self.running:
+            self.finish_command(reuse=False, message="Loopback test finished and port closed.")
+
+    def send_matched_command(self, timeout):
+        """Send the selected command through a CommandClient and log its reply and round-trip time"""
+        payload = self.payload
+        self.command_client = client = CommandClient(
+            self.ser, timeout=timeout, on_log=self.log_message, capture=self.capture,
+            port=self.settings["com_port"]).start()
+        future = client.send(payload.text, payload.data)
+        self.tx_bytes += len(payload.data)
+        self.tx_frames += 1
+        self.log_message(f"Sent command: '{payload.text}' → bytes {list(payload.data)} ({len(payload.data)} bytes)")
+
+        def on_reply(done):
+            try:
+                reply = done.result()
+            except Exception:
+                return  # timeout already logged by the client
+            self.rx_bytes += len(reply.data)
+            self.rx_frames += 1
+            text = reply.data.decode('ascii', errors='ignore').strip()
+            self.log_message(f"Reply to '{reply.command}' in {reply.rtt * 1000:.1f} ms: '{text}'")
+
+        future.add_done_callback(on_reply)
+
+    def close_command_client(self):
+        if self.command_client:
+            self.command_client.close()
+            self.command_client = None
+
+    def send_single_command_with_delay(self):
+        """Send selected command once, wait for delay, then close port"""
+        try:
+            # If "Keep Port Open" is checked, don't close
+            if self.settings["keep_port_open"]:
+                self.send_command()
+                self.log_message("Port kept open as requested.")
+                self.set_running(False)
+            else:
+                # Use configured delay; a reply within the delay is matched to the command
+                delay_ms = self.settings["delay_time"]
+                self.send_matched_command(delay_ms / 1000.0)
+                self.close_timer = self.schedule(delay_ms, self.finish_command)
+
+        except Exception as e:
+            self.log_message(f"Failed to send command: {e}", "ERROR")
+            self.finish_command(reuse=False)  # Clean up even on error
+
+    def finish_command(self, reuse=True, message="Command sent and port closed after delay."):
+        """Close the port once the command delay has passed (or hand it back to the pool)"""
+        self.set_running(False)
+        self.close_command_client()
+        if reuse and self.pool is not None and self.is_open():
+            self.pool.release(self.settings["com_port"], self.ser)
+            self.ser = None
+            self.update_status("Not Connected", "blue")
+            self.close_capture()
+            self.log_message(f"Command sent; port kept open for reuse for {self.pool.idle_timeout:g} s.")
+            return
+        self.close_serial_port()
+        self.close_capture()
+        self.log_message(message)
+
+    def attempt_reconnect(self):
+        """Reopen the serial port, returns True on success"""
+        if self.open_serial_port():
+            self.reconnects += 1
+            self.log_message("Successfully reconnected to serial port.")
+            return True
+        self.reconnect_failures += 1
+        self.log_message("Reconnection failed. Please check port availability.")
+        return False
+
+    def disconnect(self):
+        """Manually disconnect from serial port, returns False if it was already closed"""
+        pooled = self.pool is not None and self.pool.discard(self.settings["com_port"])
+        if not self.is_open():
+            if pooled:
+                self.log_message("Closed the handle kept open for reuse.")
+            return pooled
+        self.close_command_client()
+        self.close_serial_port()
+        self.set_running(False)
+        self.close_capture()
+        self.log_message("Manually disconnected from serial port.")
+        return True
+
+    def join(self, timeout=None):
+        """Wait for the worker threads (and a pending command close) to finish"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in (self.thread, self.receive_thread, self.close_timer):
+            if isinstance(worker, threading.Thread) and worker.is_alive():
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                worker.join(remaining)
+
+    def stop(self):
+        """Stop transmission/reception"""
+        self.running = False
+        self.stop_event.set()
+        self.close_command_client()
+        # Wake a reader blocked in read() (supported on POSIX ports)
+        if self.is_open() and hasattr(self.ser, "cancel_read"):
+            try:
+                self.ser.cancel_read()
+            except Exception:
+                pass
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=3)
+            if self.thread.is_alive():
+                self.log_message("Transmission thread did not stop gracefully.", "WARNING")
+        if self.receive_thread and self.receive_thread.is_alive():
+            self.receive_thread.join(timeout=3)
+            if self.receive_thread.is_alive():
+                self.log_message("Reception thread did not stop gracefully.", "WARNING")
+        self.close_serial_port()
+        self.close_capture()
+        if self.supervisor:
+            self.supervisor.finish()
+            stats = self.supervisor.stats()
+            if stats["outages"]:
+                self.log_message(f"Outages: {stats['outages']}, down {stats['downtime_s']} s in total, "
+                                 f"{stats['frames_resent']} frames resent, {stats['frames_lost']} lost")
+        self.log_message("Transmission/reception stopped by user.")
+        self.set_running(False)
@@ -0,0 +1,182 @@
+"""Incremental framing of the receive stream.
+
+A framer is fed whatever chunk was read from the port, of any size and
+split anywhere, and returns the complete frames in it. The incomplete
+rest stays in its buffer until more data arrives, or until flush() is
+called once the line has been quiet for the inter-byte timeout. The work
+is done by bytearray/bytes methods and regular expressions on the whole
+chunk, never by a Python loop over the bytes.
+
+Framing specs (FRAMINGS):
+
+    line              frames end with \\n (kept in the frame)
+    cr                frames end with \\r
+    delimiter:TEXT    frames end with TEXT, backslash escapes allowed, e.g. delimiter:\\r\\n
+    fixed:N           every N bytes are a frame
+    stx               frames are STX ... ETX (0x02 ... 0x03), markers removed
+    weight            '=' and 6 characters, the transmit mode format; no terminator needed,
+                      a \r\n after the frame (as indicators send it) is skipped
+    weight:N          '=' and N characters
+
+Bytes that cannot belong to a frame (outside STX/ETX, before '=') are
+dropped and counted. decode_weight() reads the number in a '=' frame.
+"""
+import re
+import codecs
+
+# Offered in the GUI; any spec described above works
+FRAMINGS = ["line", "cr", "weight", "stx", "delimiter:\\r\\n", "fixed:8"]
+WEIGHT_DIGITS = 6
+STX, ETX = b"\x02", b"\x03"
+
+
+class FramingError(ValueError):
+    """A framing spec that cannot be used"""
+
+
+class Framer:
+    """Base framer: holds the partial frame; subclasses implement feed()"""
+
+    def __init__(self):
+        self.buffer = bytearray()  # only ever changed in place, callers may hold a reference
+        self.dropped = 0
+
+    def feed(self, data):
+        """Add a chunk, return the list of complete frames (bytes) in arrival order"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Return the incomplete frame (None if there is none) and clear the buffer"""
+        if not self.buffer:
+            return None
+        frame = bytes(self.buffer)
+        self.buffer.clear()
+        return frame
+
+
+class DelimiterFramer(Framer):
+    """Frames ending with a delimiter, which stays part of the frame"""
+
+    def __init__(self, delimiter=b"\n"):
+        super().__init__()
+        if not delimiter:
+            raise FramingError("the delimiter must not be empty")
+        self.delimiter = delimiter
+
+    def feed(self, data):
+        buffer = self.buffer
+        delimiter = self.delimiter
+        # Only the new bytes (and a delimiter split across chunks) need searching
+        start = max(0, len(buffer) - len(delimiter) + 1)
+        buffer += data
+        if buffer.find(delimiter, start) < 0:
+            return []
+        end = buffer.rfind(delimiter) + len(delimiter)
+        parts = bytes(buffer[:end]).split(delimiter)
+        del buffer[:end]
+        parts.pop()  # empty: the chunk ended with a delimiter
+        return [part + delimiter for part in parts]
+
+
+class FixedLengthFramer(Framer):
+    """Frames of a fixed number of bytes"""
+
+    def __init__(self, length):
+        super().__init__()
+        if length < 1:
+            raise FramingError("the frame length must be at least 1")
+        self.length = length
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        length = self.length
+        end = len(buffer) - len(buffer) % length
+        if not end:
+            return []
+        block = bytes(buffer[:end])
+        del buffer[:end]
+        return [block[start:start + length] for start in range(0, end, length)]
+
+
+class PatternFramer(Framer):
+    """Frames matched by a regular expression; bytes between matches are dropped.
+
+    start is the byte(s) every frame begins with: an incomplete frame is
+    kept from its start, anything before it is dropped. group selects the
+    part of the match returned as the frame. trailer matches optional bytes
+    after a frame (a line ending) that are skipped without counting them as
+    dropped, also when a chunk ends between the frame and its trailer.
+    """
+
+    def __init__(self, pattern, start, group=0, trailer=None):
+        super().__init__()
+        self.pattern = re.compile(pattern + (b"(?:" + trailer + b")" if trailer else b""), re.DOTALL)
+        self.trailer = re.compile(trailer) if trailer else None
+        self.start = start
+        self.group = group
+        self.after_frame = False  # the buffer starts where a frame (or part of its trailer) ended
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        skip = self.trailer.match(buffer).end() if self.after_frame else 0
+        matches = list(self.pattern.finditer(buffer, skip))
+        end = matches[-1].end() if matches else skip
+        keep = buffer.find(self.start, end)
+        if keep < 0:
+            keep = len(buffer)
+        self.dropped += keep - skip - sum(match.end() - match.start() for match in matches)
+        if self.trailer:
+            self.after_frame = end == len(buffer) and bool(matches or skip or self.after_frame)
+        group = self.group
+        frames = [match.group(group) for match in matches]
+        del buffer[:keep]
+        return frames
+
+
+def make_framer(spec):
+    """Framer for a framing spec (see FRAMINGS); raises FramingError"""
+    name, _, argument = spec.strip().partition(":")
+    name = name.lower()
+    if name == "line" and not argument:
+        return DelimiterFramer(b"\n")
+    if name == "cr" and not argument:
+        return DelimiterFramer(b"\r")
+    if name == "delimiter":
+        try:
+            delimiter = codecs.decode(argument, "unicode_escape").encode("latin-1")
+        except (UnicodeError, ValueError) as e:
+            raise FramingError(f"delimiter: {e}") from None
+        return DelimiterFramer(delimiter)
+    if name == "fixed":
+        try:
+            return FixedLengthFramer(int(argument))
+        except ValueError:
+            raise FramingError("fixed needs a frame length, e.g. fixed:8") from None
+    if name == "stx" and not argument:
+        return PatternFramer(re.escape(STX) + rb"([^" + re.escape(ETX) + rb"]*)" + re.escape(ETX), STX, group=1)
+    if name == "weight":
+        try:
+            digits = int(argument) if argument else WEIGHT_DIGITS
+        except ValueError:
+            raise FramingError("weight takes a digit count, e.g. weight:6") from None
+        if digits < 1:
+            raise FramingError("weight needs at least 1 digit")
+        return PatternFramer(rb"(=[^=\r\n]{%d})" % digits, b"=", group=1, trailer=rb"\r?\n?")
+    raise FramingError(f"unknown framing '{spec}', use line, cr, delimiter:TEXT, fixed:N, stx or weight")
+
+
+def decode_weight(frame):
+    """Number in a '=' frame whose digits are reversed (as transmit mode sends them), or None"""
+    if frame[:1] != b"=":
+        return None
+    digits = frame[1:].strip()[::-1]
+    try:
+        return int(digits)
+    except ValueError:
+        pass
+    try:
+        return float(digits)
+    except ValueError:
+        return None
@@ -0,0 +1,1046 @@
+import tkinter as tk
+import os
+import tkinter.font as tkfont
+from tkinter import ttk, messagebox, filedialog
+
+from serial_engine import SerialEngine, COMMAND_LIST, MODES, BAUD_RATES
+from serial_logging import configure_logging, set_log_tracer
+from serial_logview import LogSink, LogRingBuffer, DRAIN_INTERVAL_MS, LOG_CAPACITY
+from serial_sessions import SessionManager
+from serial_pool import PortPool
+from serial_sequence import load_sequence, SequenceError
+from serial_replay import open_recording
+from serial_framing import FRAMINGS
+from serial_metrics import MetricsSampler, format_rate
+from serial_trace import Tracer, TK_DELAY, DRAIN, RENDER
+from serial_batch import BATCH_SIZES, FLUSH_INTERVALS
+from serial_discovery import PortDiscovery, describe
+from serial_loopback import BLOCK_SIZES, PATTERNS
+
+# Custom commands kept in the dropdown
+RECENT_COMMANDS = 10
+# Statistics panel refresh; the counters are read, never locked, so this only costs the Tk thread
+STATS_REFRESH_MS = 500
+# Examples in the transmit-mode waveform box (syntax in serial_waveform.py)
+WAVEFORM_PRESETS = ["", "ramp(0,10000,200)", "step(1000,5000,50)", "noise(5555,20,1000)",
+                    "settle(0,5555,100)", "ramp(0,5000,100) + settle(5000,6000,200) + noise(6000,15,500)"]
+
+class VirtualLogView:
+    """Log display that only renders the visible window of a LogRingBuffer.
+
+    The Text widget holds just the visible rows plus a small margin, and the
+    scrollbar is driven from the buffer, so memory and redraw time stay flat
+    however long the log gets.
+    """
+
+    def __init__(self, parent, buffer, margin=20):
+        self.buffer = buffer
+        self.margin = margin
+        self.top = 0  # absolute line number (counting evicted lines) of the first visible line
+        self.follow = True  # keep the newest line in view
+
+        self.text = tk.Text(parent, wrap=tk.WORD, font=("Consolas", 9), bg="#f0f0f0", height=12)
+        self.scrollbar = tk.Scrollbar(parent, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.line_height = max(1, tkfont.Font(font=self.text["font"]).metrics("linespace"))
+        self.text.config(state="disabled")
+
+        self.text.bind("<Configure>", lambda event: self.render())
+        self.text.bind("<MouseWheel>", self.on_mousewheel)
+        self.text.bind("<Button-4>", lambda event: self.scroll_lines(-3))
+        self.text.bind("<Button-5>", lambda event: self.scroll_lines(3))
+
+    def pack(self):
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+    def visible_rows(self):
+        """Number of text rows that fit in the widget"""
+        return max(1, self.text.winfo_height() // self.line_height)
+
+    def first_line(self):
+        """Logical buffer index of the first visible line"""
+        last_page = max(0, len(self.buffer) - self.visible_rows())
+        if self.follow:
+            return last_page
+        return min(max(0, self.top - self.buffer.evicted), last_page)
+
+    def render(self):
+        """Redraw the visible window"""
+        rows = self.visible_rows()
+        total = len(self.buffer)
+        first = self.first_line()
+        self.top = first + self.buffer.evicted
+
+        if self.follow:
+            # Margin above so wrapped lines still fill the view when scrolled to the end
+            lines = self.buffer.get_range(first - self.margin, total)
+        else:
+            lines = self.buffer.get_range(first, first + rows + self.margin)
+
+        self.text.config(state="normal")
+        self.text.delete(1.0, tk.END)
+        self.text.insert(tk.END, "\n".join(lines))
+        self.text.config(state="disabled")
+        if self.follow:
+            self.text.see(tk.END)
+        self.update_scrollbar(first, rows, total)
+
+    def update_scrollbar(self, first, rows, total):
+        if total:
+            self.scrollbar.set(first / total, min(1.0, (first + rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll_to(self, first):
+        """Show the window starting at logical line first"""
+        last_page = max(0, len(self.buffer) - self.visible_rows())
+        first = max(0, min(first, last_page))
+        self.follow = first >= last_page
+        self.top = first + self.buffer.evicted
+        self.render()
+
+    def scroll_lines(self, delta):
+        self.scroll_to(self.first_line() + delta)
+        return "break"
+
+    def on_mousewheel(self, event):
+        return self.scroll_lines(-3 if event.delta > 0 else 3)
+
+    def on_scrollbar(self, action, amount, unit=None):
+        """Scrollbar command: ("moveto", fraction) or ("scroll", n, "units"/"pages")"""
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.buffer)))
+        elif action == "scroll":
+            step = int(amount) * (self.visible_rows() if unit == "pages" else 1)
+            self.scroll_lines(step)
+
+    def append(self, lines):
+        """Add drained lines, redrawing only if the newest lines are in view"""
+        self.buffer.extend(lines)
+        if self.follow:
+            self.render()
+        else:
+            rows = self.visible_rows()
+            self.update_scrollbar(self.first_line(), rows, len(self.buffer))
+
+    def clear(self):
+        self.buffer.clear()
+        self.follow = True
+        self.render()
+
+class SessionsWindow:
+    """Window listing the extra port sessions run on the shared I/O thread"""
+
+    COLUMNS = ("port", "mode", "state", "tx/s", "rx/s", "tx frames", "rx frames")
+    REFRESH_MS = 1000
+
+    def __init__(self, app):
+        self.app = app
+        self.manager = app.get_session_manager()
+        self.window = tk.Toplevel(app.root)
+        self.window.title("Multi-Port Sessions")
+        self.window.geometry("620x300")
+
+        self.tree = ttk.Treeview(self.window, columns=self.COLUMNS, show="headings", height=8)
+        for column in self.COLUMNS:
+            self.tree.heading(column, text=column.title())
+            self.tree.column(column, width=80, anchor="center")
+        self.tree.column("port", width=140, anchor="w")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+
+        button_frame = tk.Frame(self.window)
+        button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        buttons = [
+            ("Add Current Settings", self.add_session),
+            ("Start", self.start_selected),
+            ("Stop", self.stop_selected),
+            ("Remove", self.remove_selected),
+            ("Start All", self.manager.start_all),
+            ("Stop All", self.manager.stop_all)
+        ]
+        for text, command in buttons:
+            tk.Button(button_frame, text=text, command=command).pack(side=tk.LEFT, padx=2)
+
+        self.refresh()
+
+    def add_session(self):
+        """Add a session using the settings currently shown in the main window"""
+        settings = dict(self.app.settings)
+        name = settings["com_port"]
+        number = 2
+        while name in self.manager.sessions:
+            name = f"{settings['com_port']}#{number}"
+            number += 1
+        self.manager.add_session(settings, name)
+        self.refresh()
+
+    def selected(self):
+        return [name for name in self.tree.selection() if name in self.manager.sessions]
+
+    def start_selected(self):
+        for name in self.selected():
+            self.manager.start(name)
+
+    def stop_selected(self):
+        for name in self.selected():
+            self.manager.stop(name)
+
+    def remove_selected(self):
+        for name in self.selected():
+            self.manager.remove_session(name)
+        self.refresh()
+
+    def refresh(self):
+        """Update the table from the manager's counters, then reschedule"""
+        if not self.window.winfo_exists():
+            return
+        sessions = self.manager.stats()["sessions"]
+        for name in self.tree.get_children():
+            if name not in sessions:
+                self.tree.delete(name)
+        for name, stats in sessions.items():
+            values = (stats["port"], stats["mode"], "Running" if stats["running"] else "Stopped",
+                      stats["tx_frames_per_s"], stats["rx_frames_per_s"], stats["tx_frames"], stats["rx_frames"])
+            if self.tree.exists(name):
+                self.tree.item(name, values=values)
+            else:
+                self.tree.insert("", tk.END, iid=name, values=values)
+        self.window.after(self.REFRESH_MS, self.refresh)
+
+
+class SerialTransmitterApp:
+    def __init__(self, root, log_capacity=LOG_CAPACITY):
+        self.root = root
+        self.root.title("Serial Port Tester")
+        self.root.geometry("500x650")
+        self.root.resizable(True, True)
+        
+        # Serial engine does the port I/O; the GUI only edits its settings.
+        # Status and errors also come from worker threads, so they are handed to Tk with after()
+        self.engine = SerialEngine(
+            on_log=self.log_message,
+            on_status=lambda text, color="blue": self.root.after(0, self.update_status, text, color),
+            on_error=lambda title, message: self.root.after(0, messagebox.showerror, title, message),
+            on_state=lambda running: self.root.after(0, self.update_buttons),
+            schedule=self.root.after,
+            pool=PortPool()  # command mode reuses the open port for the next command
+        )
+        self.settings = self.engine.settings
+
+        # Define available commands
+        self.command_list = COMMAND_LIST
+
+        # Log lines from the serial threads are queued here and rendered in batches
+        self.log_sink = LogSink()
+        self.log_capacity = log_capacity
+
+        # Custom commands sent this session, newest first
+        self.recent_commands = []
+
+        # Rates over the last refresh interval for the statistics panel
+        self.stats_sampler = MetricsSampler(self.engine.throughput)
+
+        # Extra port sessions, created when the sessions window is first opened
+        self.session_manager = None
+        self.sessions_window = None
+
+        # Stage timing, on while the Trace box is ticked; drain_due is when Tk should run drain_log next
+        self.tracer = None
+        self.drain_due = 0
+
+        # Port table kept current by a background thread; select_first_port is set by the Refresh button
+        self.discovery = PortDiscovery(on_change=lambda table, added, removed:
+                                       self.root.after(0, self.show_ports, added, removed))
+        self.select_first_port = False
+
+        # Build UI
+        self.setup_ui()
+        self.discovery.start()
+        self.root.after(DRAIN_INTERVAL_MS, self.drain_log)
+        self.root.after(STATS_REFRESH_MS, self.refresh_stats)
+
+    def setup_ui(self):
+        # Main frames
+        top_frame = tk.Frame(self.root)
+        top_frame.pack(fill=tk.X, padx=10, pady=10)
+
+        middle_frame = tk.Frame(self.root)
+        middle_frame.pack(fill=tk.X, padx=10, pady=5)
+
+        bottom_frame = tk.Frame(self.root)
+        bottom_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # Settings section
+        settings_frame = tk.LabelFrame(top_frame, text="Serial Configuration", padx=10, pady=10)
+        settings_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
+
+        # COM Port
+        tk.Label(settings_frame, text="COM Port:").grid(row=0, column=0, sticky="w", pady=2)
+        self.com_var = tk.StringVar(value=self.settings["com_port"])
+        self.com_combo = ttk.Combobox(settings_frame, textvariable=self.com_var, width=12)
+        self.com_combo.grid(row=0, column=1, sticky="ew", padx=5, pady=2)
+        self.com_combo['values'] = self.get_com_ports()
+
+        # Refresh button
+        refresh_btn = tk.Button(settings_frame, text="Refresh", command=self.refresh_com_ports, width=10)
+        refresh_btn.grid(row=0, column=2, padx=(5, 0), pady=2)
+
+        # Description and state of the selected port, from the discovery cache
+        self.port_info_label = tk.Label(settings_frame, text="", fg="gray", font=("Arial", 8), anchor="w")
+        self.port_info_label.grid(row=19, column=0, columnspan=3, sticky="w")
+
+        # Baud Rate
+        tk.Label(settings_frame, text="Baud Rate:").grid(row=1, column=0, sticky="w", pady=2)
+        baud_values = BAUD_RATES
+        self.baud_var = tk.StringVar(value=str(self.settings["baud_rate"]))
+        self.baud_combo = ttk.Combobox(settings_frame, textvariable=self.baud_var, values=baud_values, width=12)
+        self.baud_combo.grid(row=1, column=1, sticky="ew", padx=5, pady=2)
+
+        # Parity
+        tk.Label(settings_frame, text="Parity:").grid(row=2, column=0, sticky="w", pady=2)
+        parity_values = ["None", "Even", "Odd"]
+        self.parity_var = tk.StringVar(value=self.settings["parity"])
+        self.parity_combo = ttk.Combobox(settings_frame, textvariable=self.parity_var, values=parity_values, width=12)
+        self.parity_combo.grid(row=2, column=1, sticky="ew", padx=5, pady=2)
+
+        # Data Bits
+        tk.Label(settings_frame, text="Data Bits:").grid(row=3, column=0, sticky="w", pady=2)
+        data_bits_values = [5, 6, 7, 8]
+        self.data_bits_var = tk.StringVar(value=str(self.settings["data_bits"]))
+        self.data_bits_combo = ttk.Combobox(settings_frame, textvariable=self.data_bits_var, values=data_bits_values, width=12)
+        self.data_bits_combo.grid(row=3, column=1, sticky="ew", padx=5, pady=2)
+
+        # Stop Bits
+        tk.Label(settings_frame, text="Stop Bits:").grid(row=4, column=0, sticky="w", pady=2)
+        stop_bits_values = ["One", "Two"]
+        self.stop_bits_var = tk.StringVar(value=self.settings["stop_bits"])
+        self.stop_bits_combo = ttk.Combobox(settings_frame, textvariable=self.stop_bits_var, values=stop_bits_values, width=12)
+        self.stop_bits_combo.grid(row=4, column=1, sticky="ew", padx=5, pady=2)
+
+        # Mode selection
+        tk.Label(settings_frame, text="Mode:").grid(row=5, column=0, sticky="w", pady=2)
+        mode_values = MODES
+        self.mode_var = tk.StringVar(value=self.settings["mode"])
+        self.mode_combo = ttk.Combobox(settings_frame, textvariable=self.mode_var, values=mode_values, width=12)
+        self.mode_combo.grid(row=5, column=1, sticky="ew", padx=5, pady=2)
+
+        # Base Weight (only shown when in transmit mode)
+        self.base_weight_label = tk.Label(settings_frame, text="Base Weight:")
+        self.base_weight_label.grid(row=6, column=0, sticky="w", pady=2)
+        self.base_weight_var = tk.StringVar(value=str(self.settings["base_weight"]))
+        self.base_weight_entry = tk.Entry(settings_frame, textvariable=self.base_weight_var, width=12)
+        self.base_weight_entry.grid(row=6, column=1, sticky="ew", padx=5, pady=2)
+        self.base_weight_label.grid_remove()
+        self.base_weight_entry.grid_remove()
+
+        # Transmit Rate (only shown when in transmit mode), "max" = as fast as the line allows
+        self.rate_label = tk.Label(settings_frame, text="Rate (frames/s):")
+        self.rate_label.grid(row=12, column=0, sticky="w", pady=2)
+        self.rate_var = tk.StringVar(value=f"{self.settings['transmit_rate']:g}")
+        self.rate_combo = ttk.Combobox(settings_frame, textvariable=self.rate_var, values=[1, 5, 10, 50, 100, 500, 1000, "max"], width=12)
+        self.rate_combo.grid(row=12, column=1, sticky="ew", padx=5, pady=2)
+        self.rate_label.grid_remove()
+        self.rate_combo.grid_remove()
+
+        # Weight waveform (only shown when in transmit mode), empty = constant base weight
+        self.waveform_label = tk.Label(settings_frame, text="Waveform:")
+        self.waveform_label.grid(row=14, column=0, sticky="w", pady=2)
+        self.waveform_var = tk.StringVar(value=self.settings["waveform"])
+        self.waveform_combo = ttk.Combobox(settings_frame, textvariable=self.waveform_var, values=WAVEFORM_PRESETS, width=12)
+        self.waveform_combo.grid(row=14, column=1, sticky="ew", padx=5, pady=2)
+        self.waveform_label.grid_remove()
+        self.waveform_combo.grid_remove()
+
+        # Recording to replay (only shown when in transmit mode), speed "max" = as fast as the line allows
+        self.replay_label = tk.Label(settings_frame, text="Replay:")
+        self.replay_label.grid(row=15, column=0, sticky="w", pady=2)
+        self.replay_var = tk.StringVar(value=self.settings["replay_file"])
+        self.replay_speed_var = tk.StringVar(value=f"{self.settings['replay_speed']:g}")
+        self.replay_frame = tk.Frame(settings_frame)
+        self.replay_frame.grid(row=15, column=1, sticky="ew", padx=5, pady=2)
+        self.replay_name_label = tk.Label(self.replay_frame, text="None", fg="gray", anchor="w", width=8)
+        self.replay_name_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        tk.Button(self.replay_frame, text="Clear", command=self.clear_replay).pack(side=tk.RIGHT)
+        tk.Button(self.replay_frame, text="Load...", command=self.load_replay_file).pack(side=tk.RIGHT, padx=2)
+        ttk.Combobox(self.replay_frame, textvariable=self.replay_speed_var, values=[1, 2, 10, 100, "max"],
+                     width=4).pack(side=tk.RIGHT, padx=2)
+        self.replay_label.grid_remove()
+        self.replay_frame.grid_remove()
+
+        # Frames per write and writes per flush (only shown when in transmit mode), flush "end" = when stopped
+        self.batch_label = tk.Label(settings_frame, text="Frames/Write:")
+        self.batch_label.grid(row=17, column=0, sticky="w", pady=2)
+        self.batch_var = tk.StringVar(value=str(self.settings["tx_batch"]))
+        self.flush_every_var = tk.StringVar(value=str(self.settings["tx_flush_every"] or "end"))
+        self.batch_frame = tk.Frame(settings_frame)
+        self.batch_frame.grid(row=17, column=1, sticky="ew", padx=5, pady=2)
+        ttk.Combobox(self.batch_frame, textvariable=self.batch_var, values=BATCH_SIZES, width=5).pack(side=tk.LEFT)
+        tk.Label(self.batch_frame, text="Flush every:").pack(side=tk.LEFT, padx=(6, 2))
+        ttk.Combobox(self.batch_frame, textvariable=self.flush_every_var, values=FLUSH_INTERVALS,
+                     width=4).pack(side=tk.LEFT)
+        self.batch_label.grid_remove()
+        self.batch_frame.grid_remove()
+
+        # Reopen a dropped port with backoff (transmit and receive modes), see serial_reconnect.py
+        self.reconnect_var = tk.BooleanVar(value=self.settings["auto_reconnect"])
+        self.reconnect_check = tk.Checkbutton(settings_frame, text="Auto Reconnect (also a renamed USB port)",
+                                              variable=self.reconnect_var)
+        self.reconnect_check.grid(row=18, column=0, columnspan=2, sticky="w", pady=2)
+        self.reconnect_check.grid_remove()
+
+        # Loopback block size, pattern and seconds per baud rate (only shown when in loopback mode), see serial_loopback.py
+        self.loopback_label = tk.Label(settings_frame, text="Block/Pattern/s:")
+        self.loopback_label.grid(row=16, column=0, sticky="w", pady=2)
+        self.loopback_block_var = tk.StringVar(value=str(self.settings["loopback_block"]))
+        self.loopback_pattern_var = tk.StringVar(value=self.settings["loopback_pattern"])
+        self.loopback_seconds_var = tk.StringVar(value=f"{self.settings['loopback_seconds']:g}")
+        self.loopback_frame = tk.Frame(settings_frame)
+        self.loopback_frame.grid(row=16, column=1, sticky="ew", padx=5, pady=2)
+        ttk.Combobox(self.loopback_frame, textvariable=self.loopback_block_var, values=BLOCK_SIZES,
+                     width=5).pack(side=tk.LEFT)
+        ttk.Combobox(self.loopback_frame, textvariable=self.loopback_pattern_var, values=PATTERNS,
+                     state="readonly", width=8).pack(side=tk.LEFT, padx=(4, 0))
+        ttk.Combobox(self.loopback_frame, textvariable=self.loopback_seconds_var, values=[1, 5, 30],
+                     width=3).pack(side=tk.LEFT, padx=(4, 0))
+        self.loopback_label.grid_remove()
+        self.loopback_frame.grid_remove()
+
+        # Test every baud rate in turn (loopback mode)
+        self.sweep_var = tk.BooleanVar(value=self.settings["loopback_sweep"])
+        self.sweep_check = tk.Checkbutton(settings_frame, text="Sweep All Baud Rates", variable=self.sweep_var)
+        self.sweep_check.grid(row=18, column=0, columnspan=2, sticky="w", pady=2)
+        self.sweep_check.grid_remove()
+
+        # Receive framing (only shown when in receive mode), see serial_framing.py
+        self.framing_label = tk.Label(settings_frame, text="Framing:")
+        self.framing_label.grid(row=16, column=0, sticky="w", pady=2)
+        self.framing_var = tk.StringVar(value=self.settings["rx_framing"])
+        self.framing_combo = ttk.Combobox(settings_frame, textvariable=self.framing_var, values=FRAMINGS, width=12)
+        self.framing_combo.grid(row=16, column=1, sticky="ew", padx=5, pady=2)
+        self.framing_label.grid_remove()
+        self.framing_combo.grid_remove()
+
+        # Command Selector (only shown when in command mode)
+        self.command_label = tk.Label(settings_frame, text="Command:")
+        self.command_label.grid(row=7, column=0, sticky="w", pady=2)
+        self.command_var = tk.StringVar(value=self.settings["selected_command"])
+        self.command_combo = ttk.Combobox(settings_frame, textvariable=self.command_var, values=self.command_list, width=12)
+        self.command_combo.grid(row=7, column=1, sticky="ew", padx=5, pady=2)
+        self.command_label.grid_remove()
+        self.command_combo.grid_remove()
+
+        # Custom Command (only shown when in command mode)
+        self.custom_command_label = tk.Label(settings_frame, text="Custom Command:")
+        self.custom_command_label.grid(row=8, column=0, sticky="w", pady=2)
+        self.custom_command_var = tk.StringVar(value=self.settings["custom_command"])
+        self.custom_command_entry = tk.Entry(settings_frame, textvariable=self.custom_command_var, width=12)
+        self.custom_command_entry.grid(row=8, column=1, sticky="ew", padx=5, pady=2)
+        self.custom_command_label.grid_remove()
+        self.custom_command_entry.grid_remove()
+
+        # Custom Command Dropdown (only shown when in command mode)
+        self.custom_dropdown_label = tk.Label(settings_frame, text="Custom Command:")
+        self.custom_dropdown_label.grid(row=9, column=0, sticky="w", pady=2)
+        self.custom_dropdown_var = tk.StringVar(value="")
+        self.custom_dropdown = ttk.Combobox(settings_frame, textvariable=self.custom_dropdown_var, width=12)
+        self.custom_dropdown.grid(row=9, column=1, sticky="ew", padx=5, pady=2)
+        self.custom_dropdown_label.grid_remove()
+        self.custom_dropdown.grid_remove()
+
+        # Delay Time (only shown when in command mode)
+        self.delay_label = tk.Label(settings_frame, text="Delay (ms):")
+        self.delay_label.grid(row=10, column=0, sticky="w", pady=2)
+        self.delay_var = tk.StringVar(value=str(self.settings["delay_time"]))
+        self.delay_combo = ttk.Combobox(settings_frame, textvariable=self.delay_var, values=[100, 200, 500, 1000, 2000, 3000, 5000], width=12)
+        self.delay_combo.grid(row=10, column=1, sticky="ew", padx=5, pady=2)
+        self.delay_label.grid_remove()
+        self.delay_combo.grid_remove()
+
+        # Keep Port Open checkbox (only shown when in command mode)
+        self.keep_open_var = tk.BooleanVar(value=False)
+        self.keep_open_check = tk.Checkbutton(settings_frame, text="Keep Port Open", variable=self.keep_open_var)
+        self.keep_open_check.grid(row=11, column=0, columnspan=2, sticky="w", pady=2)
+        self.keep_open_check.grid_remove()
+
+        # Command sequence file (only shown when in command mode)
+        self.sequence_label = tk.Label(settings_frame, text="Sequence:")
+        self.sequence_label.grid(row=13, column=0, sticky="w", pady=2)
+        self.sequence_var = tk.StringVar(value=self.settings["sequence_file"])
+        self.sequence_frame = tk.Frame(settings_frame)
+        self.sequence_frame.grid(row=13, column=1, sticky="ew", padx=5, pady=2)
+        self.sequence_name_label = tk.Label(self.sequence_frame, text="None", fg="gray", anchor="w", width=12)
+        self.sequence_name_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        tk.Button(self.sequence_frame, text="Clear", command=self.clear_sequence).pack(side=tk.RIGHT)
+        tk.Button(self.sequence_frame, text="Load...", command=self.load_sequence_file).pack(side=tk.RIGHT, padx=2)
+        self.sequence_label.grid_remove()
+        self.sequence_frame.grid_remove()
+
+        # Configure grid weights
+        settings_frame.columnconfigure(1, weight=1)
+
+        # Control buttons frame - now on the right
+        control_frame = tk.Frame(top_frame)
+        control_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 0), pady=5)
+
+        # Use grid inside control_frame to control layout
+        self.start_button = tk.Button(
+            control_frame,
+            text="Start",
+            command=self.start_transmit,
+            bg="#4CAF50",
+            fg="white",
+            font=("Arial", 12, "bold"),
+            width=14,
+            height=2
+        )
+        self.start_button.grid(row=0, column=0, sticky="ew", padx=5, pady=5)
+
+        self.stop_button = tk.Button(
+            control_frame,
+            text="Stop",
+            command=self.stop_transmit,
+            bg="#f44336",
+            fg="white",
+            font=("Arial", 12, "bold"),
+            width=14,
+            height=2
+        )
+        self.stop_button.grid(row=1, column=0, sticky="ew", padx=5, pady=5)
+
+        # Connect button (renamed from Retry)
+        self.connect_button = tk.Button(
+            control_frame,
+            text="Connect",
+            command=self.retry_connect,
+            bg="#2196F3",
+            fg="white",
+            font=("Arial", 12, "bold"),
+            width=14,
+            height=2
+        )
+        self.connect_button.grid(row=2, column=0, sticky="ew", padx=5, pady=5)
+
+        # Disconnect button
+        self.disconnect_button = tk.Button(
+            control_frame,
+            text="Disconnect",
+            command=self.disconnect_port,
+            bg="#9E9E9E",
+            fg="white",
+            font=("Arial", 12, "bold"),
+            width=14,
+            height=2
+        )
+        self.disconnect_button.grid(row=3, column=0, sticky="ew", padx=5, pady=5)
+
+        # Make column expandable
+        control_frame.columnconfigure(0, weight=1)
+
+        # Ensure control_frame matches the height of settings_frame
+        settings_frame.update_idletasks()
+        min_height = settings_frame.winfo_reqheight()
+        control_frame.config(height=min_height)
+        control_frame.pack_propagate(False)  # Prevent shrinking
+
+        # Status label
+        self.status_label = tk.Label(middle_frame, text="Status: Not Connected", fg="blue", font=("Arial", 10))
+        self.status_label.pack(pady=5)
+
+        # Note label (initially hidden)
+        self.note_label = tk.Label(middle_frame, text="", fg="gray", font=("Arial", 9), wraplength=380)
+        self.note_label.pack(pady=2)
+
+        # Update note based on initial mode
+        self.update_note()
+
+        # Live counters, refreshed by refresh_stats()
+        stats_frame = tk.LabelFrame(middle_frame, text="Statistics", padx=10, pady=2)
+        stats_frame.pack(fill=tk.X, pady=2)
+        self.tx_stats_label = tk.Label(stats_frame, text="TX: -", font=("Arial", 9), anchor="w")
+        self.tx_stats_label.pack(fill=tk.X)
+        self.rx_stats_label = tk.Label(stats_frame, text="RX: -", font=("Arial", 9), anchor="w")
+        self.rx_stats_label.pack(fill=tk.X)
+        self.error_stats_label = tk.Label(stats_frame, text="Errors: -", fg="gray", font=("Arial", 9),
+                                         anchor="w", justify=tk.LEFT, wraplength=440)
+        self.error_stats_label.pack(fill=tk.X)
+        self.trace_var = tk.BooleanVar(value=False)
+        trace_check = tk.Checkbutton(stats_frame, text="Trace stage timings (saved when unticked)",
+                                     variable=self.trace_var, command=self.toggle_trace, font=("Arial", 9))
+        trace_check.pack(anchor="w")
+
+        sessions_btn = tk.Button(middle_frame, text="Multi-Port Sessions...", command=self.open_sessions)
+        sessions_btn.pack(pady=2)
+
+        # Log display
+        log_frame = tk.LabelFrame(bottom_frame, text="Communication Log", padx=10, pady=10)
+        log_frame.pack(fill=tk.BOTH, expand=True)
+
+        # Add Clear Log button
+        clear_log_btn = tk.Button(
+            log_frame,
+            text="Clear Log",
+            command=self.clear_log,
+            bg="#2196F3",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            width=10
+        )
+        clear_log_btn.pack(anchor="ne", padx=5, pady=5)
+
+        # Log queue counters
+        self.log_counters_label = tk.Label(log_frame, text="", fg="gray", font=("Arial", 8))
+        self.log_counters_label.pack(side=tk.BOTTOM, anchor="w")
+
+        # Bounded history, only the visible part is in the Text widget
+        self.log_view = VirtualLogView(log_frame, LogRingBuffer(self.log_capacity))
+        self.log_view.pack()
+
+        # Bind events
+        self.com_var.trace_add("write", lambda *args: self.update_settings())
+        self.com_var.trace_add("write", lambda *args: self.on_port_selected())
+        self.baud_var.trace_add("write", lambda *args: self.update_settings())
+        self.parity_var.trace_add("write", lambda *args: self.update_settings())
+        self.data_bits_var.trace_add("write", lambda *args: self.update_settings())
+        self.stop_bits_var.trace_add("write", lambda *args: self.update_settings())
+        self.base_weight_var.trace_add("write", lambda *args: self.update_settings())
+        self.rate_var.trace_add("write", lambda *args: self.update_settings())
+        self.waveform_var.trace_add("write", lambda *args: self.update_settings())
+        self.replay_var.trace_add("write", lambda *args: self.update_settings())
+        self.replay_speed_var.trace_add("write", lambda *args: self.update_settings())
+        self.batch_var.trace_add("write", lambda *args: self.update_settings())
+        self.flush_every_var.trace_add("write", lambda *args: self.update_settings())
+        self.reconnect_var.trace_add("write", lambda *args: self.update_settings())
+        self.framing_var.trace_add("write", lambda *args: self.update_settings())
+        self.loopback_block_var.trace_add("write", lambda *args: self.update_settings())
+        self.loopback_pattern_var.trace_add("write", lambda *args: self.update_settings())
+        self.loopback_seconds_var.trace_add("write", lambda *args: self.update_settings())
+        self.sweep_var.trace_add("write", lambda *args: self.update_settings())
+        self.command_var.trace_add("write", lambda *args: self.update_settings())
+        self.custom_command_var.trace_add("write", lambda *args: self.update_settings())
+        self.delay_var.trace_add("write", lambda *args: self.update_settings())
+        self.sequence_var.trace_add("write", lambda *args: self.update_settings())
+        self.mode_var.trace_add("write", lambda *args: self.on_mode_change())
+
+        # Bind custom dropdown selection
+        self.custom_dropdown_var.trace_add("write", lambda *args: self.on_custom_dropdown_select())
+
+        # Initial update
+        self.update_settings()
+        self.toggle_mode()
+
+    def clear_log(self):
+        """Clear the communication log"""
+        self.log_view.clear()
+
+    def get_com_ports(self):
+        """Get list of available COM ports"""
+        # From the discovery cache; empty until its first scan, which takes milliseconds
+        return self.discovery.devices() or ["No COM Ports Found"]
+
+    def refresh_com_ports(self):
+        """Refresh COM port dropdown"""
+        # Rescans and probes on the discovery thread; show_ports picks the first port when it is done
+        self.select_first_port = True
+        self.discovery.refresh()
+
+    def show_ports(self, added, removed):
+        """Put the discovered ports in the dropdown and log the ones that came or went"""
+        ports = self.get_com_ports()
+        self.com_combo['values'] = ports
+        if self.select_first_port and ports != ["No COM Ports Found"]:
+            self.com_var.set(ports[0])
+        self.select_first_port = False
+        if self.discovery.scans > 1:
+            for device in removed:
+                self.log_message(f"Port removed: {device}")
+            for device in added:
+                self.log_message(f"Port added: {device} - {describe(self.discovery.get(device))}")
+        self.show_port_info()
+
+    def on_port_selected(self):
+        """Show the selected port and have its state checked again"""
+        self.discovery.probe_soon(self.com_var.get())
+        self.show_port_info()
+
+    def show_port_info(self):
+        """Description and state of the selected port"""
+        info = self.discovery.get(self.com_var.get())
+        self.port_info_label.config(text=describe(info) if info else "")
+
+    def update_settings(self):
+        """Update internal settings from UI with validation"""
+        try:
+            new_settings = {
+                "com_port": self.com_var.get(),
+                "baud_rate": int(self.baud_var.get()),
+                "parity": self.parity_var.get(),
+                "data_bits": int(self.data_bits_var.get()),
+                "stop_bits": self.stop_bits_var.get(),
+                "mode": self.mode_var.get()
+            }
+            if new_settings["mode"] in ("transmit", "receive"):
+                new_settings["auto_reconnect"] = self.reconnect_var.get()
+            
+            if new_settings["mode"] == "transmit":
+                base_weight = int(self.base_weight_var.get())
+                if base_weight < 0:
+                    raise ValueError("Base weight cannot be negative")
+                new_settings["base_weight"] = base_weight
+                rate = self.rate_var.get().strip().lower()
+                new_settings["transmit_rate"] = 0 if rate == "max" else float(rate)
+                if new_settings["transmit_rate"] < 0:
+                    raise ValueError("Transmit rate cannot be negative")
+                # Compiled (and a bad spec reported) when transmission starts, not per keystroke
+                new_settings["waveform"] = self.waveform_var.get().strip()
+                new_settings["replay_file"] = self.replay_var.get()
+                speed = self.replay_speed_var.get().strip().lower()
+                new_settings["replay_speed"] = 0 if speed == "max" else float(speed)
+                if new_settings["replay_speed"] < 0:
+                    raise ValueError("Replay speed cannot be negative")
+                new_settings["tx_batch"] = int(self.batch_var.get())
+                if new_settings["tx_batch"] < 1:
+                    raise ValueError("Frames per write must be at least 1")
+                flush_every = self.flush_every_var.get().strip().lower()
+                new_settings["tx_flush_every"] = 0 if flush_every == "end" else int(flush_every)
+                if new_settings["tx_flush_every"] < 0:
+                    raise ValueError("Flush interval cannot be negative")
+            elif new_settings["mode"] == "receive":
+                # Checked when reception starts, not per keystroke
+                new_settings["rx_framing"] = self.framing_var.get().strip()
+            elif new_settings["mode"] == "command":
+                new_settings["selected_command"] = self.command_var.get()
+                new_settings["custom_command"] = self.custom_command_var.get()
+                new_settings["delay_time"] = int(self.delay_var.get())
+                new_settings["sequence_file"] = self.sequence_var.get()
+            elif new_settings["mode"] == "loopback":
+                new_settings["loopback_block"] = int(self.loopback_block_var.get())
+                if new_settings["loopback_block"] < 1:
+                    raise ValueError("Loopback block size must be at least 1 byte")
+                new_settings["loopback_pattern"] = self.loopback_pattern_var.get()
+                new_settings["loopback_seconds"] = float(self.loopback_seconds_var.get())
+                if new_settings["loopback_seconds"] <= 0:
+                    raise ValueError("Loopback test time must be positive")
+                new_settings["loopback_sweep"] = self.sweep_var.get()
+
+            # The engine only rebuilds its payload when a payload field changed
+            self.engine.update_settings(new_settings)
+
+        except ValueError as e:
+            if "invalid literal" in str(e) or "could not convert" in str(e):
+                messagebox.showerror("Invalid Input", "Please enter valid numbers for all numeric fields.")
+            else:
+                messagebox.showerror("Invalid Input", str(e))
+            return
+
+    def on_mode_change(self):
+        """Handle mode change event"""
+        self.update_settings()
+        self.toggle_mode()
+        self.update_note()
+
+    def update_note(self):
+        """Update the note based on current mode"""
+        if self.settings["mode"] == "transmit":
+            note_text = "Note: Connect to Big Display to transmit a sample Base Weight"
+        elif self.settings["mode"] == "receive":
+            note_text = "Note: Connect to Indicator with COM Assignment either Demand or Continuous Output"
+        elif self.settings["mode"] == "command":
+            note_text = "Note: Connect to Indicator with COM Assignment as Demand to send an ascii command to indicator"
+        elif self.settings["mode"] == "loopback":
+            note_text = "Note: Jumper TX to RX (or use port loop://) to measure throughput and errors"
+        else:
+            note_text = ""
+        
+        self.note_label.config(text=note_text)
+
+    def toggle_mode(self):
+        """Toggle visibility of base weight field and command selector based on mode"""
+        # Remove all optional widgets first
+        self.base_weight_label.grid_forget()
+        self.base_weight_entry.grid_forget()
+        self.rate_label.grid_forget()
+        self.rate_combo.grid_forget()
+        self.waveform_label.grid_forget()
+        self.waveform_combo.grid_forget()
+        self.replay_label.grid_forget()
+        self.replay_frame.grid_forget()
+        self.batch_label.grid_forget()
+        self.batch_frame.grid_forget()
+        self.reconnect_check.grid_forget()
+        self.framing_label.grid_forget()
+        self.framing_combo.grid_forget()
+        self.loopback_label.grid_forget()
+        self.loopback_frame.grid_forget()
+        self.sweep_check.grid_forget()
+        self.command_label.grid_forget()
+        self.command_combo.grid_forget()
+        self.custom_command_label.grid_forget()
+        self.custom_command_entry.grid_forget()
+        self.custom_dropdown_label.grid_forget()
+        self.custom_dropdown.grid_forget()
+        self.delay_label.grid_forget()
+        self.delay_combo.grid_forget()
+        self.keep_open_check.grid_forget()
+        self.sequence_label.grid_forget()
+        self.sequence_frame.grid_forget()
+
+        if self.settings["mode"] == "transmit":
+            self.base_weight_label.grid(row=6, column=0, sticky="w", pady=2)
+            self.base_weight_entry.grid(row=6, column=1, sticky="ew", padx=5, pady=2)
+            self.rate_label.grid(row=12, column=0, sticky="w", pady=2)
+            self.rate_combo.grid(row=12, column=1, sticky="ew", padx=5, pady=2)
+            self.waveform_label.grid(row=14, column=0, sticky="w", pady=2)
+            self.waveform_combo.grid(row=14, column=1, sticky="ew", padx=5, pady=2)
+            self.replay_label.grid(row=15, column=0, sticky="w", pady=2)
+            self.replay_frame.grid(row=15, column=1, sticky="ew", padx=5, pady=2)
+            self.batch_label.grid(row=17, column=0, sticky="w", pady=2)
+            self.batch_frame.grid(row=17, column=1, sticky="ew", padx=5, pady=2)
+            self.reconnect_check.grid(row=18, column=0, columnspan=2, sticky="w", pady=2)
+        elif self.settings["mode"] == "receive":
+            self.framing_label.grid(row=16, column=0, sticky="w", pady=2)
+            self.framing_combo.grid(row=16, column=1, sticky="ew", padx=5, pady=2)
+            self.reconnect_check.grid(row=18, column=0, columnspan=2, sticky="w", pady=2)
+        elif self.settings["mode"] == "command":
+            self.command_label.grid(row=7, column=0, sticky="w", pady=2)
+            self.command_combo.grid(row=7, column=1, sticky="ew", padx=5, pady=2)
+            self.custom_command_label.grid(row=8, column=0, sticky="w", pady=2)
+            self.custom_command_entry.grid(row=8, column=1, sticky="ew", padx=5, pady=2)
+            # Add custom dropdown
+            self.custom_dropdown_label.grid(row=9, column=0, sticky="w", pady=2)
+            self.custom_dropdown.grid(row=9, column=1, sticky="ew", padx=5, pady=2)
+            # Populate dropdown with custom commands
+            self.populate_custom_dropdown()
+            self.delay_label.grid(row=10, column=0, sticky="w", pady=2)
+            self.delay_combo.grid(row=10, column=1, sticky="ew", padx=5, pady=2)
+            self.keep_open_check.grid(row=11, column=0, columnspan=2, sticky="w", pady=2)
+            self.sequence_label.grid(row=13, column=0, sticky="w", pady=2)
+            self.sequence_frame.grid(row=13, column=1, sticky="ew", padx=5, pady=2)
+        elif self.settings["mode"] == "loopback":
+            self.loopback_label.grid(row=16, column=0, sticky="w", pady=2)
+            self.loopback_frame.grid(row=16, column=1, sticky="ew", padx=5, pady=2)
+            self.sweep_check.grid(row=18, column=0, columnspan=2, sticky="w", pady=2)
+
+        # Refresh layout
+        self.root.update_idletasks()
+
+    def populate_custom_dropdown(self):
+        """Populate custom dropdown with recent commands"""
+        self.custom_dropdown['values'] = self.recent_commands + [""]  # Empty string for new entry
+
+    def remember_custom_command(self, command):
+        """Put a sent custom command at the top of the recent list"""
+        if command in self.recent_commands:
+            self.recent_commands.remove(command)
+        self.recent_commands.insert(0, command)
+        del self.recent_commands[RECENT_COMMANDS:]
+        self.populate_custom_dropdown()
+
+    def load_sequence_file(self):
+        """Pick a command sequence file; it is checked now and run by Start"""
+        path = filedialog.askopenfilename(
+            title="Load Command Sequence",
+            filetypes=[("Sequence files", "*.seq *.txt"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            program = load_sequence(path)
+        except (OSError, SequenceError) as e:
+            messagebox.showerror("Sequence Error", str(e))
+            return
+        self.sequence_var.set(path)
+        self.sequence_name_label.config(text=os.path.basename(path), fg="black")
+        self.log_message(f"Loaded sequence {path} ({len(program.steps)} steps); Start runs it")
+
+    def load_replay_file(self):
+        """Pick a capture or log file; Start sends its frames instead of the weight"""
+        path = filedialog.askopenfilename(
+            title="Load Recording to Replay",
+            filetypes=[("Captures and logs", "*.spcap *.log"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            open_recording(path).close()
+        except OSError as e:
+            messagebox.showerror("Replay Error", str(e))
+            return
+        self.replay_var.set(path)
+        self.replay_name_label.config(text=os.path.basename(path), fg="black")
+        self.log_message(f"Loaded recording {path}; Start replays it")
+
+    def clear_replay(self):
+        """Go back to sending the base weight or waveform"""
+        self.replay_var.set("")
+        self.replay_name_label.config(text="None", fg="gray")
+
+    def clear_sequence(self):
+        """Go back to sending a single command"""
+        self.sequence_var.set("")
+        self.sequence_name_label.config(text="None", fg="gray")
+
+    def on_custom_dropdown_select(self):
+        """Handle custom dropdown selection"""
+        selected = self.custom_dropdown_var.get()
+        if selected and selected != "":
+            self.custom_command_var.set(selected)
+            self.custom_dropdown_var.set("")  # Reset dropdown after selection
+
+    @property
+    def running(self):
+        """Mirror of the engine's running flag"""
+        return self.engine.running
+
+    def update_buttons(self):
+        """Enable/disable start/stop buttons"""
+        self.start_button.config(state="normal" if not self.running else "disabled")
+        self.stop_button.config(state="normal" if self.running else "disabled")
+
+    def update_status(self, status_text, color="blue"):
+        """Update status label"""
+        self.status_label.config(text=f"Status: {status_text}", fg=color)
+
+    def log_message(self, message, level="INFO"):
+        """Queue engine message for the GUI (file logging is done by the engine)"""
+        self.log_sink.put(message, level)
+
+    def drain_log(self):
+        """Move queued log lines into the log view in one batch, then reschedule"""
+        tracer = self.tracer
+        if tracer:
+            start = tracer.clock()
+            if self.drain_due:
+                tracer.record(TK_DELAY, self.drain_due, max(start, self.drain_due))
+        lines = self.log_sink.drain()
+        if tracer:
+            start = tracer.lap(DRAIN, start)
+        if lines:
+            self.log_view.append(lines)
+            counters = self.log_sink.counters()
+            self.log_counters_label.config(
+                text=f"Queued: {counters['queued']}  Rendered: {counters['rendered']}  Dropped: {counters['dropped']}")
+            if tracer:
+                tracer.lap(RENDER, start)
+        self.drain_due = tracer.clock() + DRAIN_INTERVAL_MS * 1000000 if tracer else 0
+        self.root.after(DRAIN_INTERVAL_MS, self.drain_log)
+
+    def refresh_stats(self):
+        """Show the engine's counters and recent rates, then reschedule"""
+        stats = self.stats_sampler.sample()
+        syscalls = "" if stats["write_syscalls_per_frame"] is None else \
+            f"  Syscalls/frame: {stats['write_syscalls_per_frame']:g}"
+        self.tx_stats_label.config(
+            text=f"TX: {format_rate(stats['recent_tx_frames_per_s'], 'frames')}, "
+                 f"{format_rate(stats['recent_tx_bytes_per_s'], 'B')}  ({stats['tx_frames']} frames){syscalls}")
+        weight = "" if stats["last_weight"] is None else f"  Weight: {stats['last_weight']}"
+        self.rx_stats_label.config(
+            text=f"RX: {format_rate(stats['recent_rx_frames_per_s'], 'frames')}, "
+                 f"{format_rate(stats['recent_rx_bytes_per_s'], 'B')}  ({stats['rx_frames']} frames){weight}")
+        outages = "" if not stats["outages"] else \
+            f"  Down: {stats['downtime_s']:g} s{' (now)' if stats['down'] else ''}  " \
+            f"Resent: {stats['frames_resent']}  Lost: {stats['frames_lost']}"
+        errors = (stats["decode_errors"], stats["zero_writes"] + stats["partial_writes"], stats["serial_errors"],
+                  stats["missed_deadlines"], stats["rx_dropped_bytes"])
+        self.error_stats_label.config(
+            text=f"Decode errors: {errors[0]}  Short writes: {errors[1]}  Serial errors: {errors[2]}  "
+                 f"Missed: {errors[3]}  Dropped: {errors[4]} B  Reconnects: {stats['reconnects']}{outages}",
+            fg="red" if any(errors) or stats["down"] else "gray")
+        self.root.after(STATS_REFRESH_MS, self.refresh_stats)
+
+    def set_tracer(self, tracer):
+        """Time the engine, session, log writer and log drain stages on tracer, or stop with None"""
+        self.tracer = tracer
+        self.drain_due = 0
+        self.engine.tracer = tracer
+        if self.session_manager:
+            for engine in self.session_manager.sessions.values():
+                engine.tracer = tracer
+        set_log_tracer(tracer)
+
+    def toggle_trace(self):
+        """Start stage timing, or stop it, log the per-stage summary and save the trace"""
+        if self.trace_var.get():
+            self.set_tracer(Tracer())
+            self.engine.log_message("Trace started")
+            return
+        tracer = self.tracer
+        self.set_tracer(None)
+        if tracer is None:
+            return
+        for line in tracer.summary_lines():
+            self.engine.log_message(f"Trace {line}")
+        path = filedialog.asksaveasfilename(
+            title="Save Trace",
+            defaultextension=".json",
+            filetypes=[("Chrome trace", "*.json"), ("Collapsed stacks for flame graphs", "*.folded"),
+                       ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            count = tracer.save(path)
+        except OSError as e:
+            messagebox.showerror("Trace Error", f"Cannot write {path}: {e}")
+            return
+        self.engine.log_message(f"Trace of {count} spans saved to {path}")
+
+    def start_transmit(self):
+        """Start transmission/reception"""
+        self.settings["keep_port_open"] = self.keep_open_var.get()
+        if self.engine.start() and self.settings["mode"] == "command" and self.settings["custom_command"] \
+                and not self.settings["sequence_file"]:
+            self.remember_custom_command(self.settings["custom_command"])
+        self.update_buttons()
+
+    def retry_connect(self):
+        """Attempt to reconnect to the serial port"""
+        if self.engine.is_open():
+            self.engine.close_serial_port()
+        
+        # Wait a moment before retrying
+        self.root.after(500, self.engine.attempt_reconnect)
+
+    def disconnect_port(self):
+        """Manually disconnect from serial port"""
+        if not self.engine.disconnect():
+            messagebox.showinfo("Already Disconnected", "Port is already closed.")
+
+    def stop_transmit(self):
+        """Stop transmission/reception"""
+        self.engine.stop()
+        self.update_buttons()
+
+    def get_session_manager(self):
+        """Session manager for extra ports; its sessions log into the same view"""
+        if self.session_manager is None:
+            self.session_manager = SessionManager(
+                on_log=lambda name, message, level: self.log_sink.put(f"[{name}] {message}", level),
+                on_error=lambda title, message: self.root.after(0, messagebox.showerror, title, message)
+            )
+        return self.session_manager
+
+    def open_sessions(self):
+        """Show the multi-port sessions window"""
+        if self.sessions_window and self.sessions_window.window.winfo_exists():
+            self.sessions_window.window.lift()
+            return
+        self.sessions_window = SessionsWindow(self)
+
+    def on_closing(self):
+        """Cleanup on window close"""
+        self.stop_transmit()
+        if self.session_manager:
+            self.session_manager.close()
+        self.engine.pool.close_all()
+        self.discovery.stop()
+        self.root.destroy()
+
+def main():
+    configure_logging()
+    root = tk.Tk()
+    app = SerialTransmitterApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_closing)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
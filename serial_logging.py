@@ -0,0 +1,241 @@
+"""Logging that keeps file I/O off the serial threads.
+
+configure_logging() starts one background writer thread. The engine's
+write_log() only puts a (time, level, message) tuple on the writer's
+queue. Anything else that logs through the standard `logging` module
+reaches the same queue through a QueueHandler on the root logger, so
+lines stay in order.
+
+The writer takes whatever is queued (up to a batch), formats it and writes
+it with one call to a rotating log file (by size, or by time with `when`)
+and to the console. The file is flushed once a second, after a batch
+containing a WARNING or ERROR, on rollover and at shutdown, not after
+every line. If the writer falls far behind, new lines are counted as
+dropped instead of blocking the caller. A batch that cannot be written
+(disk full, a rollover rename refused on Windows) is counted as failed
+and reported on stderr, and the writer goes on with the next one.
+set_log_tracer() times each batch as the log_write stage (see
+serial_trace.py).
+"""
+import sys
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler, TimedRotatingFileHandler
+
+from serial_trace import LOG_WRITE
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_FILE = 'serial_transmission.log'
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+FLUSH_INTERVAL = 1.0  # seconds between file flushes
+ERROR_REPORT_INTERVAL = 60.0  # the same write error is reported on stderr at most this often
+MAX_BATCH = 1000
+MAX_PENDING = 100000  # queued lines before new ones are dropped
+
+LEVELS = {"ERROR": logging.ERROR, "WARNING": logging.WARNING, "INFO": logging.INFO}
+
+_writer = None
+_atexit_registered = False
+_tracer = None
+
+
+class _RecordQueueHandler(QueueHandler):
+    """QueueHandler that enqueues the record as is; the writer thread formats it"""
+
+    def prepare(self, record):
+        return record
+
+
+class _LogWriter(threading.Thread):
+    """Background thread that formats queued lines and writes them in batches"""
+
+    _STOP = object()
+
+    def __init__(self, file_handler, console_handler):
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = queue.SimpleQueue()
+        self.file_handler = file_handler
+        self.console_handler = console_handler
+        self.formatter = logging.Formatter(LOG_FORMAT)
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0  # lines of batches that could not be written
+        self._last_error = None
+        self._last_error_at = 0.0
+        self._stamp_second = None
+        self._stamp_text = ""
+
+    def put(self, created, level, message):
+        if self.queue.qsize() >= MAX_PENDING:
+            self.dropped += 1
+            return
+        self.queue.put((created, level, message))
+
+    def _format(self, item):
+        """Format a queued tuple or LogRecord as one LOG_FORMAT line"""
+        if isinstance(item, logging.LogRecord):
+            return self.formatter.format(item) + "\n"
+        created, level, message = item
+        second = int(created)
+        if second != self._stamp_second:
+            self._stamp_second = second
+            self._stamp_text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        return f"{self._stamp_text},{int((created - second) * 1000):03d} - {level} - {message}\n"
+
+    def _is_urgent(self, item):
+        if isinstance(item, logging.LogRecord):
+            return item.levelno >= logging.WARNING
+        return item[1] != "INFO"
+
+    def _write_file(self, text):
+        handler = self.file_handler
+        with handler.lock:
+            if handler.stream is None:
+                handler.stream = handler._open()  # a failed rollover left no file open
+            if isinstance(handler, TimedRotatingFileHandler):
+                rollover = handler.shouldRollover(None)
+            else:
+                # maxBytes counts bytes in the file, not characters
+                size = len(text) if text.isascii() else len(text.encode(handler.encoding or "utf-8", "replace"))
+                rollover = handler.maxBytes > 0 and handler.stream.tell() + size >= handler.maxBytes
+            if rollover:
+                handler.doRollover()
+            handler.stream.write(text)
+
+    def _report(self, error):
+        """Tell stderr a write failed, without repeating the same error more than once a minute"""
+        now = time.monotonic()
+        message = str(error)
+        if message == self._last_error and now - self._last_error_at < ERROR_REPORT_INTERVAL:
+            return
+        self._last_error = message
+        self._last_error_at = now
+        try:
+            sys.stderr.write(f"Log writer: {message} ({self.failed} lines not written so far)\n")
+        except Exception:
+            pass
+
+    def flush(self):
+        try:
+            with self.file_handler.lock:
+                if self.file_handler.stream is not None:
+                    self.file_handler.stream.flush()
+        except OSError as e:
+            self._report(e)
+
+    def run(self):
+        last_flush = time.monotonic()
+        running = True
+        while running:
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=FLUSH_INTERVAL))
+                while len(batch) < MAX_BATCH:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if any(item is self._STOP for item in batch):
+                # A record logged while close() ran can be queued after the sentinel: write those too
+                try:
+                    while True:
+                        batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    pass
+                batch = [item for item in batch if item is not self._STOP]
+                running = False
+
+            urgent = False
+            if batch:
+                tracer = _tracer
+                start = tracer.clock() if tracer else 0
+                text = "".join(self._format(item) for item in batch)
+                urgent = any(self._is_urgent(item) for item in batch)
+                try:
+                    self._write_file(text)
+                    self.written += len(batch)
+                except OSError as e:
+                    self.failed += len(batch)
+                    self._report(e)
+                if self.console_handler:
+                    try:
+                        with self.console_handler.lock:
+                            self.console_handler.stream.write(text)
+                            self.console_handler.stream.flush()
+                    except (OSError, ValueError):
+                        pass  # no usable console, e.g. a closed pipe
+                if tracer:
+                    tracer.lap(LOG_WRITE, start)
+
+            now = time.monotonic()
+            if urgent or not running or now - last_flush >= FLUSH_INTERVAL:
+                self.flush()
+                last_flush = now
+
+    def stop(self):
+        self.queue.put(self._STOP)
+        self.join()
+        self.file_handler.close()
+
+
+def configure_logging(log_file=LOG_FILE, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT, when=None, console=True):
+    """Route all logging through a background writer to a rotating file (and the console).
+
+    With `when` (e.g. 'midnight', 'H') the file rotates by time, otherwise
+    when it reaches max_bytes (0 = never). backup_count old files are kept.
+    """
+    global _writer, _atexit_registered
+    shutdown_logging()
+
+    if when:
+        file_handler = TimedRotatingFileHandler(log_file, when=when, backupCount=backup_count, encoding='utf-8')
+    else:
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    _writer = _LogWriter(file_handler, logging.StreamHandler() if console else None)
+    _writer.start()
+
+    logging.basicConfig(level=logging.INFO, handlers=[_RecordQueueHandler(_writer.queue)], force=True)
+    if not _atexit_registered:
+        atexit.register(shutdown_logging)
+        _atexit_registered = True
+
+
+def write_log(message, level="INFO"):
+    """Log one line without touching the filesystem on the calling thread"""
+    writer = _writer
+    if writer is not None:
+        writer.put(time.time(), level, message)
+    else:
+        logging.log(LEVELS.get(level, logging.INFO), message)
+
+
+def set_log_tracer(tracer):
+    """Time the writer's batches on tracer (a serial_trace.Tracer), or stop with None"""
+    global _tracer
+    _tracer = tracer
+
+
+def logging_counters():
+    """Lines written, dropped and not written (write errors) by the background writer"""
+    if _writer is None:
+        return {"written": 0, "dropped": 0, "failed": 0, "pending": 0}
+    return {"written": _writer.written, "dropped": _writer.dropped, "failed": _writer.failed,
+            "pending": _writer.queue.qsize()}
+
+
+def shutdown_logging():
+    """Write out everything still queued and stop the background writer"""
+    global _writer
+    if _writer is None:
+        return
+    writer = _writer
+    _writer = None
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, _RecordQueueHandler):
+            root.removeHandler(handler)
+    writer.stop()
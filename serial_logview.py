@@ -0,0 +1,130 @@
+"""Buffering between the serial threads and the log view.
+
+Serial threads call LogSink.put() which only appends a tuple to a bounded
+deque. The Tk thread calls LogSink.drain() on a timer and hands the batch
+to the view in one go. When the view cannot keep up the oldest pending
+lines are dropped and replaced by one "lines dropped" notice.
+
+Drained lines are kept in a LogRingBuffer of fixed capacity, so the log
+history never grows past a set number of lines.
+"""
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+# How often the GUI drains the sink, and how much it takes per drain
+DRAIN_INTERVAL_MS = 100
+MAX_BATCH = 1000
+MAX_PENDING = 20000
+
+# Lines of history kept for the log view
+LOG_CAPACITY = 100000
+
+
+class LogSink:
+    """Bounded multi-producer queue of log lines with batched, formatted drains"""
+
+    def __init__(self, max_pending=MAX_PENDING, max_batch=MAX_BATCH):
+        self.pending = deque(maxlen=max_pending)
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.rendered = 0
+        self.dropped = 0
+        self._dropped_reported = 0
+        self._stamp_second = None
+        self._stamp_text = ""
+
+    def put(self, message, level="INFO"):
+        """Queue a message; safe to call from any thread"""
+        entry = (time.time(), level, message)
+        with self.lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1  # append below pushes out the oldest line
+            self.pending.append(entry)
+            self.queued += 1
+
+    def _timestamp(self, when):
+        """Format a timestamp, reusing the string within the same second"""
+        second = int(when)
+        if second != self._stamp_second:
+            self._stamp_second = second
+            self._stamp_text = datetime.fromtimestamp(second).strftime("%Y/%m/%d %H:%M:%S")
+        return self._stamp_text
+
+    def drain(self):
+        """Take up to max_batch lines, returns them formatted as a list (empty if none)"""
+        with self.lock:
+            count = min(len(self.pending), self.max_batch)
+            batch = [self.pending.popleft() for _ in range(count)]
+            dropped = self.dropped - self._dropped_reported
+            self._dropped_reported = self.dropped
+
+        lines = []
+        if dropped:
+            lines.append(f"... {dropped} log lines dropped (display could not keep up) ...")
+        for when, level, message in batch:
+            lines.append(f"[{self._timestamp(when)}] {level}: {message}")
+        self.rendered += len(batch)
+        return lines
+
+    def counters(self):
+        """Queued, rendered and dropped line counts plus the current backlog"""
+        with self.lock:
+            return {"queued": self.queued, "rendered": self.rendered,
+                    "dropped": self.dropped, "pending": len(self.pending)}
+
+
+class LogRingBuffer:
+    """Fixed-capacity store of the most recent log lines.
+
+    Slots are preallocated; once full, each new line overwrites the oldest.
+    Lines are addressed by logical index, 0 being the oldest line kept.
+    `evicted` counts every line pushed out (or cleared) so far, which lets a
+    view hold a stable absolute position while old lines roll off.
+    """
+
+    def __init__(self, capacity=LOG_CAPACITY):
+        self.capacity = capacity
+        self.lines = [None] * capacity
+        self.start = 0
+        self.count = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, line):
+        """Add a line, overwriting the oldest when full"""
+        if self.count < self.capacity:
+            self.lines[(self.start + self.count) % self.capacity] = line
+            self.count += 1
+        else:
+            self.lines[self.start] = line
+            self.start = (self.start + 1) % self.capacity
+            self.evicted += 1
+
+    def extend(self, lines):
+        """Add several lines"""
+        for line in lines:
+            self.append(line)
+
+    def get_range(self, first, last):
+        """Lines with logical index first..last-1 (clamped to what is stored)"""
+        first = max(0, first)
+        last = min(self.count, last)
+        if first >= last:
+            return []
+        begin = (self.start + first) % self.capacity
+        end = begin + (last - first)
+        if end <= self.capacity:
+            return self.lines[begin:end]
+        return self.lines[begin:] + self.lines[:end - self.capacity]
+
+    def clear(self):
+        """Drop all lines"""
+        self.evicted += self.count
+        self.lines = [None] * self.capacity
+        self.start = 0
+        self.count = 0
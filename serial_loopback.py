@@ -0,0 +1,336 @@
+"""Loopback throughput and error-rate test.
+
+With TX jumpered to RX, or pyserial's loop:// standing in for the
+jumper, every byte written comes back. LoopbackTest streams numbered
+blocks through the open port, with its line settings, and checks each
+block as it returns:
+
+    MAGIC (2 bytes) + sequence number (6 bytes) + payload (block_size bytes)
+
+The payload depends only on the sequence number. It is either PRBS bytes
+("prbs", POOL_BLOCKS blocks drawn once from a fixed seed) or a counting
+pattern ("sequence"). So the receiver knows what every block should hold
+without keeping a copy of what was sent. Payload bytes are masked to the
+data bits, and header bytes never use more than 5 bits, so 5, 6 and 7
+data bit lines can be tested too.
+
+A block is first compared as a whole (one memcmp). Only a block that
+differs is XORed against the expected payload as two big integers, a
+single C-level operation over the whole block that stands in for a
+vectorized compare without NumPy. The non-zero bytes of the XOR are byte
+errors and its set bits are bit errors.
+
+The receiver finds blocks by MAGIC and a plausible sequence number. A
+block whose header was damaged cannot be placed and counts as dropped,
+and the bytes skipped to find the next header are counted. So does a
+block that lost bytes on the line, noticed by the next header starting
+inside it; a block that differs is only judged once that header could
+be complete. A sequence number that goes back is a duplicate. The
+sender keeps no more than window_blocks blocks in flight, so it never
+runs ahead of a slow line, a write never times out at 300 baud, and the
+latency measured is the line's: a block's latency is from the start of
+its write to the read that completed it, including the wait behind the
+block before it.
+
+Results per baud rate: payload throughput and wire bytes/s against the
+line rate (baud / bits per character), byte and bit error rate, dropped
+and duplicated blocks, and block latency p50/p99/max. The engine's
+loopback mode repeats the test over BAUD_RATES with loopback_sweep on.
+loop:// ignores the baud rate, so there efficiency is meaningless and the
+throughput is what the host manages.
+"""
+import time
+import random
+import threading
+from array import array
+from collections import deque
+
+from serial_scheduler import percentile, JITTER_SAMPLES
+
+MAGIC = b"\x1c\x0e"  # 5-bit bytes, neither XON (0x11) nor XOFF (0x13)
+SEQUENCE_DIGITS = 6  # base 32, 5 bits per byte: 2**30 blocks
+HEADER_SIZE = len(MAGIC) + SEQUENCE_DIGITS
+PATTERNS = ("prbs", "sequence")
+BLOCK_SIZES = [16, 64, 256, 1024]  # offered in the GUI
+BLOCK_SIZE = 64
+POOL_BLOCKS = 256  # distinct payloads; block n carries payload n % POOL_BLOCKS
+PRBS_SEED = 0x5EED
+WINDOW_BLOCKS = 2  # one block on the wire, one queued behind it
+WINDOW_SECONDS = 0.02  # at high rates keep this much line time in flight (USB adapters deliver in bursts)
+MIN_BLOCKS = 4  # per rate, however short the test
+SEQUENCE_SLACK = 1024  # a header this far behind the newest block is taken for noise
+READ_TIMEOUT = 0.1
+STALL_TIMEOUT = 0.5  # nothing back for this long (at least two windows): what is in flight is lost
+
+STOP_BITS = {"One": 1, "OnePointFive": 1.5, "Two": 2}
+
+
+class LoopbackError(ValueError):
+    """Bad loopback test parameters"""
+
+
+def line_rate(baud, data_bits=8, parity="None", stop_bits="One"):
+    """Characters per second the line carries: start bit, data bits, parity bit and stop bits each"""
+    bits = 1 + data_bits + (0 if parity == "None" else 1) + STOP_BITS.get(stop_bits, 1)
+    return baud / bits
+
+
+def encode_sequence(number):
+    """Sequence number as SEQUENCE_DIGITS base 32 digits, most significant first"""
+    return bytes((number >> (5 * shift)) & 31 for shift in range(SEQUENCE_DIGITS - 1, -1, -1))
+
+
+def decode_sequence(data):
+    """Inverse of encode_sequence(), or None if a digit is out of range"""
+    number = 0
+    for digit in data:
+        if digit > 31:
+            return None
+        number = number * 32 + digit
+    return number
+
+
+def build_pool(pattern, block_size, data_bits=8):
+    """The POOL_BLOCKS payloads of pattern, masked to data_bits"""
+    if pattern not in PATTERNS:
+        raise LoopbackError(f"unknown pattern '{pattern}', choose from {', '.join(PATTERNS)}")
+    if block_size < 1:
+        raise LoopbackError("block size must be at least 1 byte")
+    mask = (1 << data_bits) - 1
+    if pattern == "prbs":
+        table = bytes(value & mask for value in range(256))
+        data = random.Random(PRBS_SEED).randbytes(block_size * POOL_BLOCKS).translate(table)
+        return tuple(data[i:i + block_size] for i in range(0, len(data), block_size))
+    # Counting bytes starting at the sequence number; repeats every 256 blocks (mask + 1 divides 256)
+    counting = bytes(value & mask for value in range(256)) * (-(-(block_size + 256) // 256))
+    return tuple(counting[n:n + block_size] for n in range(POOL_BLOCKS))
+
+
+class LoopbackTest:
+    """Streams numbered blocks through a looped-back port and checks what comes back"""
+
+    def __init__(self, block_size=BLOCK_SIZE, pattern="prbs", data_bits=8, parity="None",
+                 stop_bits="One", window_blocks=WINDOW_BLOCKS, clock=time.perf_counter):
+        self.ser = None
+        self.block_size = block_size
+        self.pattern = pattern
+        self.data_bits = data_bits
+        self.parity = parity
+        self.stop_bits = stop_bits
+        self.window_blocks = max(window_blocks, 1)
+        self.clock = clock
+        self.pool = build_pool(pattern, block_size, data_bits)
+        self.block_bytes = HEADER_SIZE + block_size
+        self.latency = array('d', bytes(8 * JITTER_SAMPLES))
+        self.reset()
+
+    def reset(self):
+        """Zero the results for a new run"""
+        self.baud = self.ser.baudrate if self.ser else 0
+        self.buffer = bytearray()
+        self.sent_at = deque()  # (sequence number, write start) of blocks not back yet
+        self.sent_blocks = 0
+        self.sent_bytes = 0
+        self.received_bytes = 0  # every byte read, good or not
+        self.written_off = -1  # blocks up to this one are given up as lost
+        self.blocks = 0  # blocks received and checked
+        self.newest = -1  # highest sequence number received
+        self.dropped = 0
+        self.duplicated = 0
+        self.damaged = 0  # blocks with at least one byte error
+        self.byte_errors = 0
+        self.bit_errors = 0
+        self.skipped_bytes = 0  # read while looking for a block header
+        self.samples = 0
+        self.max_latency = 0.0
+        self.elapsed = 0.0
+        self.completed = False
+
+    def line_rate(self):
+        return line_rate(self.baud, self.data_bits, self.parity, self.stop_bits)
+
+    def run(self, ser, seconds, stop_event=None):
+        """Stream blocks through ser for seconds (and at least MIN_BLOCKS), then collect the last ones.
+
+        Runs at the port's current baud rate. Returns stats().
+        """
+        self.ser = ser
+        clock = self.clock
+        stop_event = stop_event or threading.Event()
+        self.reset()
+        rate = self.line_rate()
+        window = max(self.window_blocks, -(-int(rate * WINDOW_SECONDS) // self.block_bytes))
+        window_time = window * self.block_bytes / rate
+        stall = max(STALL_TIMEOUT, 2 * window_time)
+        timeout, write_timeout = ser.timeout, ser.write_timeout
+        ser.timeout = READ_TIMEOUT
+        if write_timeout is not None:
+            ser.write_timeout = max(write_timeout, 2 * window_time)  # a whole window may queue in the driver
+        ser.reset_input_buffer()
+        start = last_read = clock()
+        end = start + seconds
+        try:
+            while not stop_event.is_set():
+                sending = self.sent_blocks < MIN_BLOCKS or clock() < end
+                # Blocks after the newest one back; any before it that are missing were lost
+                in_flight = self.sent_blocks - 1 - max(self.newest, self.written_off)
+                if sending and in_flight < window:
+                    self._send(clock())
+                    continue
+                if not sending and in_flight <= 0:
+                    self.completed = True
+                    break
+                data = ser.read(max(1, ser.in_waiting))
+                now = clock()
+                if data:
+                    last_read = now
+                    self.received_bytes += len(data)
+                    self._receive(data, now)
+                elif now - last_read > stall:
+                    if not sending:
+                        self.completed = True
+                        break  # the rest is not coming back
+                    self.written_off = self.sent_blocks - 1
+                    last_read = now
+        finally:
+            ser.timeout = timeout
+            ser.write_timeout = write_timeout
+            self.elapsed = (last_read if self.blocks else clock()) - start
+            self._receive(b"", clock(), final=True)
+            if self.completed:
+                # Blocks sent after the newest one received never came back
+                self.dropped += self.sent_blocks - 1 - self.newest
+            self.skipped_bytes += len(self.buffer)
+            self.buffer.clear()
+            self.sent_at.clear()
+        return self.stats()
+
+    def _send(self, now):
+        number = self.sent_blocks
+        block = MAGIC + encode_sequence(number) + self.pool[number % POOL_BLOCKS]
+        self.sent_at.append((number, now))
+        self.ser.write(block)
+        self.sent_blocks += 1
+        self.sent_bytes += len(block)
+
+    def _receive(self, data, now, final=False):
+        """Check every complete block in the receive buffer (final: no more data is coming)"""
+        buffer = self.buffer
+        buffer += data
+        size = self.block_bytes
+        block_size = self.block_size
+        pool = self.pool
+        position = 0
+        while len(buffer) - position >= size:
+            if buffer[position:position + 2] != MAGIC:
+                found = buffer.find(MAGIC, position + 1)
+                if found < 0:
+                    found = len(buffer) - 1  # the last byte may start a header
+                self.skipped_bytes += found - position
+                position = found
+                continue
+            number = decode_sequence(buffer[position + 2:position + HEADER_SIZE])
+            if number is None or number >= self.sent_blocks or number < self.newest - SEQUENCE_SLACK:
+                self.skipped_bytes += 1  # MAGIC turned up by chance
+                position += 1
+                continue
+            payload = buffer[position + HEADER_SIZE:position + size]
+            expected = pool[number % POOL_BLOCKS]
+            if payload != expected:
+                if not final and len(buffer) - position < size + HEADER_SIZE - 1:
+                    break  # the next header may start inside this block: wait until it is all here
+                later = self._truncated(position, number)
+                if later:
+                    position = later
+                    continue
+                difference = int.from_bytes(payload, "big") ^ int.from_bytes(expected, "big")
+                self.byte_errors += block_size - difference.to_bytes(block_size, "big").count(0)
+                self.bit_errors += bin(difference).count("1")
+                self.damaged += 1
+            self.blocks += 1
+            position += size
+            if number <= self.newest:
+                self.duplicated += 1
+                continue
+            self.dropped += number - self.newest - 1
+            self.newest = number
+            sent_at = self.sent_at
+            while sent_at and sent_at[0][0] < number:
+                sent_at.popleft()  # dropped
+            if sent_at and sent_at[0][0] == number:
+                latency = now - sent_at.popleft()[1]
+                self.latency[self.samples % JITTER_SAMPLES] = latency
+                self.samples += 1
+                if latency > self.max_latency:
+                    self.max_latency = latency
+        del buffer[:position]
+
+    def _truncated(self, position, number):
+        """Position of a later block starting inside the block at position, or 0.
+
+        The block lost bytes on the line: its bytes are skipped and it counts as dropped.
+        """
+        buffer = self.buffer
+        # Headers starting up to the last byte of the block, if all of the header is buffered
+        end = min(position + self.block_bytes + len(MAGIC) - 1, len(buffer) - HEADER_SIZE + len(MAGIC))
+        found = buffer.find(MAGIC, position + 1, end)
+        while found >= 0:
+            later = decode_sequence(buffer[found + 2:found + HEADER_SIZE])
+            if later is not None and number < later < self.sent_blocks:
+                self.skipped_bytes += found - position
+                return found
+            found = buffer.find(MAGIC, found + 1, end)
+        return 0
+
+    @property
+    def passed(self):
+        """Every block came back once and intact"""
+        return self.completed and not (self.byte_errors or self.dropped or self.duplicated or self.skipped_bytes)
+
+    def stats(self):
+        """Throughput, error rates, dropped and duplicated blocks and latency of the last run"""
+        elapsed = max(self.elapsed, 1e-9)
+        rate = self.line_rate()
+        checked = self.blocks * self.block_size
+        ordered = sorted(self.latency[:min(self.samples, JITTER_SAMPLES)])
+        wire_rate = self.received_bytes / elapsed
+        return {
+            "baud": self.baud,
+            "block_size": self.block_size,
+            "pattern": self.pattern,
+            "completed": self.completed,
+            "passed": self.passed,
+            "elapsed_s": round(self.elapsed, 3),
+            "blocks_sent": self.sent_blocks,
+            "blocks_received": self.blocks,
+            "blocks_dropped": self.dropped,
+            "blocks_duplicated": self.duplicated,
+            "blocks_damaged": self.damaged,
+            "bytes_sent": self.sent_bytes,
+            "bytes_received": self.received_bytes,
+            "bytes_checked": checked,
+            "byte_errors": self.byte_errors,
+            "byte_error_rate": self.byte_errors / checked if checked else 0.0,
+            "bit_errors": self.bit_errors,
+            "bit_error_rate": self.bit_errors / (checked * self.data_bits) if checked else 0.0,
+            "skipped_bytes": self.skipped_bytes,
+            "throughput_bytes_per_s": round(checked / elapsed, 1),
+            "wire_bytes_per_s": round(wire_rate, 1),
+            "line_rate_bytes_per_s": round(rate, 1),
+            "efficiency": round(wire_rate / rate, 3),
+            "latency_p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+            "latency_p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+            "latency_max_ms": round(self.max_latency * 1000, 3)
+        }
+
+    def summary(self):
+        """One-line human readable stats"""
+        stats = self.stats()
+        result = "passed" if stats["passed"] else "FAILED" if stats["completed"] else "stopped"
+        return (f"Loopback {stats['baud']} baud {result}: {stats['blocks_received']}/{stats['blocks_sent']} blocks "
+                f"of {self.block_size} bytes in {stats['elapsed_s']} s, "
+                f"{stats['throughput_bytes_per_s']} B/s payload ({stats['efficiency']:.0%} of line rate), "
+                f"{stats['byte_errors']} byte errors (rate {stats['byte_error_rate']:.2e}, "
+                f"BER {stats['bit_error_rate']:.2e}), {stats['blocks_dropped']} dropped, "
+                f"{stats['blocks_duplicated']} duplicated, {stats['skipped_bytes']} bytes skipped, "
+                f"latency p50/p99/max {stats['latency_p50_ms']}/{stats['latency_p99_ms']}/{stats['latency_max_ms']} ms")
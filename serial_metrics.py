@@ -0,0 +1,118 @@
+"""Live statistics for serial sessions.
+
+The counters themselves are plain integer attributes of SerialEngine
+(tx_frames, rx_bytes, decode_errors, zero_writes, ...). Each one is only
+incremented by the thread doing that work, and an integer add under the
+GIL is never torn, so the transmit and receive paths take no lock and
+call nothing extra. SerialEngine.throughput() is the snapshot.
+
+Readers sample at their own pace without slowing the writers:
+
+    MetricsSampler    adds per-second rates over the last sample interval
+                      to each snapshot (the GUI stats panel)
+    MetricsExporter   appends snapshots of one or more sessions to a JSON
+                      lines or CSV file every interval (the CLI --metrics)
+"""
+import csv
+import json
+import time
+import threading
+
+# Counters that get a rate over the last interval ("recent_<name>_per_s")
+RATE_COUNTERS = ("tx_frames", "tx_bytes", "rx_frames", "rx_bytes")
+EXPORT_INTERVAL = 1.0
+
+
+class MetricsSampler:
+    """Snapshots of a counter source with rates over the time since the previous sample"""
+
+    def __init__(self, source, clock=time.monotonic):
+        self.source = source  # callable returning a dict of counters, e.g. SerialEngine.throughput
+        self.clock = clock
+        self.previous = None
+        self.previous_at = 0.0
+
+    def sample(self):
+        """Current counters plus recent_<counter>_per_s for RATE_COUNTERS"""
+        now = self.clock()
+        snapshot = self.source()
+        previous = self.previous
+        interval = now - self.previous_at
+        for name in RATE_COUNTERS:
+            value = snapshot.get(name, 0)
+            before = previous.get(name, 0) if previous else 0
+            if value < before:
+                before = 0  # counters were reset by a new run
+            snapshot[f"recent_{name}_per_s"] = round((value - before) / interval, 1) \
+                if previous and interval > 0 else 0.0
+        self.previous = snapshot
+        self.previous_at = now
+        return snapshot
+
+
+class MetricsExporter:
+    """Appends snapshots of named sessions to a file every interval seconds, from a daemon thread.
+
+    sources maps a session name to a counter callable. A path ending in
+    .csv is written as CSV with one row per session and sample, anything
+    else as JSON lines. A final sample is written by stop().
+    """
+
+    def __init__(self, path, sources, interval=EXPORT_INTERVAL, clock=time.monotonic):
+        self.path = path
+        self.samplers = {name: MetricsSampler(source, clock) for name, source in sources.items()}
+        self.interval = interval
+        self.csv = path.lower().endswith(".csv")
+        self.file = open(path, "a", newline="" if self.csv else None, encoding="utf-8")
+        self.writer = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.rows = 0
+
+    def start(self):
+        """Write a first sample now and then every interval"""
+        self.write_sample()
+        self.thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.write_sample()
+
+    def write_sample(self):
+        """Sample every session and append the rows"""
+        stamp = round(time.time(), 3)
+        for name, sampler in self.samplers.items():
+            row = {"time": stamp, "session": name}
+            row.update(sampler.sample())
+            if self.csv:
+                if self.writer is None:
+                    self.writer = csv.DictWriter(self.file, fieldnames=list(row), extrasaction="ignore")
+                    if self.file.tell() == 0:
+                        self.writer.writeheader()
+                self.writer.writerow(row)
+            else:
+                self.file.write(json.dumps(row) + "\n")
+            self.rows += 1
+        self.file.flush()
+
+    def stop(self):
+        """Stop the thread, write a last sample and close the file"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if not self.file.closed:
+            self.write_sample()
+            self.file.close()
+
+
+def format_rate(value, unit):
+    """Short human readable rate, e.g. '12.3k frames/s'"""
+    if value >= 1e6:
+        return f"{value / 1e6:.1f}M {unit}/s"
+    if value >= 1e4:
+        return f"{value / 1e3:.1f}k {unit}/s"
+    return f"{value:g} {unit}/s"
+
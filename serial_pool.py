@@ -0,0 +1,142 @@
+"""Warm serial port handles for command mode.
+
+Opening a USB-serial adapter takes tens to hundreds of milliseconds, so
+firing one command after another is dominated by open/close. Instead of
+closing the port after a command, the engine gives the handle back to a
+PortPool, and the next command on that port takes it again.
+
+The pool holds at most one idle handle per port, because most platforms
+(Windows always) will not open a port twice. A handle is reused even if
+baud rate, parity etc. changed in between; the new settings are applied
+to the open port, which costs one ioctl instead of a reopen. Before
+reuse a handle is health-checked (still open, line status readable) and
+stale input is discarded. Handles idle longer than idle_timeout are
+closed by a timer so the port becomes free for other programs.
+"""
+import time
+import threading
+
+IDLE_TIMEOUT = 5.0  # seconds an unused handle stays open
+
+
+class PortPool:
+    """Idle, already open serial handles keyed by port name; thread-safe"""
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, clock=time.monotonic):
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.idle = {}  # port -> (ser, released_at)
+        self.timer = None
+        self.opened = 0
+        self.reused = 0
+        self.reconfigured = 0
+        self.evicted = 0
+        self.health_failures = 0
+
+    def acquire(self, port, port_settings, open_port):
+        """Take the idle handle for port, or call open_port() to open one.
+
+        port_settings is a dict of pyserial attributes (baudrate, parity,
+        bytesize, stopbits) applied to a reused handle. open_port returns an
+        open serial object or None. Returns (ser or None, reused)
+        """
+        with self.lock:
+            entry = self.idle.pop(port, None)
+        if entry is not None:
+            ser = entry[0]
+            if self._healthy(ser, port_settings):
+                with self.lock:
+                    self.reused += 1
+                return ser, True
+            with self.lock:
+                self.health_failures += 1
+            self._close(ser)
+
+        ser = open_port()
+        if ser is not None:
+            with self.lock:
+                self.opened += 1
+        return ser, False
+
+    def _healthy(self, ser, port_settings):
+        """True if ser is still usable; applies port_settings and drops stale input"""
+        try:
+            if not ser.is_open:
+                return False
+            ser.in_waiting  # fails once the adapter is unplugged
+            changed = False
+            for name, value in port_settings.items():
+                if getattr(ser, name) != value:
+                    setattr(ser, name, value)
+                    changed = True
+            if changed:
+                with self.lock:
+                    self.reconfigured += 1
+            ser.reset_input_buffer()
+            return True
+        except Exception:
+            return False
+
+    def release(self, port, ser):
+        """Return an open handle to the pool; a handle already idle for port is closed"""
+        with self.lock:
+            previous = self.idle.pop(port, None)
+            self.idle[port] = (ser, self.clock())
+            self._schedule_eviction()
+        if previous is not None and previous[0] is not ser:
+            self._close(previous[0])
+
+    def discard(self, port):
+        """Close the idle handle for port, e.g. before opening it outside the pool. Returns True if there was one"""
+        with self.lock:
+            entry = self.idle.pop(port, None)
+        if entry is not None:
+            self._close(entry[0])
+        return entry is not None
+
+    def evict_idle(self):
+        """Close handles idle for longer than idle_timeout. Returns how many were closed"""
+        now = self.clock()
+        with self.lock:
+            expired = [port for port, (_, released) in self.idle.items() if now - released >= self.idle_timeout]
+            handles = [self.idle.pop(port)[0] for port in expired]
+            self.evicted += len(handles)
+            self.timer = None
+            self._schedule_eviction()
+        for ser in handles:
+            self._close(ser)
+        return len(handles)
+
+    def _schedule_eviction(self):
+        # Called with the lock held
+        if self.timer is None and self.idle:
+            oldest = min(released for _, released in self.idle.values())
+            delay = max(0.0, oldest + self.idle_timeout - self.clock())
+            self.timer = threading.Timer(delay, self.evict_idle)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _close(self, ser):
+        try:
+            ser.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """Close every idle handle and stop the eviction timer"""
+        with self.lock:
+            handles = [ser for ser, _ in self.idle.values()]
+            self.idle.clear()
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+        for ser in handles:
+            self._close(ser)
+
+    def stats(self):
+        """Open/reuse counters and the number of idle handles"""
+        with self.lock:
+            return {"opened": self.opened, "reused": self.reused, "reconfigured": self.reconfigured,
+                    "evicted": self.evicted, "health_failures": self.health_failures, "idle": len(self.idle)}
+
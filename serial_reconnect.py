@@ -0,0 +1,168 @@
+"""Automatic reconnect after a port drops out.
+
+With auto_reconnect on, a serial error on a worker thread no longer ends
+the run. The engine closes the handle, and the ReconnectSupervisor
+decides when to try again: after 0.5 s, then 1, 2, 4 s and so on, up to
+reconnect_max_delay, with a little jitter so several ports do not retry
+in step. Until stop, it never gives up.
+
+USB serial adapters often come back under another name (COM5 instead of
+COM4, ttyUSB1 instead of ttyUSB0). The identity of the port (USB VID,
+PID and serial number) is recorded when the run starts. find_port()
+looks for that device again, preferring the old name. Ports without USB
+information (pty, loop://, socket://, built-in UARTs) are matched by
+name only.
+
+While transmit mode is down, frames keep falling due on the usual
+schedule. They are held in a bounded queue and sent first once the port
+is back. When the queue is full the oldest frame is dropped. Dropped
+frames, and frames still held when the run stops, are reported as lost.
+"""
+import time
+import random
+from collections import deque, namedtuple
+
+import serial.tools.list_ports
+
+INITIAL_DELAY = 0.5
+MAX_DELAY = 30.0
+BACKOFF_FACTOR = 2.0
+JITTER = 0.1  # +-10% on every delay
+RESEND_QUEUE = 1000  # frames held while the port is down
+
+PortIdentity = namedtuple("PortIdentity", ["device", "vid", "pid", "serial_number", "description"])
+
+# Outage counters of an engine without a supervisor
+NO_OUTAGES = {"outages": 0, "down": False, "downtime_s": 0.0, "last_outage_s": 0.0,
+              "frames_held": 0, "frames_resent": 0, "frames_lost": 0}
+
+
+def port_identity(device):
+    """USB identity of a port from the OS port list; vid/pid/serial_number are None if it has none"""
+    try:
+        ports = serial.tools.list_ports.comports()
+    except Exception:
+        ports = []
+    for port in ports:
+        if port.device == device:
+            return PortIdentity(device, port.vid, port.pid, port.serial_number, port.description)
+    return PortIdentity(device, None, None, None, "")
+
+
+def describe(identity):
+    """e.g. 'USB 0403:6001 serial A1B2C3 (was COM4)'"""
+    if identity.vid is None:
+        return identity.device
+    serial_number = f" serial {identity.serial_number}" if identity.serial_number else ""
+    return f"USB {identity.vid:04X}:{identity.pid:04X}{serial_number} (was {identity.device})"
+
+
+def find_port(identity):
+    """Device name the port is present as now, or None if it is not there (or is ambiguous)"""
+    if identity.vid is None:
+        return identity.device  # nothing to match but the name; opening it tells whether it is back
+    try:
+        ports = serial.tools.list_ports.comports()
+    except Exception:
+        return None
+    candidates = [port.device for port in ports if port.vid == identity.vid and port.pid == identity.pid
+                  and (not identity.serial_number or port.serial_number == identity.serial_number)]
+    if identity.device in candidates:
+        return identity.device
+    # Renamed: only safe if there is exactly one such adapter
+    return candidates[0] if len(candidates) == 1 else None
+
+
+class ReconnectSupervisor:
+    """Backoff schedule, held frames and outage statistics of one port"""
+
+    def __init__(self, identity, max_delay=MAX_DELAY, queue_size=RESEND_QUEUE, initial_delay=INITIAL_DELAY,
+                 clock=time.monotonic):
+        self.identity = identity
+        self.max_delay = max(max_delay, initial_delay)
+        self.initial_delay = initial_delay
+        self.clock = clock
+        self.held = deque(maxlen=max(queue_size, 1))
+        self.queue_size = queue_size
+        self.down_since = None
+        self.next_attempt = 0.0
+        self.delay = initial_delay
+        self.attempts = 0  # this outage
+        self.outages = 0
+        self.downtime = 0.0
+        self.last_outage = 0.0
+        self.frames_resent = 0
+        self.frames_dropped = 0  # pushed out of the full queue
+        self.frames_abandoned = 0  # still held when the run stopped
+
+    @property
+    def down(self):
+        return self.down_since is not None
+
+    def went_down(self):
+        """Start an outage; the first attempt is due after the initial delay"""
+        now = self.clock()
+        self.down_since = now
+        self.outages += 1
+        self.attempts = 0
+        self.delay = self.initial_delay
+        self.next_attempt = now + self._jittered(self.delay)
+
+    def _jittered(self, delay):
+        return delay * random.uniform(1 - JITTER, 1 + JITTER)
+
+    def until_next_attempt(self):
+        """Seconds until the next attempt is due (0 if it is due now)"""
+        return max(0.0, self.next_attempt - self.clock())
+
+    def attempt_due(self):
+        return self.clock() >= self.next_attempt
+
+    def failed(self):
+        """An attempt failed: back off"""
+        self.attempts += 1
+        self.delay = min(self.delay * BACKOFF_FACTOR, self.max_delay)
+        self.next_attempt = self.clock() + self._jittered(self.delay)
+        return self.delay
+
+    def came_back(self):
+        """The port is open again; returns the length of the outage in seconds"""
+        self.attempts += 1
+        self.last_outage = self.clock() - self.down_since
+        self.downtime += self.last_outage
+        self.down_since = None
+        return self.last_outage
+
+    def hold(self, payload):
+        """Keep a frame that fell due while the port was down"""
+        if not self.queue_size:
+            self.frames_dropped += 1
+            return
+        if len(self.held) == self.held.maxlen:
+            self.frames_dropped += 1  # the oldest is pushed out
+        self.held.append(payload)
+
+    def finish(self):
+        """The run stopped: close an open outage, frames still held are lost"""
+        if self.down_since is not None:
+            self.last_outage = self.clock() - self.down_since
+            self.downtime += self.last_outage
+            self.down_since = None
+        self.frames_abandoned += len(self.held)
+        self.held.clear()
+
+    def stats(self):
+        """Outages, total downtime and what happened to the frames due meanwhile"""
+        downtime = self.downtime
+        down_since = self.down_since
+        if down_since is not None:
+            downtime += self.clock() - down_since
+        return {
+            "outages": self.outages,
+            "down": down_since is not None,
+            "downtime_s": round(downtime, 3),
+            "last_outage_s": round(self.last_outage, 3),
+            "frames_held": len(self.held),
+            "frames_resent": self.frames_resent,
+            "frames_lost": self.frames_dropped + self.frames_abandoned
+        }
@@ -0,0 +1,181 @@
+"""Replay of recorded serial traffic.
+
+A recording is either a capture file (serial_capture.py) or a log file
+such as serial_transmission.log, of which the "Sent:"/"Received:" lines
+are used. Both are read as a stream, one frame at a time, so the size of
+the recording does not matter.
+
+Log lines only keep the text of a frame. Line endings are restored from
+the logged byte count and command bytes from the logged byte list; other
+bytes that did not make it into the log cannot be replayed. Log times
+have millisecond resolution, captures nanoseconds.
+
+ReplayPlayer paces the frames: speed 1 keeps the recorded gaps, speed N
+plays N times faster and speed 0 sends as fast as the port takes them.
+Send times are scheduled from the start of the replay (start + offset /
+speed), so write time never accumulates into drift. A frame that is
+already late is sent at once, never dropped, and its lateness is
+recorded for the timing report.
+"""
+import re
+import time
+from array import array
+
+from serial_capture import CaptureReader, MAGIC, RX, TX
+from serial_scheduler import percentile, JITTER_SAMPLES
+
+# Which recorded frames to send
+DIRECTIONS = {"all": (RX, TX), "sent": (TX,), "received": (RX,)}
+LATE_MS = 1.0  # a frame sent later than this counts as late in the report
+
+_LOG_LINE = re.compile(
+    r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),(\d{3}) - \w+ - (?:\[[^\]]*\] )?"
+    r"(Sent|Sent command|Received): '(.*)'(?: → bytes \[([\d, ]*)\])? \((\d+)(?: of \d+)? bytes\)")
+
+
+def open_recording(path, direction="all"):
+    """Iterator of (seconds, data) for a capture or log file.
+
+    Raises OSError if the file cannot be read and ValueError for an
+    unknown direction. Frames are read lazily as the iterator advances.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"unknown direction '{direction}', choose from {', '.join(DIRECTIONS)}")
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC))
+    if head == MAGIC:
+        return _capture_frames(path, DIRECTIONS[direction])
+    return _log_frames(path, DIRECTIONS[direction])
+
+
+def _capture_frames(path, wanted):
+    with CaptureReader(path) as reader:
+        for timestamp, direction, _, data in reader.frames():
+            if direction in wanted:
+                yield timestamp / 1e9, bytes(data)
+
+
+def _log_frames(path, wanted):
+    stamp_text = None
+    stamp_seconds = 0.0
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = _LOG_LINE.match(line.rstrip("\n"))
+            if not match:
+                continue
+            stamp, milliseconds, kind, text, byte_list, count = match.groups()
+            direction = RX if kind == "Received" else TX
+            if direction not in wanted:
+                continue
+            # Parse each distinct second once, like the log writer formats it once
+            if stamp != stamp_text:
+                stamp_text = stamp
+                stamp_seconds = time.mktime(time.strptime(stamp, "%Y-%m-%d %H:%M:%S"))
+            yield stamp_seconds + int(milliseconds) / 1000.0, _log_data(text, byte_list, int(count))
+
+
+def _log_data(text, byte_list, count):
+    """Bytes of a logged frame: the byte list if there is one, else the text with its line ending restored"""
+    if byte_list:
+        data = bytes(int(value) for value in byte_list.split(","))
+    else:
+        data = text.encode("ascii", errors="ignore")
+    if len(data) > count:
+        return data[:count]  # partial write
+    missing = count - len(data)
+    if missing:
+        # Received lines are logged stripped; they ended with \n or \r\n
+        data += b"\r\n"[2 - min(missing, 2):]
+    return data
+
+
+class ReplayPlayer:
+    """Releases recorded frames on their schedule and measures how closely it was kept"""
+
+    def __init__(self, frames, speed=1.0, name="", clock=time.perf_counter):
+        self.frames = frames
+        self.speed = speed
+        self.name = name
+        self.clock = clock
+        self.lateness = array('d', bytes(8 * JITTER_SAMPLES))
+        self.samples = 0
+        self.sent = 0
+        self.bytes = 0
+        self.late = 0
+        self.max_lateness = 0.0
+        self.recorded = 0.0
+        self.elapsed = 0.0
+        self.completed = False
+
+    def play(self, stop_event):
+        """Yield each frame's data when it is due, until the recording ends or stop_event is set"""
+        clock = self.clock
+        speed = self.speed
+        lateness = self.lateness
+        late_after = LATE_MS / 1000.0
+        first = None
+        start = clock()
+        try:
+            for stamp, data in self.frames:
+                if first is None:
+                    first = stamp
+                    start = clock()
+                if speed:
+                    due = start + (stamp - first) / speed
+                    delay = due - clock()
+                    if delay > 0:
+                        if stop_event.wait(delay):
+                            return
+                    elif stop_event.is_set():
+                        return
+                    late = clock() - due
+                    lateness[self.samples % JITTER_SAMPLES] = late
+                    self.samples += 1
+                    if late > late_after:
+                        self.late += 1
+                    if late > self.max_lateness:
+                        self.max_lateness = late
+                elif stop_event.is_set():
+                    return
+                self.recorded = stamp - first
+                self.sent += 1
+                self.bytes += len(data)
+                yield data
+            self.completed = True
+        finally:
+            self.elapsed = clock() - start
+            close = getattr(self.frames, "close", None)
+            if close:
+                close()  # releases the recording file when stopped early
+
+    def stats(self):
+        """Frames sent and send times against the recorded schedule"""
+        ordered = sorted(self.lateness[:min(self.samples, JITTER_SAMPLES)])
+        scheduled = self.recorded / self.speed if self.speed else 0.0
+        return {
+            "recording": self.name,
+            "speed": self.speed,
+            "completed": self.completed,
+            "frames": self.sent,
+            "bytes": self.bytes,
+            "recorded_s": round(self.recorded, 3),
+            "scheduled_s": round(scheduled, 3),
+            "elapsed_s": round(self.elapsed, 3),
+            "frames_per_s": round(self.sent / self.elapsed, 1) if self.elapsed > 0 else 0.0,
+            "late_p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+            "late_p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+            "late_max_ms": round(self.max_lateness * 1000, 3),
+            "frames_late": self.late
+        }
+
+    def summary(self):
+        """One-line human readable stats"""
+        stats = self.stats()
+        state = "completed" if stats["completed"] else "stopped"
+        if not self.speed:
+            return (f"Replay {state}: {stats['frames']} frames in {stats['elapsed_s']} s "
+                    f"({stats['frames_per_s']} frames/s, max rate)")
+        return (f"Replay {state}: {stats['frames']} frames in {stats['elapsed_s']} s "
+                f"(recorded {stats['recorded_s']} s at {self.speed:g}x = {stats['scheduled_s']} s), "
+                f"send lateness p50/p99/max {stats['late_p50_ms']}/{stats['late_p99_ms']}/{stats['late_max_ms']} ms, "
+                f"{stats['frames_late']} frames late by more than {LATE_MS:g} ms")
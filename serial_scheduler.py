@@ -0,0 +1,119 @@
+"""Drift-free frame scheduling on the monotonic clock.
+
+Deadlines are computed from the start time (start + n * period), never
+from "now + period", so write and logging time cannot accumulate into
+drift. Slots that have already passed are skipped rather than sent in a
+burst, and counted as missed deadlines.
+
+Slots and frames are counted apart. A slot is taken when it comes due,
+whatever happens to the write. The sender counts a frame with
+count_sent() only once it was written in full, so failed or cut short
+writes and frames held while the port is down do not inflate the
+achieved rate.
+"""
+import time
+from array import array
+
+# Lateness samples kept for the jitter percentiles (a ring, oldest overwritten)
+JITTER_SAMPLES = 65536
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class RateScheduler:
+    """Paces a loop at a fixed rate in frames/s; a rate of 0 means no pacing.
+
+    With frames_per_slot N (batched writes) each slot sends N frames, so
+    slots are N / rate apart and the frame rate stays the same.
+    """
+
+    def __init__(self, rate, clock=time.perf_counter, frames_per_slot=1):
+        self.rate = rate
+        self.frames_per_slot = frames_per_slot
+        self.period = frames_per_slot / rate if rate > 0 else 0.0
+        self.clock = clock
+        self.lateness = array('d', bytes(8 * JITTER_SAMPLES))
+        self.reset()
+
+    def reset(self):
+        """Start a new run: the first frame is due immediately"""
+        self.start_time = self.clock()
+        self.slot = 0
+        self.slots = 0  # slots taken
+        self.frames = 0  # frames written in full
+        self.missed = 0
+        self.samples = 0
+
+    def next_deadline(self):
+        """Clock time the next frame is due (start time when unpaced)"""
+        return self.start_time + self.slot * self.period
+
+    def take_slot(self, now=None):
+        """Record the due slot as taken at now (default: the clock) and advance to the next free slot"""
+        self.slots += 1
+        if self.period:
+            if now is None:
+                now = self.clock()
+            self.lateness[self.samples % JITTER_SAMPLES] = now - self.next_deadline()
+            self.samples += 1
+
+            # Skip slots we are already past instead of catching up in a burst
+            next_slot = self.slot + 1
+            due_slot = int((now - self.start_time) / self.period) + 1
+            if due_slot > next_slot:
+                self.missed += due_slot - next_slot
+                next_slot = due_slot
+            self.slot = next_slot
+
+    def count_sent(self, frames=1):
+        """Count frames that were written in full"""
+        self.frames += frames
+
+    def wait(self, stop_event=None):
+        """Sleep until the next slot is due. Returns False if stop_event was set while waiting"""
+        if self.period:
+            delay = self.next_deadline() - self.clock()
+            if delay > 0:
+                if stop_event is not None:
+                    if stop_event.wait(delay):
+                        return False
+                else:
+                    time.sleep(delay)
+        elif stop_event is not None and stop_event.is_set():
+            return False
+
+        self.take_slot()
+        return True
+
+    def stats(self):
+        """Achieved rate, jitter percentiles (ms) and missed deadlines for the run so far"""
+        elapsed = self.clock() - self.start_time
+        ordered = sorted(self.lateness[:min(self.samples, JITTER_SAMPLES)])
+        # Paced, every slot taken stands for a full period, also the last one, which runs past a stop
+        covered = max(elapsed, self.slot * self.period)
+        return {
+            "target_rate": self.rate,
+            "frames": self.frames,
+            "slots": self.slots,
+            "elapsed_s": round(elapsed, 3),
+            "achieved_rate": round(self.frames / covered, 2) if covered > 0 else 0.0,
+            "jitter_p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+            "jitter_p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+            "jitter_max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+            "missed_deadlines": self.missed
+        }
+
+    def summary(self):
+        """One-line human readable stats"""
+        stats = self.stats()
+        target = f"{stats['target_rate']:g}/s" if stats["target_rate"] else "max"
+        return (f"Transmit rate: {stats['achieved_rate']} frames/s (target {target}), "
+                f"{stats['frames']} frames in {stats['elapsed_s']} s ({stats['slots']} slots), "
+                f"jitter p50/p99/max {stats['jitter_p50_ms']}/{stats['jitter_p99_ms']}/{stats['jitter_max_ms']} ms, "
+                f"{stats['missed_deadlines']} missed deadlines")
@@ -0,0 +1,229 @@
+"""Scripted command sequences.
+
+A sequence file lists steps, one per line (# starts a comment):
+
+    send IP                          write a command, no reply expected
+    send P expect ^=\\d{6}            write, wait for the reply and check it (regex)
+    send SP expect =\\d+ timeout 200  ...with a reply timeout in ms (default 1000)
+    wait 100                         next step 100 ms after the previous wait
+    repeat 10                        repeat the steps up to `end` 10 times (0 = forever)
+      ...
+    end
+
+Waits are measured from the previous wait's deadline, not from when the
+step finished, so `repeat 0 / send P expect . / wait 50 / end` polls at
+exactly 20 Hz however long each reply takes (as long as it is shorter
+than 50 ms). If a step overruns a whole wait, the schedule restarts from
+now instead of sending a burst to catch up; that is counted as an overrun.
+
+compile_sequence() parses the text once into a flat tuple of steps with
+precomputed bytes, compiled regexes and jump targets. SequenceRunner then
+executes it on one thread with no parsing or GUI calls per step.
+"""
+import re
+import time
+from array import array
+from collections import namedtuple
+
+from serial_commands import CommandClient, encode_command, DEFAULT_TIMEOUT
+from serial_scheduler import percentile, JITTER_SAMPLES
+
+SEND, WAIT, REPEAT, END = range(4)
+
+# (SEND, command, data, pattern or None, timeout_s)  pattern None = no reply expected
+# (WAIT, seconds)
+# (REPEAT, count, index after END)                   count -1 = forever
+# (END, index of REPEAT)
+Program = namedtuple("Program", ["name", "steps"])
+
+
+class SequenceError(ValueError):
+    """A sequence file that cannot be compiled; the message names the line"""
+
+
+def compile_sequence(text, name="sequence"):
+    """Parse sequence text into a Program; raises SequenceError"""
+    steps = []
+    open_repeats = []
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = _strip_comment(raw)
+        if not line:
+            continue
+        keyword, _, rest = line.partition(" ")
+        keyword = keyword.lower()
+        rest = rest.strip()
+        try:
+            if keyword == "send":
+                steps.append(_compile_send(rest))
+            elif keyword == "wait":
+                milliseconds = float(rest)
+                if milliseconds < 0:
+                    raise ValueError("wait must not be negative")
+                steps.append((WAIT, milliseconds / 1000.0))
+            elif keyword == "repeat":
+                count = int(rest)
+                if count < 0:
+                    raise ValueError("repeat count must not be negative")
+                open_repeats.append(len(steps))
+                steps.append((REPEAT, count or -1, None))
+            elif keyword == "end":
+                if not open_repeats:
+                    raise ValueError("'end' without 'repeat'")
+                start = open_repeats.pop()
+                steps[start] = steps[start][:2] + (len(steps) + 1,)
+                steps.append((END, start))
+            else:
+                raise ValueError(f"unknown step '{keyword}'")
+        except (ValueError, re.error) as e:
+            raise SequenceError(f"{name} line {number}: {e}") from None
+    if open_repeats:
+        raise SequenceError(f"{name}: 'repeat' without 'end'")
+    return Program(name, tuple(steps))
+
+
+def _strip_comment(line):
+    """Remove a trailing comment; a literal '#' (e.g. in a regex) is written as \\#"""
+    return re.split(r"(?<!\\)#", line, 1)[0].replace("\\#", "#").strip()
+
+
+def _compile_send(rest):
+    timeout = DEFAULT_TIMEOUT
+    pattern = None
+    command = rest
+    match = re.search(r"\s+timeout\s+(\d+(?:\.\d*)?)\s*$", command)
+    if match:
+        timeout = float(match.group(1)) / 1000.0
+        command = command[:match.start()]
+    expect_at = re.search(r"\s+expect(\s+|$)", command)
+    if expect_at:
+        pattern = re.compile(command[expect_at.end():].strip() or ".")
+        command = command[:expect_at.start()]
+    command = command.strip()
+    if not command:
+        raise ValueError("'send' needs a command")
+    return (SEND, command, encode_command(command), pattern, timeout)
+
+
+def load_sequence(path):
+    """Read and compile a sequence file"""
+    with open(path, encoding="utf-8") as f:
+        return compile_sequence(f.read(), name=path)
+
+
+class SequenceRunner:
+    """Executes a compiled Program on an open port"""
+
+    def __init__(self, program, ser, on_log=None, capture=None, port="", clock=time.perf_counter):
+        self.program = program
+        self.client = CommandClient(ser, on_log=on_log, capture=capture, port=port)
+        self.on_log = on_log
+        self.clock = clock
+        self.lateness = array('d', bytes(8 * JITTER_SAMPLES))
+        self.samples = 0
+        self.steps_run = 0
+        self.sends = 0
+        self.matched = 0
+        self.mismatched = 0
+        self.timeouts = 0
+        self.overruns = 0
+        self.elapsed = 0.0
+        self.completed = False
+
+    def log_message(self, message, level="INFO"):
+        if self.on_log:
+            self.on_log(message, level)
+
+    def run(self, stop_event):
+        """Run the program until it ends or stop_event is set. Returns True if it ran to the end"""
+        steps = self.program.steps
+        client = self.client.start()
+        clock = self.clock
+        lateness = self.lateness
+        counters = []
+        pc = 0
+        on_schedule = True  # the next send is the first after a wait, so it has a deadline
+        start = deadline = clock()
+        try:
+            while pc < len(steps) and not stop_event.is_set():
+                step = steps[pc]
+                op = step[0]
+                self.steps_run += 1
+                if op == SEND:
+                    if on_schedule:
+                        lateness[self.samples % JITTER_SAMPLES] = clock() - deadline
+                        self.samples += 1
+                        on_schedule = False
+                    self.sends += 1
+                    if step[3] is None:
+                        client.write(step[2])
+                    else:
+                        self._expect(client.send(step[1], step[2], step[4]), step[3])
+                elif op == WAIT:
+                    on_schedule = True
+                    deadline += step[1]
+                    delay = deadline - clock()
+                    if delay > 0:
+                        if stop_event.wait(delay):
+                            break
+                    elif -delay > step[1]:
+                        self.overruns += 1
+                        deadline = clock()
+                elif op == REPEAT:
+                    counters.append(step[1])
+                else:  # END
+                    counters[-1] -= 1
+                    if counters[-1]:
+                        pc = step[1] + 1
+                        continue
+                    counters.pop()
+                pc += 1
+            self.completed = pc >= len(steps)
+        finally:
+            self.elapsed = clock() - start
+            client.close()
+        return self.completed
+
+    def _expect(self, future, pattern):
+        try:
+            reply = future.result()
+        except TimeoutError:
+            self.timeouts += 1  # logged by the client
+            return
+        text = reply.data.decode('ascii', errors='ignore').strip()
+        if pattern.search(text):
+            self.matched += 1
+            self.log_message(f"Reply to '{reply.command}' in {reply.rtt * 1000:.1f} ms: '{text}'")
+        else:
+            self.mismatched += 1
+            self.log_message(f"Unexpected reply to '{reply.command}': '{text}' "
+                             f"(expected /{pattern.pattern}/)", "WARNING")
+
+    def stats(self):
+        """Step counts, reply checks and send timing against the schedule"""
+        ordered = sorted(self.lateness[:min(self.samples, JITTER_SAMPLES)])
+        client = self.client.stats()
+        return {
+            "sequence": self.program.name,
+            "completed": self.completed,
+            "elapsed_s": round(self.elapsed, 3),
+            "steps": self.steps_run,
+            "sends": self.sends,
+            "matched": self.matched,
+            "mismatched": self.mismatched,
+            "timeouts": self.timeouts,
+            "overruns": self.overruns,
+            "send_late_p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+            "send_late_p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+            "send_late_max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+            "rtt": client["rtt"]
+        }
+
+    def summary(self):
+        """One-line human readable stats"""
+        stats = self.stats()
+        state = "completed" if stats["completed"] else "stopped"
+        return (f"Sequence {state}: {stats['sends']} commands in {stats['elapsed_s']} s, "
+                f"{stats['matched']} replies matched, {stats['mismatched']} unexpected, "
+                f"{stats['timeouts']} timeouts, {stats['overruns']} overruns, "
+                f"send lateness p50/p99/max {stats['send_late_p50_ms']}/{stats['send_late_p99_ms']}/"
+                f"{stats['send_late_max_ms']} ms")
@@ -0,0 +1,258 @@
+"""Many serial port sessions in one process.
+
+Each session is a SerialEngine with its own settings. Instead of two
+threads per port, every session whose port has a pollable file descriptor
+(serial devices and socket:// on POSIX) is driven by one shared I/O
+thread. That thread waits in a selector for readable ports (receive
+mode), writable ports (transmit mode at max rate) and the next transmit
+deadline, then does the due reads and writes. Ports without a descriptor
+(Windows COM ports, loop://) fall back to the engine's own threads, and
+so do sessions with auto_reconnect, whose descriptor changes when the
+port is reopened.
+Command-mode sessions send once, as in the single-port app. Sessions
+that replay a recording, run a sequence or a loopback test do that on a
+thread of their own.
+"""
+import time
+import socket
+import selectors
+import threading
+
+import serial
+
+from serial_engine import SerialEngine
+from serial_scheduler import RateScheduler
+
+
+class SessionManager:
+    """Owns a set of named SerialEngine sessions and the shared I/O thread"""
+
+    def __init__(self, on_log=None, on_status=None, on_error=None):
+        self.on_log = on_log  # on_log(name, message, level)
+        self.on_status = on_status  # on_status(name, text, color)
+        self.on_error = on_error  # on_error(title, message)
+        self.sessions = {}
+        self.shared = {}  # name -> engine driven by the I/O thread
+
+        self.selector = selectors.DefaultSelector()
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.wake_w.setblocking(False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.thread = None
+        self.running = False
+        self.cpu_time = 0.0
+
+    def add_session(self, settings, name=None):
+        """Create a session for settings (name defaults to the port). Returns its engine"""
+        name = name or settings["com_port"]
+        if name in self.sessions:
+            raise ValueError(f"Session '{name}' already exists")
+        engine = SerialEngine(
+            settings,
+            on_log=(lambda message, level: self.on_log(name, message, level)) if self.on_log else None,
+            on_status=(lambda text, color: self.on_status(name, text, color)) if self.on_status else None,
+            on_error=self.on_error
+        )
+        engine.log_prefix = f"[{name}] "
+        self.sessions[name] = engine
+        return engine
+
+    def remove_session(self, name):
+        """Stop and forget a session"""
+        self.stop(name)
+        del self.sessions[name]
+
+    def _pollable(self, engine):
+        try:
+            engine.ser.fileno()
+            return True
+        except Exception:
+            return False
+
+    def start(self, name):
+        """Open the session's port and start it. Returns True on success"""
+        engine = self.sessions[name]
+        if engine.running:
+            return True
+        worker = engine.thread
+        if not engine.start(spawn_threads=False):
+            return False
+        if engine.settings["mode"] == "command" or engine.thread is not worker:
+            return True  # replay, sequence and loopback run on the engine's own worker thread
+        if engine.supervisor or not self._pollable(engine):
+            engine.start_workers()
+            return True
+
+        engine.scheduler = RateScheduler(engine.settings["transmit_rate"], frames_per_slot=engine.settings["tx_batch"])
+        self._ensure_thread()
+        self._post("add", name, engine)
+        return True
+
+    def stop(self, name):
+        """Stop a session and close its port"""
+        engine = self.sessions[name]
+        if name in self.shared:
+            done = threading.Event()
+            self._post("remove", name, engine, done)
+            if threading.current_thread() is not self.thread:
+                done.wait(2.0)
+        if engine.running or engine.is_open():
+            engine.stop()
+
+    def start_all(self):
+        """Start every session, returns {name: started}"""
+        return {name: self.start(name) for name in list(self.sessions)}
+
+    def stop_all(self):
+        for name in list(self.sessions):
+            self.stop(name)
+
+    def close(self):
+        """Stop all sessions and the I/O thread"""
+        self.stop_all()
+        if self.thread:
+            self.running = False
+            self._wake()
+            self.thread.join(2.0)
+            self.thread = None
+        self.selector.close()
+        self.wake_r.close()
+        self.wake_w.close()
+
+    def stats(self):
+        """Per-session throughput plus the CPU time used by the shared I/O thread"""
+        return {
+            "sessions": {name: engine.throughput() for name, engine in self.sessions.items()},
+            "shared_sessions": len(self.shared),
+            "io_thread_cpu_s": round(self.cpu_time, 3)
+        }
+
+    # --- shared I/O thread -------------------------------------------------
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="serial-io", daemon=True)
+            self.thread.start()
+
+    def _wake(self):
+        try:
+            self.wake_w.send(b"\0")
+        except OSError:
+            pass  # wakeup already pending
+
+    def _post(self, action, name, engine, done=None):
+        with self.lock:
+            self.pending.append((action, name, engine, done))
+        self._wake()
+
+    def _apply_pending(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for action, name, engine, done in pending:
+            if action == "add":
+                if not (engine.running and engine.is_open()):
+                    continue  # stopped before the I/O thread picked it up
+                mode = engine.settings["mode"]
+                try:
+                    if mode == "receive":
+                        self.selector.register(engine.ser.fileno(), selectors.EVENT_READ, (name, engine))
+                    elif not engine.scheduler.period:
+                        # Unpaced transmit: send whenever the port can take more
+                        self.selector.register(engine.ser.fileno(), selectors.EVENT_WRITE, (name, engine))
+                except (ValueError, OSError) as e:
+                    engine.log_message(f"Unexpected error: {e}", "ERROR")
+                    engine.set_running(False)
+                    continue
+                engine.scheduler.reset()
+                self.shared[name] = engine
+            elif action == "remove":
+                self._detach(name, engine)
+                if done:
+                    done.set()
+
+    def _detach(self, name, engine):
+        if self.shared.pop(name, None) is None:
+            return
+        try:
+            self.selector.unregister(engine.ser.fileno())
+        except (KeyError, ValueError, OSError, AttributeError):
+            pass  # paced transmitters are not registered
+        if engine.settings["mode"] == "transmit":
+            engine.finish_writes()
+            engine.log_message(engine.scheduler.summary())
+            engine.log_message(engine.write_summary())
+        else:
+            engine.flush_partial()
+
+    def _fail(self, name, engine, error):
+        if isinstance(error, serial.SerialException):
+            engine.serial_error(error)
+        else:
+            engine.log_message(f"Unexpected error: {error}", "ERROR")
+        self._detach(name, engine)
+        engine.set_running(False)
+
+    def _next_timeout(self, now):
+        """Seconds until the next transmit deadline or partial-line flush (None = wait for I/O)"""
+        timeout = None
+        now_monotonic = time.monotonic()
+        for engine in self.shared.values():
+            if engine.settings["mode"] == "transmit":
+                if engine.scheduler.period:
+                    due = engine.scheduler.next_deadline() - now
+                else:
+                    continue
+            elif engine.rx_buffer:
+                due = engine.rx_last + engine.settings["inter_byte_timeout"] / 1000.0 - now_monotonic
+            else:
+                continue
+            if timeout is None or due < timeout:
+                timeout = due
+        return None if timeout is None else max(0.0, timeout)
+
+    def _run(self):
+        cpu_start = time.thread_time()
+        clock = time.perf_counter  # same clock as RateScheduler
+        while self.running:
+            self._apply_pending()
+            events = self.selector.select(self._next_timeout(clock()))
+
+            for key, mask in events:
+                if key.data is None:
+                    try:
+                        self.wake_r.recv(4096)
+                    except OSError:
+                        pass
+                    continue
+                name, engine = key.data
+                try:
+                    if mask & selectors.EVENT_READ:
+                        data = engine.ser.read(engine.ser.in_waiting or 1)
+                        if data:
+                            engine.process_received(data)
+                    elif mask & selectors.EVENT_WRITE:
+                        engine.scheduler.take_slot()
+                        engine.send_slot()
+                except Exception as e:
+                    self._fail(name, engine, e)
+
+            now = clock()
+            now_monotonic = time.monotonic()
+            for name, engine in list(self.shared.items()):
+                try:
+                    if engine.settings["mode"] == "transmit":
+                        scheduler = engine.scheduler
+                        if scheduler.period and scheduler.next_deadline() <= now:
+                            scheduler.take_slot()
+                            engine.send_slot()
+                    elif engine.rx_buffer and \
+                            now_monotonic - engine.rx_last >= engine.settings["inter_byte_timeout"] / 1000.0:
+                        engine.flush_partial()
+                except Exception as e:
+                    self._fail(name, engine, e)
+
+            self.cpu_time = time.thread_time() - cpu_start
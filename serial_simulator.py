@@ -0,0 +1,665 @@
+"""Simulated weighing indicators for command mode and load tests.
+
+A SimulatedDevice answers the commands of COMMAND_LIST the way our
+indicators do, and a DeviceSimulator runs any number of them. Each
+device is the far end of a pty pair (open device.port, e.g. /dev/pts/7,
+like a serial port) or of a TCP listener (open socket://127.0.0.1:PORT).
+Commands are lines ending in CR and/or LF, as encode_command() sends
+them:
+
+    IP, P, PV     net weight, as the '=' frame transmit mode sends, plus CR LF
+    PU            unit, e.g. kg
+    Z             zero: the current gross weight reads 0 from now on
+    T             tare: the current net weight is tared off
+    xT            set the tare to x
+    xU            set the unit to UNITS[x]
+    xP            set the decimals to x
+    xS            set the scale to x
+    xM            set the mode: 0 = answer commands, 1 = continuous output
+    SP            set parameters (accepted, nothing to set)
+    CP            clear print: stop continuous output
+    Esc R         reset to the power-on state, reply with the identification
+                  (sent as the text ESC R, or as the bytes ESC and R)
+    anything else ES
+
+x is a number before the letters. The app's command list sends a
+literal X ("XT"), which changes nothing. Commands that set something
+have no reply unless the device was created with ack=True, which
+replies OK.
+
+The gross weight is the base weight, or a waveform (serial_waveform.py)
+stepped SAMPLE_RATE times a second, starting at a different point on
+every device. Other device options:
+
+    latency, jitter   seconds before a reply, plus up to jitter more; replies stay in order
+    stream            weight frames per second sent without being asked (continuous output)
+    faults            {fault: probability}, applied to replies and streamed frames:
+        drop        the frame is not sent
+        corrupt     one byte of it is changed
+        truncate    it is cut short, without its line ending
+        delay       it comes FAULT_DELAY seconds late, and the replies behind it with it
+        disconnect  the device goes silent for FAULT_OUTAGE seconds; a socket
+                    connection is closed
+
+All devices share one thread, as the sessions of serial_sessions.py do.
+It waits in a selector for input on every pty and connection, and for
+the next due reply or streamed frame from a heap of timers. So hundreds
+of ports cost one thread, and idle ports cost no CPU. Run it standalone:
+
+    python serial_simulator.py --pty 4
+    python serial_simulator.py --socket 7000 --count 200 --latency 20 --jitter 5 --faults drop=0.01
+"""
+import os
+import re
+import sys
+import json
+import time
+import heapq
+import random
+import socket
+import argparse
+import selectors
+import threading
+from itertools import count
+
+from serial_engine import weight_payload
+from serial_waveform import compile_waveform, WaveformError
+
+SAMPLE_RATE = 10  # waveform weights per second
+STREAM_RATE = 10.0  # frames/s of continuous output switched on with 1M
+UNITS = ("g", "kg", "lb", "oz")
+FAULTS = ("drop", "corrupt", "truncate", "delay", "disconnect")
+FAULT_DELAY = 0.5
+FAULT_OUTAGE = 2.0
+OUTPUT_LIMIT = 1 << 16  # bytes queued for a port nobody reads; more are dropped
+MAX_LINE = 256  # a longer line without a line ending is discarded
+IDENTIFICATION = "SPT-SIM"
+ERROR_REPLY = b"ES\r\n"
+OK_REPLY = b"OK\r\n"
+MAX_FRAME_WEIGHT = 999999
+MIN_FRAME_WEIGHT = -99999  # six characters with the sign
+
+_COMMAND = re.compile(rb"^(-?\d+(?:\.\d+)?|X)?([A-Z]+)$")
+
+
+class SimulatorError(ValueError):
+    """A bad fault spec, a duplicate device name, or a transport this platform lacks"""
+
+
+def parse_faults(spec):
+    """{fault: probability} from e.g. 'drop=0.01,corrupt=0.005'; raises SimulatorError"""
+    faults = {}
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        name, separator, value = part.partition("=")
+        name = name.strip()
+        if name not in FAULTS or not separator:
+            raise SimulatorError(f"bad fault '{part}', expected NAME=PROBABILITY with NAME one of {', '.join(FAULTS)}")
+        try:
+            probability = float(value)
+        except ValueError:
+            raise SimulatorError(f"bad probability in '{part}'") from None
+        if not 0.0 <= probability <= 1.0:
+            raise SimulatorError(f"probability in '{part}' must be between 0 and 1")
+        faults[name] = probability
+    if sum(faults.values()) > 1.0:
+        raise SimulatorError("fault probabilities add up to more than 1")
+    return faults
+
+
+class SimulatedDevice:
+    """State and command handling of one simulated indicator"""
+
+    def __init__(self, name, weights=(5555,), latency=0.0, jitter=0.0, stream=0.0, faults=None, ack=False, seed=0):
+        self.name = name
+        self.port = ""  # what a client opens
+        self.weights = weights
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_on_reset = stream > 0
+        self.stream_rate = stream or STREAM_RATE
+        self.faults = faults or {}
+        self.ack = ack
+        self.random = random.Random(seed)
+        self.phase = self.random.randrange(len(weights))
+        self.started = 0.0
+        self.reset()
+
+        self.commands = 0
+        self.replies = 0
+        self.streamed = 0
+        self.unknown = 0
+        self.connections = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.dropped_bytes = 0
+        self.injected = dict.fromkeys(FAULTS, 0)
+
+        # I/O state, only touched by the simulator thread
+        self.buffer = b""
+        self.out = bytearray()
+        self.fd = None  # pty master
+        self.slave_fd = None  # held open so the master never sees a hangup between clients
+        self.listener = None
+        self.connection = None
+        self.offline_until = 0.0
+        self.last_due = 0.0  # replies are never scheduled before an earlier one
+        self.stream_active = False  # a streamed-frame timer is in the heap
+
+    def reset(self):
+        """Power-on state"""
+        self.zero = 0
+        self.tare = 0
+        self.unit = 1
+        self.decimals = 0
+        self.scale = 0
+        self.streaming = self.stream_on_reset
+
+    def gross(self, now):
+        return self.weights[(self.phase + int((now - self.started) * SAMPLE_RATE)) % len(self.weights)]
+
+    def net(self, now):
+        return self.gross(now) - self.zero - self.tare
+
+    def frame(self, now):
+        """Weight frame of the net weight, with line ending"""
+        weight = max(MIN_FRAME_WEIGHT, min(MAX_FRAME_WEIGHT, self.net(now)))
+        return weight_payload(weight).data + b"\r\n"
+
+    def commands_in(self, data):
+        """Complete command lines in the data received so far"""
+        # ESC R needs no line ending; as bytes it is made a line of its own
+        text = (self.buffer + data).replace(b"\x1bR", b"\nESC R\n").replace(b"\r", b"\n")
+        *lines, rest = text.split(b"\n")
+        if len(rest) > MAX_LINE:
+            self.unknown += 1
+            rest = b""
+        self.buffer = rest
+        return [line for line in lines if line.strip()]
+
+    def respond(self, command, now):
+        """Reply to one command line, or None if it has none"""
+        self.commands += 1
+        text = command.strip().upper()
+        if text in (b"IP", b"P", b"PV"):
+            return self.frame(now)
+        if text == b"PU":
+            return UNITS[self.unit].encode("ascii") + b"\r\n"
+        if text in (b"ESC R", b"ESCR"):
+            self.reset()
+            return f"{IDENTIFICATION},{self.name}\r\n".encode("ascii", errors="replace")
+        if text == b"Z":
+            self.zero = self.gross(now)
+            self.tare = 0
+            return self.acknowledge()
+        if text == b"T":
+            self.tare = self.gross(now) - self.zero
+            return self.acknowledge()
+        if text == b"SP":
+            return self.acknowledge()
+        if text == b"CP":
+            self.streaming = False
+            return self.acknowledge()
+        match = _COMMAND.match(text)
+        if match:
+            value, code = match.groups()
+            value = None if value in (None, b"X") else float(value)
+            if code in (b"T", b"U", b"P", b"S", b"M"):
+                if value is None:
+                    return self.acknowledge()
+                if code == b"T":
+                    self.tare = int(value)
+                    return self.acknowledge()
+                if code == b"U" and 0 <= value < len(UNITS):
+                    self.unit = int(value)
+                    return self.acknowledge()
+                if code == b"P" and 0 <= value <= 6:
+                    self.decimals = int(value)
+                    return self.acknowledge()
+                if code == b"S":
+                    self.scale = int(value)
+                    return self.acknowledge()
+                if code == b"M" and value in (0, 1):
+                    self.streaming = value == 1
+                    return self.acknowledge()
+        self.unknown += 1
+        return ERROR_REPLY
+
+    def acknowledge(self):
+        return OK_REPLY if self.ack else None
+
+    def inject(self, data):
+        """At most one fault for an outgoing frame: (data or None, extra delay, disconnect)"""
+        faults = self.faults
+        if not faults:
+            return data, 0.0, False
+        roll = self.random.random()
+        for fault in FAULTS:
+            probability = faults.get(fault, 0.0)
+            if roll >= probability:
+                roll -= probability
+                continue
+            self.injected[fault] += 1
+            if fault == "drop":
+                return None, 0.0, False
+            if fault == "corrupt":
+                body = max(1, len(data) - 2)  # keep the line ending, so the damage stays in one reply
+                index = self.random.randrange(body)
+                damaged = bytearray(data)
+                damaged[index] = 0x3F if damaged[index] != 0x3F else 0x21  # '?' or '!'
+                return bytes(damaged), 0.0, False
+            if fault == "truncate":
+                return data[:self.random.randrange(1, max(2, len(data) - 2))], 0.0, False
+            if fault == "delay":
+                return data, FAULT_DELAY, False
+            return None, 0.0, True
+        return data, 0.0, False
+
+    def stats(self):
+        """Commands, replies and faults of this device"""
+        return {
+            "port": self.port,
+            "commands": self.commands,
+            "replies": self.replies,
+            "streamed": self.streamed,
+            "unknown_commands": self.unknown,
+            "connections": self.connections,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "dropped_bytes": self.dropped_bytes,
+            "faults": {name: value for name, value in self.injected.items() if value}
+        }
+
+
+class DeviceSimulator:
+    """Runs simulated devices on one selector thread"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.devices = {}
+        self.selector = selectors.DefaultSelector()
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.wake_w.setblocking(False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.timers = []  # heap of (due, sequence, device, data); data None = the next streamed frame
+        self.sequence = count()
+        self.thread = None
+        self.running = False
+        self.cpu_time = 0.0
+
+    def add_pty(self, name=None, **options):
+        """Simulate a device behind a new pty pair; clients open device.port. Returns the device"""
+        try:
+            import pty
+            import tty
+        except ImportError:
+            raise SimulatorError("pty devices need Linux or macOS, use add_socket()") from None
+        master_fd, slave_fd = pty.openpty()
+        tty.setraw(master_fd)
+        os.set_blocking(master_fd, False)
+        port = os.ttyname(slave_fd)
+        device = self._device(name or port, options)
+        device.port = port
+        device.fd = master_fd
+        device.slave_fd = slave_fd
+        self._post(device)
+        return device
+
+    def add_socket(self, port=0, host="127.0.0.1", name=None, **options):
+        """Simulate a device listening on host:port (0 = any free port); clients open device.port. Returns the device"""
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            listener.bind((host, port))
+        except OSError:
+            listener.close()
+            raise
+        listener.listen(4)
+        listener.setblocking(False)
+        url = f"socket://{host}:{listener.getsockname()[1]}"
+        device = self._device(name or url, options)
+        device.port = url
+        device.listener = listener
+        self._post(device)
+        return device
+
+    def _device(self, name, options):
+        if name in self.devices:
+            raise SimulatorError(f"device '{name}' already exists")
+        options.setdefault("seed", len(self.devices))
+        device = SimulatedDevice(name, **options)
+        self.devices[name] = device
+        return device
+
+    def start(self):
+        """Start serving the devices added so far and any added later"""
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="serial-simulator", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop the thread and close every port"""
+        if self.thread:
+            self.running = False
+            self._wake()
+            self.thread.join(2.0)
+            self.thread = None
+        else:
+            self._close_all()
+        self.selector.close()
+        self.wake_r.close()
+        self.wake_w.close()
+
+    def stats(self):
+        """Totals over all devices, the simulator thread's CPU time and per-device stats"""
+        devices = {name: device.stats() for name, device in self.devices.items()}
+        totals = {key: sum(stats[key] for stats in devices.values())
+                  for key in ("commands", "replies", "streamed", "unknown_commands", "bytes_in", "bytes_out",
+                              "dropped_bytes")}
+        faults = {}
+        for stats in devices.values():
+            for name, value in stats["faults"].items():
+                faults[name] = faults.get(name, 0) + value
+        totals.update({"devices": len(devices), "faults": faults, "thread_cpu_s": round(self.cpu_time, 3),
+                       "per_device": devices})
+        return totals
+
+    # --- simulator thread --------------------------------------------------
+
+    def _wake(self):
+        try:
+            self.wake_w.send(b"\0")
+        except OSError:
+            pass  # wakeup already pending
+
+    def _post(self, device):
+        with self.lock:
+            self.pending.append(device)
+        self._wake()
+
+    def _apply_pending(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        now = self.clock()
+        for device in pending:
+            if device.fd is not None:
+                self.selector.register(device.fd, selectors.EVENT_READ, ("pty", device))
+            else:
+                self.selector.register(device.listener, selectors.EVENT_READ, ("listener", device))
+            device.started = now
+            self._schedule_stream(device, now)
+
+    def _schedule_stream(self, device, now):
+        if device.streaming and not device.stream_active:
+            device.stream_active = True
+            heapq.heappush(self.timers, (now, next(self.sequence), device, None))
+
+    def _run(self):
+        cpu_start = time.thread_time()
+        clock = self.clock
+        timers = self.timers
+        try:
+            while self.running:
+                self._apply_pending()
+                timeout = max(0.0, timers[0][0] - clock()) if timers else None
+                for key, mask in self.selector.select(timeout):
+                    if key.data is None:
+                        try:
+                            self.wake_r.recv(4096)
+                        except OSError:
+                            pass
+                        continue
+                    kind, device = key.data
+                    if mask & selectors.EVENT_WRITE:
+                        self._flush(device)
+                    if mask & selectors.EVENT_READ:
+                        if kind == "listener":
+                            self._accept(device)
+                        else:
+                            self._read(device)
+
+                now = clock()
+                while timers and timers[0][0] <= now:
+                    due, _, device, data = heapq.heappop(timers)
+                    if data is None:
+                        self._stream(device, due, now)
+                    else:
+                        self._write(device, data)
+                self.cpu_time = time.thread_time() - cpu_start
+        finally:
+            self._close_all()
+
+    def _read(self, device):
+        try:
+            if device.fd is not None:
+                data = os.read(device.fd, 4096)
+            else:
+                data = device.connection.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            if device.connection is not None:
+                self._disconnect(device)  # client closed the socket
+            return
+        device.bytes_in += len(data)
+        now = self.clock()
+        if now < device.offline_until:
+            return
+        for command in device.commands_in(data):
+            reply = device.respond(command, now)
+            self._schedule_stream(device, now)
+            if reply is None:
+                continue
+            reply, delay, disconnect = device.inject(reply)
+            if disconnect:
+                self._go_offline(device, now)
+                return
+            if reply is None:
+                continue
+            due = now + device.latency + delay
+            if device.jitter:
+                due += device.random.uniform(0.0, device.jitter)
+            due = max(due, device.last_due)
+            device.last_due = due
+            device.replies += 1
+            heapq.heappush(self.timers, (due, next(self.sequence), device, reply))
+
+    def _stream(self, device, due, now):
+        """Send one streamed frame and schedule the next"""
+        if not device.streaming:
+            device.stream_active = False
+            return
+        period = 1.0 / device.stream_rate
+        after = due + period
+        if after < now - period:
+            after = now  # fell behind (blocked client, stalled loop): skip, do not burst
+        heapq.heappush(self.timers, (after, next(self.sequence), device, None))
+        if now < device.offline_until:
+            return
+        frame, delay, disconnect = device.inject(device.frame(now))
+        if disconnect:
+            self._go_offline(device, now)
+        elif frame is not None:
+            device.streamed += 1
+            if delay:
+                heapq.heappush(self.timers, (now + delay, next(self.sequence), device, frame))
+            else:
+                self._write(device, frame)
+
+    def _go_offline(self, device, now):
+        device.offline_until = now + FAULT_OUTAGE
+        device.out.clear()
+        if device.connection is not None:
+            self._disconnect(device)
+
+    def _write(self, device, data):
+        if self.clock() < device.offline_until:
+            return
+        target = device.fd if device.fd is not None else device.connection
+        if target is None:
+            device.dropped_bytes += len(data)  # no client connected
+            return
+        if device.out:
+            self._queue(device, data)
+            return
+        try:
+            written = os.write(target, data) if device.fd is not None else target.send(data)
+        except (BlockingIOError, InterruptedError):
+            written = 0
+        except OSError:
+            if device.connection is not None:
+                self._disconnect(device)
+            device.dropped_bytes += len(data)
+            return
+        device.bytes_out += written
+        if written < len(data):
+            self._queue(device, data[written:])
+            if device.out:
+                self.selector.modify(target, selectors.EVENT_READ | selectors.EVENT_WRITE,
+                                     ("pty" if device.fd is not None else "connection", device))
+
+    def _queue(self, device, data):
+        if len(device.out) + len(data) > OUTPUT_LIMIT:
+            device.dropped_bytes += len(data)
+        else:
+            device.out += data
+
+    def _flush(self, device):
+        target = device.fd if device.fd is not None else device.connection
+        if target is None:
+            return
+        try:
+            written = os.write(target, device.out) if device.fd is not None else target.send(device.out)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            if device.connection is not None:
+                self._disconnect(device)
+            return
+        device.bytes_out += written
+        del device.out[:written]
+        if not device.out:
+            self.selector.modify(target, selectors.EVENT_READ, ("pty" if device.fd is not None else "connection",
+                                                                device))
+
+    def _accept(self, device):
+        try:
+            connection, _ = device.listener.accept()
+        except OSError:
+            return
+        if self.clock() < device.offline_until:
+            connection.close()
+            return
+        if device.connection is not None:
+            self._disconnect(device)  # one serial line: the newest client wins
+        connection.setblocking(False)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.selector.register(connection, selectors.EVENT_READ, ("connection", device))
+        device.connection = connection
+        device.connections += 1
+        device.buffer = b""
+
+    def _disconnect(self, device):
+        connection = device.connection
+        device.connection = None
+        device.out.clear()
+        try:
+            self.selector.unregister(connection)
+        except (KeyError, ValueError):
+            pass
+        connection.close()
+
+    def _close_all(self):
+        for device in self.devices.values():
+            if device.connection is not None:
+                self._disconnect(device)
+            for fileobj in (device.listener, device.fd):
+                if fileobj is None:
+                    continue
+                try:
+                    self.selector.unregister(fileobj)
+                except (KeyError, ValueError):
+                    pass
+            if device.listener is not None:
+                device.listener.close()
+                device.listener = None
+            for fd in (device.fd, device.slave_fd):
+                if fd is not None:
+                    os.close(fd)
+            device.fd = device.slave_fd = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="serial_simulator",
+                                     description="Simulated indicators answering command mode over ptys or socket://")
+    parser.add_argument("--pty", type=int, default=0, metavar="N", help="number of pty devices")
+    parser.add_argument("--socket", type=int, default=None, metavar="PORT",
+                        help="TCP port of the first socket device (0 = any free port)")
+    parser.add_argument("--count", type=int, default=1, metavar="N",
+                        help="number of socket devices, on PORT, PORT+1, ...")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--weight", type=int, default=5555, help="gross weight without --waveform")
+    parser.add_argument("--waveform", default="", metavar="SPEC", help="gross weight over time, see serial_waveform.py")
+    parser.add_argument("--latency", type=float, default=0.0, metavar="MS", help="reply latency")
+    parser.add_argument("--jitter", type=float, default=0.0, metavar="MS", help="up to this much more latency")
+    parser.add_argument("--stream", type=float, default=0.0, metavar="HZ",
+                        help="send weight frames continuously from the start")
+    parser.add_argument("--faults", default="", metavar="SPEC", help="e.g. drop=0.01,corrupt=0.005,disconnect=0.001")
+    parser.add_argument("--ack", action="store_true", help="reply OK to commands that set something")
+    parser.add_argument("--seed", type=int, default=0, help="seed of waveform phases and faults")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run (default until Ctrl+C)")
+    args = parser.parse_args(argv)
+
+    if not args.pty and args.socket is None:
+        parser.error("give --pty N and/or --socket PORT")
+    if args.pty < 0 or args.count < 1 or args.latency < 0 or args.jitter < 0 or args.stream < 0:
+        parser.error("counts must be positive, latency, jitter and stream rate not negative")
+    try:
+        weights = compile_waveform(args.waveform) if args.waveform else (args.weight,)
+        faults = parse_faults(args.faults)
+    except (WaveformError, SimulatorError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    options = {"weights": weights, "latency": args.latency / 1000.0, "jitter": args.jitter / 1000.0,
+               "stream": args.stream, "faults": faults, "ack": args.ack}
+    simulator = DeviceSimulator()
+    try:
+        for index in range(args.pty):
+            simulator.add_pty(seed=args.seed + index, **options)
+        if args.socket is not None:
+            for index in range(args.count):
+                simulator.add_socket(args.socket + index if args.socket else 0, args.host,
+                                     seed=args.seed + args.pty + index, **options)
+    except (OSError, SimulatorError) as e:
+        print(f"Could not create device: {e}", file=sys.stderr)
+        simulator.stop()
+        return 1
+    for device in simulator.devices.values():
+        print(device.port, flush=True)
+
+    simulator.start()
+    try:
+        if args.duration is None:
+            while True:
+                time.sleep(1)
+        else:
+            time.sleep(args.duration)
+    except KeyboardInterrupt:
+        pass
+    simulator.stop()
+    stats = simulator.stats()
+    if len(simulator.devices) > 16:
+        del stats["per_device"]
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Stage timing for the transmit, receive and log paths.
+
+Tracing is off unless a Tracer is attached (SerialEngine.tracer, the GUI
+Trace checkbox, --trace on the command line). Off, every traced stage
+costs one `if tracer:` test. On, a stage costs a perf_counter_ns()
+call and four stores into an array allocated up front, so the hot paths
+never allocate or take a lock. The buffer is a ring: once full, the
+oldest spans are overwritten and counted.
+
+Stages:
+
+    wait       transmit: sleeping until the next frame is due (poll receive: the 100 ms sleep)
+    write      ser.write() of one frame
+    flush      ser.flush() after it
+    log        log_message(): queueing the line for the log file and the GUI
+    read       receive: blocked in ser.read() / reading in_waiting
+    process    receive: capture, framing and logging of one chunk
+    log_write  log writer thread: formatting and writing one batch of lines
+    tk_delay   GUI: how late Tk ran the log drain after it was due
+    drain      GUI: taking the queued lines from the log sink
+    render     GUI: inserting the batch into the log view
+
+save() writes a Chrome trace (open it in chrome://tracing or
+https://ui.perfetto.dev) or, for a path ending in .folded, collapsed
+stacks ("thread;stage;stage self-time-in-us" lines) for flamegraph.pl,
+speedscope or inferno. Spans nested on one thread, such as log inside
+process, become nested frames.
+"""
+import os
+import json
+import time
+import itertools
+import threading
+from array import array
+
+from serial_scheduler import percentile
+
+STAGES = ("wait", "write", "flush", "log", "read", "process", "log_write", "tk_delay", "drain", "render")
+WAIT, WRITE, FLUSH, LOG, READ, PROCESS, LOG_WRITE, TK_DELAY, DRAIN, RENDER = range(len(STAGES))
+TRACE_CAPACITY = 1 << 18  # spans kept, 8 MiB of buffer
+SPAN_FIELDS = 4  # start_ns, duration_ns, stage, thread ident
+
+get_ident = threading.get_ident
+
+
+class Tracer:
+    """Preallocated ring buffer of (start, duration, stage, thread) spans in nanoseconds"""
+
+    def __init__(self, capacity=TRACE_CAPACITY, clock=time.perf_counter_ns):
+        self.capacity = capacity
+        self.clock = clock
+        # One row of SPAN_FIELDS values per span, interleaved so a span is one attribute lookup away
+        self.buffer = array('q', bytes(8 * SPAN_FIELDS * capacity))
+        self.thread_names = {}
+        self.recorded = 0
+        self._slots = itertools.count()  # next() is a single C call, so threads never share a slot
+        self.origin = clock()
+
+    def record(self, stage, start, end):
+        """Store one span of a stage from start to end (clock() values)"""
+        slot = next(self._slots)
+        ident = get_ident()
+        if ident not in self.thread_names:
+            self.thread_names[ident] = threading.current_thread().name
+        buffer = self.buffer
+        index = slot % self.capacity * SPAN_FIELDS
+        buffer[index] = start
+        buffer[index + 1] = end - start
+        buffer[index + 2] = stage
+        buffer[index + 3] = ident
+        self.recorded = slot + 1
+
+    def lap(self, stage, start):
+        """Record a stage that started at start and ends now; returns now, the start of the next stage"""
+        # record() inlined: this runs up to three times per frame
+        end = self.clock()
+        slot = next(self._slots)
+        ident = get_ident()
+        if ident not in self.thread_names:
+            self.thread_names[ident] = threading.current_thread().name
+        buffer = self.buffer
+        index = slot % self.capacity * SPAN_FIELDS
+        buffer[index] = start
+        buffer[index + 1] = end - start
+        buffer[index + 2] = stage
+        buffer[index + 3] = ident
+        self.recorded = slot + 1
+        return end
+
+    @property
+    def overwritten(self):
+        """Spans lost because the buffer wrapped"""
+        return max(0, self.recorded - self.capacity)
+
+    def spans(self):
+        """(start_ns, duration_ns, stage, thread ident) of the kept spans, oldest first"""
+        count = min(self.recorded, self.capacity)
+        first = self.recorded - count
+        buffer = self.buffer
+        spans = []
+        for slot in range(first, first + count):
+            index = slot % self.capacity * SPAN_FIELDS
+            spans.append(tuple(buffer[index:index + SPAN_FIELDS]))
+        spans.sort()
+        return spans
+
+    def summary(self):
+        """Per stage: span count, total time and duration percentiles"""
+        durations = {}
+        for _, duration, stage, _ in self.spans():
+            durations.setdefault(stage, []).append(duration)
+        summary = {}
+        for stage, name in enumerate(STAGES):
+            values = sorted(durations.get(stage, ()))
+            if not values:
+                continue
+            summary[name] = {
+                "count": len(values),
+                "total_ms": round(sum(values) / 1e6, 3),
+                "mean_us": round(sum(values) / len(values) / 1e3, 2),
+                "p50_us": round(percentile(values, 0.50) / 1e3, 2),
+                "p99_us": round(percentile(values, 0.99) / 1e3, 2),
+                "max_us": round(values[-1] / 1e3, 2)
+            }
+        return summary
+
+    def write_chrome(self, f):
+        """Write a Trace Event Format file: one complete ("X") event per span plus thread names"""
+        pid = os.getpid()
+        origin = self.origin
+        events = [json.dumps({"name": "thread_name", "ph": "M", "pid": pid, "tid": ident, "args": {"name": name}})
+                  for ident, name in self.thread_names.items()]
+        # Spans are numbers and fixed stage names, so they are formatted directly rather than through json
+        events.extend(f'{{"name":"{STAGES[stage]}","cat":"serial","ph":"X","pid":{pid},"tid":{ident},'
+                      f'"ts":{(start - origin) / 1e3:.3f},"dur":{duration / 1e3:.3f}}}'
+                      for start, duration, stage, ident in self.spans())
+        f.write('{"displayTimeUnit":"ns","otherData":{"overwritten_spans":%d},"traceEvents":[\n' % self.overwritten)
+        f.write(",\n".join(events))
+        f.write("\n]}\n")
+
+    def folded(self):
+        """Collapsed stacks: {"thread;stage[;stage]": self time in ns}"""
+        by_thread = {}
+        for start, duration, stage, ident in self.spans():
+            by_thread.setdefault(ident, []).append((start, duration, stage))
+        stacks = {}
+        for ident, spans in by_thread.items():
+            root = self.thread_names.get(ident, str(ident)).replace(";", "_").replace(" ", "_")
+            # Spans come sorted by start; a span inside the one on top of the stack is its child
+            spans.sort(key=lambda span: (span[0], -span[1]))
+            open_spans = []  # [end, path, self time]
+            for start, duration, stage in spans:
+                end = start + duration
+                while open_spans and open_spans[-1][0] < end:
+                    _, path, own = open_spans.pop()
+                    stacks[path] = stacks.get(path, 0) + own
+                if open_spans:
+                    open_spans[-1][2] -= duration
+                    path = f"{open_spans[-1][1]};{STAGES[stage]}"
+                else:
+                    path = f"{root};{STAGES[stage]}"
+                open_spans.append([end, path, duration])
+            for _, path, own in open_spans:
+                stacks[path] = stacks.get(path, 0) + own
+        return stacks
+
+    def save(self, path):
+        """Write the kept spans to path: collapsed stacks for *.folded, else a Chrome trace. Returns the span count"""
+        if path.lower().endswith(".folded"):
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, nanoseconds in sorted(self.folded().items()):
+                    if nanoseconds >= 1000:
+                        f.write(f"{stack} {nanoseconds // 1000}\n")
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                self.write_chrome(f)
+        return min(self.recorded, self.capacity)
+
+    def summary_lines(self):
+        """Human readable per-stage timings, one line per stage"""
+        return [f"{name}: {stats['count']} spans, {stats['total_ms']} ms total, mean/p50/p99/max "
+                f"{stats['mean_us']}/{stats['p50_us']}/{stats['p99_us']}/{stats['max_us']} us"
+                for name, stats in self.summary().items()]
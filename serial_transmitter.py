@@ -1,703 +1,390 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-import serial
-import time
-import threading
-import logging
-from datetime import datetime
-import serial.tools.list_ports
+"""Serial Port Tester entry point.
+
+Without arguments this starts the Tk GUI. With arguments it runs the
+headless engine instead, without importing tkinter:
+
+    python -m serial_transmitter --port COM4 --mode transmit --weight 1234
+    python -m serial_transmitter --port COM4 --mode transmit --rate 50 --waveform "ramp(0,5000,100) + noise(5000,10,500)"
+    python -m serial_transmitter --port /dev/ttyUSB0 --mode receive --duration 60
+    python -m serial_transmitter --port /dev/ttyUSB0 --mode receive --framing weight
+    python -m serial_transmitter --port COM4 --mode transmit --replay traffic.spcap --replay-speed 10
+    python -m serial_transmitter --port loop:// --mode command --command IP
+    python -m serial_transmitter --port COM4 --mode command --command IP,P --count 1000 --window 4
+    python -m serial_transmitter --port COM4 --mode command --sequence sequences/poll_weight.seq
+    python -m serial_transmitter --port /dev/ttyUSB0 --port /dev/ttyUSB1 --mode receive
+    python -m serial_transmitter --port /dev/ttyUSB0 --mode receive --transport asyncio
+    python -m serial_transmitter --port COM4 --mode transmit --rate 0 --duration 5 --trace transmit.json
+    python -m serial_transmitter --port COM4 --mode transmit --rate 0 --baud 921600 --batch 128 --flush-every 0
+    python -m serial_transmitter --port /dev/ttyUSB0 --mode receive --reconnect --reconnect-max-delay 10
+    python -m serial_transmitter --port /dev/ttyUSB0 --mode loopback --sweep --loopback-seconds 2
+"""
 import os
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('serial_transmission.log'),
-        logging.StreamHandler()
-    ]
-)
-
-class SerialTransmitterApp:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Serial Port Tester")
-        self.root.geometry("500x650")
-        self.root.resizable(True, True)
-        
-        # Serial connection variables
-        self.ser = None
-        self.running = False
-        self.thread = None
-        self.receive_thread = None
-
-        # Default settings
-        self.settings = {
-            "com_port": "COM4",
-            "baud_rate": 9600,
-            "parity": "None",
-            "data_bits": 8,
-            "stop_bits": "One",
-            "base_weight": 5555,
-            "mode": "transmit",  # "transmit", "receive", or "command"
-            "selected_command": "IP",  # default command
-            "custom_command": "",  # custom command input
-            "delay_time": 1000  # default delay in milliseconds
-        }
-
-        # Define available commands
-        self.command_list = [
-            "IP", "P", "CP", "SP", "xS", "xP", "Z", "T", "xT", "PU", "xU", "xM", "PV", "Esc R"
-        ]
-
-        # Build UI
-        self.setup_ui()
-
-    def setup_ui(self):
-        # Main frames
-        top_frame = tk.Frame(self.root)
-        top_frame.pack(fill=tk.X, padx=10, pady=10)
-
-        middle_frame = tk.Frame(self.root)
-        middle_frame.pack(fill=tk.X, padx=10, pady=5)
-
-        bottom_frame = tk.Frame(self.root)
-        bottom_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-        # Settings section
-        settings_frame = tk.LabelFrame(top_frame, text="Serial Configuration", padx=10, pady=10)
-        settings_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
-
-        # COM Port
-        tk.Label(settings_frame, text="COM Port:").grid(row=0, column=0, sticky="w", pady=2)
-        self.com_var = tk.StringVar(value=self.settings["com_port"])
-        self.com_combo = ttk.Combobox(settings_frame, textvariable=self.com_var, width=12)
-        self.com_combo.grid(row=0, column=1, sticky="ew", padx=5, pady=2)
-        self.com_combo['values'] = self.get_com_ports()
-
-        # Refresh button
-        refresh_btn = tk.Button(settings_frame, text="Refresh", command=self.refresh_com_ports, width=10)
-        refresh_btn.grid(row=0, column=2, padx=(5, 0), pady=2)
-
-        # Baud Rate
-        tk.Label(settings_frame, text="Baud Rate:").grid(row=1, column=0, sticky="w", pady=2)
-        baud_values = [300, 600, 1200, 2400, 4800, 9600, 14400, 19200, 38400, 57600, 115200]
-        self.baud_var = tk.StringVar(value=str(self.settings["baud_rate"]))
-        self.baud_combo = ttk.Combobox(settings_frame, textvariable=self.baud_var, values=baud_values, width=12)
-        self.baud_combo.grid(row=1, column=1, sticky="ew", padx=5, pady=2)
-
-        # Parity
-        tk.Label(settings_frame, text="Parity:").grid(row=2, column=0, sticky="w", pady=2)
-        parity_values = ["None", "Even", "Odd"]
-        self.parity_var = tk.StringVar(value=self.settings["parity"])
-        self.parity_combo = ttk.Combobox(settings_frame, textvariable=self.parity_var, values=parity_values, width=12)
-        self.parity_combo.grid(row=2, column=1, sticky="ew", padx=5, pady=2)
-
-        # Data Bits
-        tk.Label(settings_frame, text="Data Bits:").grid(row=3, column=0, sticky="w", pady=2)
-        data_bits_values = [5, 6, 7, 8]
-        self.data_bits_var = tk.StringVar(value=str(self.settings["data_bits"]))
-        self.data_bits_combo = ttk.Combobox(settings_frame, textvariable=self.data_bits_var, values=data_bits_values, width=12)
-        self.data_bits_combo.grid(row=3, column=1, sticky="ew", padx=5, pady=2)
-
-        # Stop Bits
-        tk.Label(settings_frame, text="Stop Bits:").grid(row=4, column=0, sticky="w", pady=2)
-        stop_bits_values = ["One", "Two"]
-        self.stop_bits_var = tk.StringVar(value=self.settings["stop_bits"])
-        self.stop_bits_combo = ttk.Combobox(settings_frame, textvariable=self.stop_bits_var, values=stop_bits_values, width=12)
-        self.stop_bits_combo.grid(row=4, column=1, sticky="ew", padx=5, pady=2)
-
-        # Mode selection
-        tk.Label(settings_frame, text="Mode:").grid(row=5, column=0, sticky="w", pady=2)
-        mode_values = ["transmit", "receive", "command"]
-        self.mode_var = tk.StringVar(value=self.settings["mode"])
-        self.mode_combo = ttk.Combobox(settings_frame, textvariable=self.mode_var, values=mode_values, width=12)
-        self.mode_combo.grid(row=5, column=1, sticky="ew", padx=5, pady=2)
-
-        # Base Weight (only shown when in transmit mode)
-        self.base_weight_label = tk.Label(settings_frame, text="Base Weight:")
-        self.base_weight_label.grid(row=6, column=0, sticky="w", pady=2)
-        self.base_weight_var = tk.StringVar(value=str(self.settings["base_weight"]))
-        self.base_weight_entry = tk.Entry(settings_frame, textvariable=self.base_weight_var, width=12)
-        self.base_weight_entry.grid(row=6, column=1, sticky="ew", padx=5, pady=2)
-        self.base_weight_label.grid_remove()
-        self.base_weight_entry.grid_remove()
-
-        # Command Selector (only shown when in command mode)
-        self.command_label = tk.Label(settings_frame, text="Command:")
-        self.command_label.grid(row=7, column=0, sticky="w", pady=2)
-        self.command_var = tk.StringVar(value=self.settings["selected_command"])
-        self.command_combo = ttk.Combobox(settings_frame, textvariable=self.command_var, values=self.command_list, width=12)
-        self.command_combo.grid(row=7, column=1, sticky="ew", padx=5, pady=2)
-        self.command_label.grid_remove()
-        self.command_combo.grid_remove()
-
-        # Custom Command (only shown when in command mode)
-        self.custom_command_label = tk.Label(settings_frame, text="Custom Command:")
-        self.custom_command_label.grid(row=8, column=0, sticky="w", pady=2)
-        self.custom_command_var = tk.StringVar(value=self.settings["custom_command"])
-        self.custom_command_entry = tk.Entry(settings_frame, textvariable=self.custom_command_var, width=12)
-        self.custom_command_entry.grid(row=8, column=1, sticky="ew", padx=5, pady=2)
-        self.custom_command_label.grid_remove()
-        self.custom_command_entry.grid_remove()
-
-        # Custom Command Dropdown (only shown when in command mode)
-        self.custom_dropdown_label = tk.Label(settings_frame, text="Custom Command:")
-        self.custom_dropdown_label.grid(row=9, column=0, sticky="w", pady=2)
-        self.custom_dropdown_var = tk.StringVar(value="")
-        self.custom_dropdown = ttk.Combobox(settings_frame, textvariable=self.custom_dropdown_var, width=12)
-        self.custom_dropdown.grid(row=9, column=1, sticky="ew", padx=5, pady=2)
-        self.custom_dropdown_label.grid_remove()
-        self.custom_dropdown.grid_remove()
-
-        # Delay Time (only shown when in command mode)
-        self.delay_label = tk.Label(settings_frame, text="Delay (ms):")
-        self.delay_label.grid(row=10, column=0, sticky="w", pady=2)
-        self.delay_var = tk.StringVar(value=str(self.settings["delay_time"]))
-        self.delay_combo = ttk.Combobox(settings_frame, textvariable=self.delay_var, values=[100, 200, 500, 1000, 2000, 3000, 5000], width=12)
-        self.delay_combo.grid(row=10, column=1, sticky="ew", padx=5, pady=2)
-        self.delay_label.grid_remove()
-        self.delay_combo.grid_remove()
-
-        # Keep Port Open checkbox (only shown when in command mode)
-        self.keep_open_var = tk.BooleanVar(value=False)
-        self.keep_open_check = tk.Checkbutton(settings_frame, text="Keep Port Open", variable=self.keep_open_var)
-        self.keep_open_check.grid(row=11, column=0, columnspan=2, sticky="w", pady=2)
-        self.keep_open_check.grid_remove()
-
-        # Configure grid weights
-        settings_frame.columnconfigure(1, weight=1)
-
-        # Control buttons frame - now on the right
-        control_frame = tk.Frame(top_frame)
-        control_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 0), pady=5)
-
-        # Use grid inside control_frame to control layout
-        self.start_button = tk.Button(
-            control_frame,
-            text="Start",
-            command=self.start_transmit,
-            bg="#4CAF50",
-            fg="white",
-            font=("Arial", 12, "bold"),
-            width=14,
-            height=2
-        )
-        self.start_button.grid(row=0, column=0, sticky="ew", padx=5, pady=5)
-
-        self.stop_button = tk.Button(
-            control_frame,
-            text="Stop",
-            command=self.stop_transmit,
-            bg="#f44336",
-            fg="white",
-            font=("Arial", 12, "bold"),
-            width=14,
-            height=2
-        )
-        self.stop_button.grid(row=1, column=0, sticky="ew", padx=5, pady=5)
-
-        # Connect button (renamed from Retry)
-        self.connect_button = tk.Button(
-            control_frame,
-            text="Connect",
-            command=self.retry_connect,
-            bg="#2196F3",
-            fg="white",
-            font=("Arial", 12, "bold"),
-            width=14,
-            height=2
-        )
-        self.connect_button.grid(row=2, column=0, sticky="ew", padx=5, pady=5)
-
-        # Disconnect button
-        self.disconnect_button = tk.Button(
-            control_frame,
-            text="Disconnect",
-            command=self.disconnect_port,
-            bg="#9E9E9E",
-            fg="white",
-            font=("Arial", 12, "bold"),
-            width=14,
-            height=2
-        )
-        self.disconnect_button.grid(row=3, column=0, sticky="ew", padx=5, pady=5)
-
-        # Make column expandable
-        control_frame.columnconfigure(0, weight=1)
-
-        # Ensure control_frame matches the height of settings_frame
-        settings_frame.update_idletasks()
-        min_height = settings_frame.winfo_reqheight()
-        control_frame.config(height=min_height)
-        control_frame.pack_propagate(False)  # Prevent shrinking
-
-        # Status label
-        self.status_label = tk.Label(middle_frame, text="Status: Not Connected", fg="blue", font=("Arial", 10))
-        self.status_label.pack(pady=5)
-
-        # Note label (initially hidden)
-        self.note_label = tk.Label(middle_frame, text="", fg="gray", font=("Arial", 9), wraplength=380)
-        self.note_label.pack(pady=2)
-
-        # Update note based on initial mode
-        self.update_note()
-
-        # Log display
-        log_frame = tk.LabelFrame(bottom_frame, text="Communication Log", padx=10, pady=10)
-        log_frame.pack(fill=tk.BOTH, expand=True)
-
-        # Add Clear Log button
-        clear_log_btn = tk.Button(
-            log_frame,
-            text="Clear Log",
-            command=self.clear_log,
-            bg="#2196F3",
-            fg="white",
-            font=("Arial", 10, "bold"),
-            width=10
-        )
-        clear_log_btn.pack(anchor="ne", padx=5, pady=5)
-
-        self.log_text = tk.Text(log_frame, wrap=tk.WORD, font=("Consolas", 9), bg="#f0f0f0", height=12)
-        scrollbar = tk.Scrollbar(log_frame, orient=tk.VERTICAL, command=self.log_text.yview)
-        self.log_text.configure(yscrollcommand=scrollbar.set)
-
-        self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-        # Bind events
-        self.com_var.trace_add("write", lambda *args: self.update_settings())
-        self.baud_var.trace_add("write", lambda *args: self.update_settings())
-        self.parity_var.trace_add("write", lambda *args: self.update_settings())
-        self.data_bits_var.trace_add("write", lambda *args: self.update_settings())
-        self.stop_bits_var.trace_add("write", lambda *args: self.update_settings())
-        self.base_weight_var.trace_add("write", lambda *args: self.update_settings())
-        self.command_var.trace_add("write", lambda *args: self.update_settings())
-        self.custom_command_var.trace_add("write", lambda *args: self.update_settings())
-        self.delay_var.trace_add("write", lambda *args: self.update_settings())
-        self.mode_var.trace_add("write", lambda *args: self.on_mode_change())
-
-        # Bind custom dropdown selection
-        self.custom_dropdown_var.trace_add("write", lambda *args: self.on_custom_dropdown_select())
-
-        # Initial update
-        self.update_settings()
-        self.toggle_mode()
-
-    def clear_log(self):
-        """Clear the communication log"""
-        self.log_text.config(state="normal")
-        self.log_text.delete(1.0, tk.END)
-        self.log_text.config(state="disabled")
-
-    def get_com_ports(self):
-        """Get list of available COM ports"""
-        try:
-            ports = [port.device for port in serial.tools.list_ports.comports()]
-            return sorted(ports) if ports else ["No COM Ports Found"]
-        except Exception:
-            return ["COM4"]
-
-    def refresh_com_ports(self):
-        """Refresh COM port dropdown"""
-        ports = self.get_com_ports()
-        self.com_combo['values'] = ports
-        if ports and ports != ["No COM Ports Found"]:
-            self.com_var.set(ports[0])
-
-    def update_settings(self):
-        """Update internal settings from UI with validation"""
-        try:
-            self.settings["com_port"] = self.com_var.get()
-            self.settings["baud_rate"] = int(self.baud_var.get())
-            self.settings["parity"] = self.parity_var.get()
-            self.settings["data_bits"] = int(self.data_bits_var.get())
-            self.settings["stop_bits"] = self.stop_bits_var.get()
-            self.settings["mode"] = self.mode_var.get()
-            
-            if self.settings["mode"] == "transmit":
-                base_weight = int(self.base_weight_var.get())
-                if base_weight < 0:
-                    raise ValueError("Base weight cannot be negative")
-                self.settings["base_weight"] = base_weight
-            elif self.settings["mode"] == "command":
-                self.settings["selected_command"] = self.command_var.get()
-                self.settings["custom_command"] = self.custom_command_var.get()
-                self.settings["delay_time"] = int(self.delay_var.get())
-
-        except ValueError as e:
-            if "invalid literal" in str(e):
-                messagebox.showerror("Invalid Input", "Please enter valid numbers for all numeric fields.")
-            else:
-                messagebox.showerror("Invalid Input", str(e))
-            return
-
-    def on_mode_change(self):
-        """Handle mode change event"""
-        self.update_settings()
-        self.toggle_mode()
-        self.update_note()
-
-    def update_note(self):
-        """Update the note based on current mode"""
-        if self.settings["mode"] == "transmit":
-            note_text = "Note: Connect to Big Display to transmit a sample Base Weight"
-        elif self.settings["mode"] == "receive":
-            note_text = "Note: Connect to Indicator with COM Assignment either Demand or Continuous Output"
-        elif self.settings["mode"] == "command":
-            note_text = "Note: Connect to Indicator with COM Assignment as Demand to send an ascii command to indicator"
+import re
+import sys
+import json
+import time
+import argparse
+
+from serial_engine import SerialEngine, COMMAND_LIST, MODES, READ_MODES, DEFAULT_SETTINGS, PARITY_MAP, STOP_BITS_MAP
+from serial_logging import configure_logging, set_log_tracer, LOG_FILE, MAX_BYTES, BACKUP_COUNT
+from serial_sessions import SessionManager
+from serial_commands import CommandClient, run_commands, DEFAULT_TIMEOUT
+from serial_replay import DIRECTIONS
+from serial_loopback import PATTERNS
+from serial_metrics import MetricsExporter, EXPORT_INTERVAL
+from serial_trace import Tracer
+
+
+def build_parser():
+    """Build the command line parser"""
+    parser = argparse.ArgumentParser(
+        prog="serial_transmitter",
+        description="Headless serial port tester (run without arguments for the GUI)"
+    )
+    parser.add_argument("--port", required=True, action="append",
+                        help="COM port, device path or pyserial URL (e.g. loop://); repeat for several ports")
+    parser.add_argument("--mode", choices=MODES, default=DEFAULT_SETTINGS["mode"])
+    parser.add_argument("--baud", type=int, default=DEFAULT_SETTINGS["baud_rate"])
+    parser.add_argument("--parity", choices=list(PARITY_MAP), default=DEFAULT_SETTINGS["parity"])
+    parser.add_argument("--data-bits", type=int, choices=[5, 6, 7, 8], default=DEFAULT_SETTINGS["data_bits"])
+    parser.add_argument("--stop-bits", choices=list(STOP_BITS_MAP), default=DEFAULT_SETTINGS["stop_bits"])
+    parser.add_argument("--weight", type=int, default=DEFAULT_SETTINGS["base_weight"],
+                        help="base weight sent in transmit mode")
+    parser.add_argument("--rate", type=float, default=DEFAULT_SETTINGS["transmit_rate"],
+                        help="transmit mode: frames per second, 0 = as fast as the line allows")
+    parser.add_argument("--waveform", default="", metavar="SPEC",
+                        help="transmit mode: weight waveform instead of a constant weight, "
+                             "e.g. 'ramp(0,5000,100) + noise(5000,10,500)' (see serial_waveform.py)")
+    parser.add_argument("--replay", default="", metavar="FILE",
+                        help="transmit mode: send the frames of a capture or log file with their recorded timing")
+    parser.add_argument("--replay-speed", type=float, default=DEFAULT_SETTINGS["replay_speed"],
+                        help="replay N times faster than recorded, 0 = as fast as the line allows")
+    parser.add_argument("--replay-direction", choices=list(DIRECTIONS), default=DEFAULT_SETTINGS["replay_direction"],
+                        help="recorded frames to replay")
+    parser.add_argument("--batch", type=int, default=DEFAULT_SETTINGS["tx_batch"], metavar="N",
+                        help="transmit mode: write N frames with one write (see serial_batch.py)")
+    parser.add_argument("--flush-every", type=int, default=DEFAULT_SETTINGS["tx_flush_every"], metavar="N",
+                        help="flush (wait for the OS to send) after every N writes, 0 = only when the run ends")
+    parser.add_argument("--reconnect", action="store_true",
+                        help="transmit/receive: reopen a dropped port with exponential backoff, also under a new "
+                             "name if it is the same USB adapter (see serial_reconnect.py)")
+    parser.add_argument("--reconnect-max-delay", type=float, default=DEFAULT_SETTINGS["reconnect_max_delay"],
+                        metavar="SECONDS", help="longest wait between reconnect attempts")
+    parser.add_argument("--resend-queue", type=int, default=DEFAULT_SETTINGS["resend_queue"], metavar="N",
+                        help="transmit frames held while the port is down and sent once it is back, 0 = none")
+    parser.add_argument("--block", type=int, default=DEFAULT_SETTINGS["loopback_block"], metavar="BYTES",
+                        help="loopback mode: payload bytes per test block (see serial_loopback.py)")
+    parser.add_argument("--pattern", choices=PATTERNS, default=DEFAULT_SETTINGS["loopback_pattern"],
+                        help="loopback mode: pseudo-random or counting payload")
+    parser.add_argument("--loopback-seconds", type=float, default=DEFAULT_SETTINGS["loopback_seconds"],
+                        metavar="SECONDS", help="loopback mode: test time per baud rate")
+    parser.add_argument("--sweep", action="store_true",
+                        help="loopback mode: test every baud rate offered in the GUI instead of --baud")
+    parser.add_argument("--command", default=DEFAULT_SETTINGS["selected_command"],
+                        help=f"command sent in command mode ({', '.join(COMMAND_LIST)} or any custom string)")
+    parser.add_argument("--delay", type=int, default=DEFAULT_SETTINGS["delay_time"],
+                        help="command mode: ms to wait before closing the port")
+    parser.add_argument("--sequence", default="", metavar="FILE",
+                        help="command mode: run a command sequence file (see serial_sequence.py)")
+    parser.add_argument("--count", type=int, default=0,
+                        help="command mode: send this many commands (cycling through a comma-separated "
+                             "--command list) and print round-trip latency stats as JSON")
+    parser.add_argument("--window", type=int, default=1,
+                        help="command mode with --count: commands in flight at once (1 = wait for each reply)")
+    parser.add_argument("--response-timeout", type=int, default=int(DEFAULT_TIMEOUT * 1000),
+                        help="command mode with --count: ms to wait for a reply before counting a timeout")
+    parser.add_argument("--read-mode", choices=READ_MODES, default=DEFAULT_SETTINGS["read_mode"],
+                        help="receive mode: block until data arrives (event) or poll every 100 ms (poll)")
+    parser.add_argument("--framing", default=DEFAULT_SETTINGS["rx_framing"],
+                        help="receive mode: how bytes are split into frames: line, cr, delimiter:TEXT, fixed:N, "
+                             "stx or weight ('=' frames without a newline, decoded to numbers)")
+    parser.add_argument("--inter-byte-timeout", type=int, default=DEFAULT_SETTINGS["inter_byte_timeout"],
+                        help="receive mode: ms of silence that ends a line without a newline")
+    parser.add_argument("--capture", default="", metavar="FILE",
+                        help="record raw traffic with timestamps to a capture file (see serial_capture.py)")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="transmit/receive: seconds to run (default: until Ctrl+C)")
+    parser.add_argument("--transport", choices=["threads", "asyncio"], default="threads",
+                        help="drive the ports with worker threads or with one asyncio event loop")
+    parser.add_argument("--metrics", default="", metavar="FILE",
+                        help="append counters and rates of every port to FILE while running "
+                             "(CSV if it ends in .csv, else JSON lines)")
+    parser.add_argument("--metrics-interval", type=float, default=EXPORT_INTERVAL,
+                        help="seconds between --metrics samples")
+    parser.add_argument("--trace", default="", metavar="FILE",
+                        help="time each transmit/receive/log stage and save the spans at exit: a Chrome trace, "
+                             "or collapsed stacks for flame graphs if FILE ends in .folded (see serial_trace.py)")
+    parser.add_argument("--log-file", default=LOG_FILE)
+    parser.add_argument("--log-max-bytes", type=int, default=MAX_BYTES,
+                        help="rotate the log file at this size, 0 = never")
+    parser.add_argument("--log-backups", type=int, default=BACKUP_COUNT,
+                        help="number of rotated log files to keep")
+    parser.add_argument("--log-rotate-when", default=None,
+                        help="rotate by time instead of size, e.g. 'midnight' or 'H'")
+    return parser
+
+
+def run_cli(argv):
+    """Run the headless engine from command line arguments, returns an exit code"""
+    args = build_parser().parse_args(argv)
+    if args.weight < 0:
+        print("Base weight cannot be negative", file=sys.stderr)
+        return 2
+    if args.rate < 0:
+        print("Transmit rate cannot be negative", file=sys.stderr)
+        return 2
+    if args.metrics_interval <= 0:
+        print("Metrics interval must be positive", file=sys.stderr)
+        return 2
+    if args.batch < 1:
+        print("Batch size must be at least 1", file=sys.stderr)
+        return 2
+    if args.flush_every < 0:
+        print("Flush interval cannot be negative", file=sys.stderr)
+        return 2
+    if args.reconnect_max_delay <= 0:
+        print("Reconnect delay must be positive", file=sys.stderr)
+        return 2
+    if args.resend_queue < 0:
+        print("Resend queue cannot be negative", file=sys.stderr)
+        return 2
+    if args.reconnect and args.transport == "asyncio":
+        print("--reconnect runs with the threads transport", file=sys.stderr)
+        return 2
+    if args.replay_speed < 0:
+        print("Replay speed cannot be negative", file=sys.stderr)
+        return 2
+    if args.replay and (len(args.port) > 1 or args.transport == "asyncio"):
+        print("--replay runs on one port with the threads transport", file=sys.stderr)
+        return 2
+    if args.block < 1:
+        print("Loopback block size must be at least 1 byte", file=sys.stderr)
+        return 2
+    if args.loopback_seconds <= 0:
+        print("Loopback test time must be positive", file=sys.stderr)
+        return 2
+    if args.mode == "loopback" and args.transport == "asyncio":
+        print("--mode loopback runs with the threads transport", file=sys.stderr)
+        return 2
+    if args.sequence and args.transport == "asyncio":
+        print("--sequence runs with the threads transport", file=sys.stderr)
+        return 2
+
+    configure_logging(args.log_file, args.log_max_bytes, args.log_backups, args.log_rotate_when)
+
+    settings = {
+        "com_port": args.port[0],
+        "baud_rate": args.baud,
+        "parity": args.parity,
+        "data_bits": args.data_bits,
+        "stop_bits": args.stop_bits,
+        "base_weight": args.weight,
+        "transmit_rate": args.rate,
+        "mode": args.mode,
+        "custom_command": "" if args.command in COMMAND_LIST else args.command,
+        "selected_command": args.command if args.command in COMMAND_LIST else DEFAULT_SETTINGS["selected_command"],
+        "delay_time": args.delay,
+        "read_mode": args.read_mode,
+        "inter_byte_timeout": args.inter_byte_timeout,
+        "rx_framing": args.framing,
+        "capture_file": args.capture,
+        "sequence_file": args.sequence,
+        "waveform": args.waveform,
+        "replay_file": args.replay,
+        "replay_speed": args.replay_speed,
+        "replay_direction": args.replay_direction,
+        "tx_batch": args.batch,
+        "tx_flush_every": args.flush_every,
+        "auto_reconnect": args.reconnect,
+        "reconnect_max_delay": args.reconnect_max_delay,
+        "resend_queue": args.resend_queue,
+        "loopback_block": args.block,
+        "loopback_pattern": args.pattern,
+        "loopback_seconds": args.loopback_seconds,
+        "loopback_sweep": args.sweep
+    }
+    on_error = lambda title, message: print(f"{title}: {message}", file=sys.stderr)
+    if args.mode == "command" and args.count > 0:
+        return run_command_benchmark(args, settings, on_error)
+    if args.transport == "asyncio":
+        return run_asyncio(args, settings, on_error)
+    if len(args.port) > 1:
+        return run_sessions(args, settings, on_error)
+
+    engine = SerialEngine(settings, on_error=on_error)
+    tracer = start_trace(args, [engine])
+    if not engine.start():
+        return 1
+    exporter = start_metrics(args, {settings["com_port"]: engine.throughput})
+    try:
+        engine.join(args.duration)
+    except KeyboardInterrupt:
+        pass
+    if engine.running or engine.is_open():
+        engine.stop()
+    if exporter:
+        exporter.stop()
+    if engine.sequence_runner:
+        print(json.dumps(engine.sequence_runner.stats(), indent=2))
+    if engine.replay_player:
+        print(json.dumps(engine.replay_player.stats(), indent=2))
+    save_trace(args, tracer)
+    if args.mode == "loopback":
+        results = engine.loopback_results
+        print(json.dumps(results, indent=2))
+        return 0 if results and all(stats["passed"] for stats in results) else 1
+    return 0
+
+
+def start_metrics(args, sources):
+    """Start the --metrics exporter for the given sessions, or return None"""
+    if not args.metrics:
+        return None
+    try:
+        return MetricsExporter(args.metrics, sources, args.metrics_interval).start()
+    except OSError as e:
+        print(f"Cannot write metrics to {args.metrics}: {e}", file=sys.stderr)
+        return None
+
+
+def start_trace(args, engines):
+    """Attach a Tracer to the engines and the log writer if --trace was given, else return None"""
+    if not args.trace:
+        return None
+    tracer = Tracer()
+    for engine in engines:
+        engine.tracer = tracer
+    set_log_tracer(tracer)
+    return tracer
+
+
+def save_trace(args, tracer):
+    """Write the --trace file and print the per-stage timings as JSON"""
+    if tracer is None:
+        return
+    set_log_tracer(None)
+    try:
+        count = tracer.save(args.trace)
+    except OSError as e:
+        print(f"Cannot write trace to {args.trace}: {e}", file=sys.stderr)
+        return
+    print(json.dumps({"trace": args.trace, "spans": count, "overwritten": tracer.overwritten,
+                      "stages": tracer.summary()}, indent=2))
+
+
+def run_command_benchmark(args, settings, on_error):
+    """Send --count commands with up to --window in flight and print the round-trip stats as JSON"""
+    commands = [command.strip() for command in args.command.split(",") if command.strip()]
+    engine = SerialEngine(settings, on_error=on_error)
+    if not engine.prepare():
+        return 1
+    client = CommandClient(engine.ser, timeout=args.response_timeout / 1000.0, window=args.window,
+                           on_log=engine.log_message, capture=engine.capture,
+                           port=settings["com_port"]).start()
+    try:
+        stats = run_commands(client, commands, args.count)
+    except KeyboardInterrupt:
+        stats = client.stats()
+    finally:
+        client.close()
+        engine.close_serial_port()
+        engine.close_capture()
+        engine.set_running(False)
+    rtt = stats["rtt"]
+    engine.log_message(f"{stats['answered']} of {stats['sent']} commands answered at {stats['commands_per_s']}/s, "
+                       f"round trip p50/p99/max {rtt['p50_ms']}/{rtt['p99_ms']}/{rtt['max_ms']} ms, "
+                       f"{stats['timeouts']} timeouts")
+    print(json.dumps(stats, indent=2))
+    return 0 if stats["answered"] else 1
+
+
+def port_settings(args, settings):
+    """(name, settings) for every --port; names are unique and each port gets its own capture file"""
+    sessions = {}
+    for number, port in enumerate(args.port, 1):
+        name = port if port not in sessions else f"{port}#{number}"
+        sessions[name] = dict(settings, com_port=port)
+        if args.capture and len(args.port) > 1:
+            root, ext = os.path.splitext(args.capture)
+            sessions[name]["capture_file"] = f"{root}-{re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_')}{ext}"
+    return sessions
+
+
+def run_sessions(args, settings, on_error):
+    """Run one session per --port on the shared I/O thread, then print per-port throughput as JSON"""
+    manager = SessionManager(on_error=on_error)
+    for name, session_settings in port_settings(args, settings).items():
+        manager.add_session(session_settings, name)
+
+    tracer = start_trace(args, manager.sessions.values())
+    started = manager.start_all()
+    if not any(started.values()):
+        manager.close()
+        return 1
+    exporter = start_metrics(args, {name: engine.throughput for name, engine in manager.sessions.items()})
+    try:
+        if args.mode == "command":
+            for engine in manager.sessions.values():
+                engine.join()
         else:
-            note_text = ""
-        
-        self.note_label.config(text=note_text)
-
-    def toggle_mode(self):
-        """Toggle visibility of base weight field and command selector based on mode"""
-        # Remove all optional widgets first
-        self.base_weight_label.grid_forget()
-        self.base_weight_entry.grid_forget()
-        self.command_label.grid_forget()
-        self.command_combo.grid_forget()
-        self.custom_command_label.grid_forget()
-        self.custom_command_entry.grid_forget()
-        self.custom_dropdown_label.grid_forget()
-        self.custom_dropdown.grid_forget()
-        self.delay_label.grid_forget()
-        self.delay_combo.grid_forget()
-        self.keep_open_check.grid_forget()
-
-        if self.settings["mode"] == "transmit":
-            self.base_weight_label.grid(row=6, column=0, sticky="w", pady=2)
-            self.base_weight_entry.grid(row=6, column=1, sticky="ew", padx=5, pady=2)
-        elif self.settings["mode"] == "command":
-            self.command_label.grid(row=7, column=0, sticky="w", pady=2)
-            self.command_combo.grid(row=7, column=1, sticky="ew", padx=5, pady=2)
-            self.custom_command_label.grid(row=8, column=0, sticky="w", pady=2)
-            self.custom_command_entry.grid(row=8, column=1, sticky="ew", padx=5, pady=2)
-            # Add custom dropdown
-            self.custom_dropdown_label.grid(row=9, column=0, sticky="w", pady=2)
-            self.custom_dropdown.grid(row=9, column=1, sticky="ew", padx=5, pady=2)
-            # Populate dropdown with custom commands
-            self.populate_custom_dropdown()
-            self.delay_label.grid(row=10, column=0, sticky="w", pady=2)
-            self.delay_combo.grid(row=10, column=1, sticky="ew", padx=5, pady=2)
-            self.keep_open_check.grid(row=11, column=0, columnspan=2, sticky="w", pady=2)
-
-        # Refresh layout
-        self.root.update_idletasks()
-
-    def populate_custom_dropdown(self):
-        """Populate custom dropdown with recent commands"""
-        # This could be enhanced to load from a file or history
-        recent_commands = ["CUSTOM1", "CUSTOM2", "CUSTOM3"]  # Example values
-        self.custom_dropdown['values'] = recent_commands + [""]  # Empty string for new entry
-
-    def on_custom_dropdown_select(self):
-        """Handle custom dropdown selection"""
-        selected = self.custom_dropdown_var.get()
-        if selected and selected != "":
-            self.custom_command_var.set(selected)
-            self.custom_dropdown_var.set("")  # Reset dropdown after selection
-
-    def update_buttons(self):
-        """Enable/disable start/stop buttons"""
-        self.start_button.config(state="normal" if not self.running else "disabled")
-        self.stop_button.config(state="normal" if self.running else "disabled")
-
-    def update_status(self, status_text, color="blue"):
-        """Update status label"""
-        self.status_label.config(text=f"Status: {status_text}", fg=color)
-
-    def log_message(self, message, level="INFO"):
-        """Log and display message in GUI"""
-        timestamp = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
-        full_msg = f"[{timestamp}] {level}: {message}"
-
-        def _update_gui():
-            self.log_text.config(state="normal")
-            self.log_text.insert(tk.END, full_msg + "\n")
-            self.log_text.see(tk.END)
-            self.log_text.config(state="disabled")
-            if level == "ERROR":
-                logging.error(message)
-            elif level == "WARNING":
-                logging.warning(message)
-            else:
-                logging.info(message)
-
-        self.root.after(0, _update_gui)
-
-    def is_port_available(self, port_name):
-        """Check if a port is available"""
-        try:
-            ser = serial.Serial(port_name, timeout=1)
-            ser.close()
-            return True
-        except:
-            return False
-
-    def open_serial_port(self):
-        """Open serial port with current settings - with better error handling"""
-        try:
-            parity_map = {"None": serial.PARITY_NONE, "Even": serial.PARITY_EVEN, "Odd": serial.PARITY_ODD}
-            stop_bits_map = {"One": serial.STOPBITS_ONE, "Two": serial.STOPBITS_TWO}
-
-            self.ser = serial.Serial(
-                port=self.settings["com_port"],
-                baudrate=self.settings["baud_rate"],
-                parity=parity_map.get(self.settings["parity"], serial.PARITY_NONE),
-                bytesize=self.settings["data_bits"],
-                stopbits=stop_bits_map.get(self.settings["stop_bits"], serial.STOPBITS_ONE),
-                timeout=1,
-                write_timeout=1  # Added write timeout
-            )
-            
-            # Test if we can actually write to the port
-            try:
-                self.ser.write(b"")  # Test write
-                self.ser.flush()
-            except Exception as e:
-                raise Exception(f"Port test failed: {e}")
-                
-            self.log_message(f"SUCCESS: Opened {self.settings['com_port']} at {self.settings['baud_rate']} baud")
-            self.update_status("Connected", "green")
-            return True
-            
-        except PermissionError:
-            error_msg = f"Port '{self.settings['com_port']}' is in use by another program. Please close any other applications using this port."
-            messagebox.showerror("Port Access Denied", error_msg)
-            self.log_message(f"ERROR: Port access denied - {error_msg}", "ERROR")
-            self.update_status("Connection Failed", "red")
-            return False
-            
-        except serial.SerialException as e:
-            error_msg = f"Serial error: {e}"
-            messagebox.showerror("Serial Error", error_msg)
-            self.log_message(f"ERROR: Serial exception - {error_msg}", "ERROR")
-            self.update_status("Connection Failed", "red")
-            return False
-            
-        except Exception as e:
-            error_msg = f"Unexpected error: {e}"
-            messagebox.showerror("Connection Error", error_msg)
-            self.log_message(f"ERROR: Unexpected error - {error_msg}", "ERROR")
-            self.update_status("Connection Failed", "red")
-            return False
-
-    def close_serial_port(self):
-        """Close serial port safely"""
-        if self.ser and self.ser.is_open:
-            try:
-                self.ser.close()
-                self.log_message("Port closed successfully")
-                self.update_status("Not Connected", "blue")
-            except Exception as e:
-                self.log_message(f"Error closing port: {e}", "ERROR")
-
-    def transmit_loop(self):
-        """Continuously send payload in background thread"""
-        while self.running:
-            try:
-                if self.settings["mode"] == "transmit":
-                    base_weight = self.settings["base_weight"]
-                    weight_str = f"{base_weight:06d}"
-                    reversed_digits = weight_str[::-1]
-                    payload_str = f"={reversed_digits}".strip()
-                    # For transmit mode, send as string (not ASCII bytes)
-                    payload_bytes = payload_str.encode('ascii')
-                elif self.settings["mode"] == "command":
-                    # Check if custom command is provided
-                    if self.settings["custom_command"]:
-                        payload_str = self.settings["custom_command"]
-                    else:
-                        payload_str = self.settings["selected_command"]
-                    # Convert each character to its ASCII byte value and add CR/LF
-                    payload_bytes = bytes(ord(c) for c in payload_str.upper()) + b'\r\n'
-                else:
-                    # Should not happen, but just in case
-                    payload_bytes = b""
-
-                bytes_written = self.ser.write(payload_bytes)
-                self.ser.flush()
-
-                if bytes_written == 0:
-                    self.log_message("No bytes written - possible serial issue", "WARNING")
-                else:
-                    # Show the actual string sent for transmit mode, bytes for command mode
-                    if self.settings["mode"] == "transmit":
-                        self.log_message(f"Sent: '{payload_str}' ({bytes_written} bytes)")
-                    else:
-                        self.log_message(f"Sent: '{payload_str}' → bytes {list(payload_bytes)} ({bytes_written} bytes)")
-
-                time.sleep(0.2)
-
-            except serial.SerialException as e:
-                self.log_message(f"Serial error: {e}", "ERROR")
-                self.running = False
-                break
-            except Exception as e:
-                self.log_message(f"Unexpected error: {e}", "ERROR")
-                self.running = False
-                break
-
-    def receive_loop(self):
-        """Continuously read data from serial port"""
-        while self.running:
-            try:
-                if self.ser and self.ser.in_waiting > 0:
-                    data = self.ser.readline()
-                    try:
-                        decoded_data = data.decode('ascii', errors='ignore').strip()
-                        if decoded_data:
-                            self.log_message(f"Received: '{decoded_data}' ({len(data)} bytes)")
-                    except Exception as decode_error:
-                        self.log_message(f"Received raw: {data} (decode error: {decode_error})", "WARNING")
+            deadline = None if args.duration is None else time.monotonic() + args.duration
+            while any(engine.running for engine in manager.sessions.values()):
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
                 time.sleep(0.1)
-                
-            except serial.SerialException as e:
-                self.log_message(f"Serial error: {e}", "ERROR")
-                self.running = False
-                break
-            except Exception as e:
-                self.log_message(f"Unexpected error: {e}", "ERROR")
-                self.running = False
-                break
-
-    def start_transmit(self):
-        """Start transmission/reception"""
-        # Check if port is already open
-        if self.ser and self.ser.is_open:
-            # Port is already open, proceed with sending
-            self.running = True
-            self.update_buttons()
-            
-            if self.settings["mode"] == "transmit":
-                self.thread = threading.Thread(target=self.transmit_loop, daemon=True)
-                self.thread.start()
-                self.log_message("Transmission started.")
-            elif self.settings["mode"] == "command":
-                # Send command once
-                self.send_single_command_with_delay()
-            else:
-                self.receive_thread = threading.Thread(target=self.receive_loop, daemon=True)
-                self.receive_thread.start()
-                self.log_message("Reception started.")
-            return
-        
-        # If port is not open, try to open it
-        if not self.is_port_available(self.settings["com_port"]):
-            messagebox.showerror("Port Unavailable", 
-                               f"Port {self.settings['com_port']} is currently in use.\n"
-                               "Please close other applications using this port.")
-            self.log_message(f"ERROR: Port {self.settings['com_port']} is unavailable", "ERROR")
-            return
-
-        if not self.open_serial_port():
-            return
-
-        self.running = True
-        self.update_buttons()
-
-        if self.settings["mode"] == "transmit":
-            self.thread = threading.Thread(target=self.transmit_loop, daemon=True)
-            self.thread.start()
-            self.log_message("Transmission started.")
-        elif self.settings["mode"] == "command":
-            # Send command once
-            self.send_single_command_with_delay()
-        else:
-            self.receive_thread = threading.Thread(target=self.receive_loop, daemon=True)
-            self.receive_thread.start()
-            self.log_message("Reception started.")
-
-    def send_single_command_with_delay(self):
-        """Send selected command once, wait for delay, then close port"""
-        try:
-            # Check if custom command is provided
-            if self.settings["custom_command"]:
-                payload_str = self.settings["custom_command"]
-            else:
-                payload_str = self.settings["selected_command"]
-            
-            # Convert each character to its ASCII byte value and add CR/LF
-            payload_bytes = bytes(ord(c) for c in payload_str.upper()) + b'\r\n'
-            
-            bytes_written = self.ser.write(payload_bytes)
-            self.ser.flush()
-            self.log_message(f"Sent command: '{payload_str}' → bytes {list(payload_bytes)} ({bytes_written} bytes)")
-            
-            # If "Keep Port Open" is checked, don't close
-            if self.keep_open_var.get():
-                self.log_message("Port kept open as requested.")
-                self.running = False
-                self.update_buttons()
-            else:
-                # Use configured delay
-                delay_ms = self.settings["delay_time"]
-                self.root.after(delay_ms, self._close_port_after_delay)
-                
-        except Exception as e:
-            self.log_message(f"Failed to send command: {e}", "ERROR")
-            self._close_port_after_delay()  # Clean up even on error
-
-    def _close_port_after_delay(self):
-        """Helper to close port after delay"""
-        self.running = False
-        self.update_buttons()
-        self.close_serial_port()
-        self.log_message("Command sent and port closed after delay.")
-
-    def retry_connect(self):
-        """Attempt to reconnect to the serial port"""
-        if self.ser and self.ser.is_open:
-            self.close_serial_port()
-        
-        # Wait a moment before retrying
-        self.root.after(500, self._attempt_reconnect)
-    
-    def _attempt_reconnect(self):
-        """Helper to attempt reconnection"""
-        if self.open_serial_port():
-            self.log_message("Successfully reconnected to serial port.")
-        else:
-            self.log_message("Reconnection failed. Please check port availability.")
-
-    def disconnect_port(self):
-        """Manually disconnect from serial port"""
-        if self.ser and self.ser.is_open:
-            self.close_serial_port()
-            self.running = False
-            self.update_buttons()
-            self.log_message("Manually disconnected from serial port.")
-        else:
-            messagebox.showinfo("Already Disconnected", "Port is already closed.")
-
-    def stop_transmit(self):
-        """Stop transmission/reception"""
-        self.running = False
-        if self.thread and self.thread.is_alive():
-            self.thread.join(timeout=3)
-            if self.thread.is_alive():
-                self.log_message("Transmission thread did not stop gracefully.", "WARNING")
-        if self.receive_thread and self.receive_thread.is_alive():
-            self.receive_thread.join(timeout=3)
-            if self.receive_thread.is_alive():
-                self.log_message("Reception thread did not stop gracefully.", "WARNING")
-        self.close_serial_port()
-        self.log_message("Transmission/reception stopped by user.")
-        self.update_buttons()
-
-    def on_closing(self):
-        """Cleanup on window close"""
-        self.stop_transmit()
-        self.root.destroy()
-
-def main():
-    root = tk.Tk()
-    app = SerialTransmitterApp(root)
-    root.protocol("WM_DELETE_WINDOW", app.on_closing)
-    root.mainloop()
+    except KeyboardInterrupt:
+        pass
+    stats = manager.stats()
+    manager.close()
+    if exporter:
+        exporter.stop()
+    print(json.dumps(stats, indent=2))
+    save_trace(args, tracer)
+    return 0 if all(started.values()) else 1
+
+
+def run_asyncio(args, settings, on_error):
+    """Run every --port as a coroutine on one event loop; Ctrl+C cancels them all"""
+    # Imported here: asyncio doubles the start-up time of every other headless run
+    import asyncio
+    from serial_async import AsyncSerialSession
+
+    sessions = {}
+    for name, session_settings in port_settings(args, settings).items():
+        session = sessions[name] = AsyncSerialSession(session_settings, on_error=on_error)
+        session.engine.log_prefix = f"[{name}] " if len(args.port) > 1 else ""
+    exporter = start_metrics(args, {name: session.engine.throughput for name, session in sessions.items()})
+    tracer = start_trace(args, [session.engine for session in sessions.values()])
+
+    async def run_all():
+        opened = [session for session in sessions.values() if session.open()]
+        await asyncio.gather(*(session.run(args.duration) for session in opened))
+        return len(opened)
+
+    try:
+        opened = asyncio.run(run_all())
+    except KeyboardInterrupt:
+        opened = len(sessions)  # asyncio.run() cancelled the sessions, which closed their ports
+    if exporter:
+        exporter.stop()
+    if len(args.port) > 1:
+        print(json.dumps({name: session.engine.throughput() for name, session in sessions.items()}, indent=2))
+    save_trace(args, tracer)
+    if not opened:
+        return 1
+    return 0 if opened == len(sessions) else 1
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        return run_cli(argv)
+
+    # Only the GUI needs tkinter
+    import serial_gui
+    serial_gui.main()
+    return 0
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
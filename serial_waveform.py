@@ -0,0 +1,141 @@
+"""Weight waveforms for transmit mode.
+
+A waveform is one or more segments joined with '+', played in order and
+then repeated:
+
+    const(weight, frames)
+    ramp(start, end, frames)                 straight line from start to end
+    step(low, high, frames)                  frames at low, then frames at high
+    noise(center, sd, frames[, seed])        gaussian noise around center
+    settle(start, target, frames[, cycles])  damped oscillation into target
+    replay(path)                             weights from a file, one per line
+                                             (first number on each line; CSV works)
+
+e.g. "ramp(0,5000,100) + settle(5000,6000,200) + noise(6000,15,500)".
+
+Weights are rounded and clamped to 0..999999, the range of the six-digit
+frame. compile_waveform() turns a spec into a weight array once, and
+build_frame_table() turns that into a tuple of prebuilt frames in which
+every distinct weight is formatted only once. Transmitting then just
+steps an index through the table, so millions of frames cost no
+formatting at all. noise() uses a fixed seed by default, so a waveform
+is the same on every run.
+"""
+import re
+import math
+import random
+from array import array
+
+MAX_WEIGHT = 999999
+
+_SEGMENT = re.compile(r"\s*([a-z]+)\s*\(([^()]*)\)\s*$")
+_NUMBER = re.compile(r"[-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?")
+
+
+class WaveformError(ValueError):
+    """A waveform spec that cannot be compiled"""
+
+
+def _ramp(start, end, frames):
+    if frames == 1:
+        return [start]
+    step = (end - start) / (frames - 1)
+    return [start + step * i for i in range(frames)]
+
+
+def _step(low, high, frames):
+    return [low] * frames + [high] * frames
+
+
+def _noise(center, sd, frames, seed=0):
+    generator = random.Random(seed)
+    return [generator.gauss(center, sd) for _ in range(frames)]
+
+
+def _settle(start, target, frames, cycles=3):
+    # Envelope decays to 1% of the initial error by the last frame
+    decay = math.log(100) / max(frames - 1, 1)
+    turn = 2 * math.pi * cycles / max(frames - 1, 1)
+    error = start - target
+    return [target + error * math.exp(-decay * i) * math.cos(turn * i) for i in range(frames)]
+
+
+def _const(weight, frames):
+    return [weight] * frames
+
+
+def read_weights(path):
+    """Weights from a text/CSV file: the first number on each line; lines without one are skipped"""
+    weights = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            match = _NUMBER.search(line)
+            if match:
+                weights.append(float(match.group()))
+    return weights
+
+
+# name -> (function, required argument count, optional argument count)
+SEGMENTS = {
+    "const": (_const, 2, 0),
+    "ramp": (_ramp, 3, 0),
+    "step": (_step, 3, 0),
+    "noise": (_noise, 3, 1),
+    "settle": (_settle, 3, 1),
+}
+
+
+def _compile_segment(text):
+    match = _SEGMENT.match(text)
+    if not match:
+        raise WaveformError(f"cannot read segment '{text.strip()}', expected e.g. ramp(0,1000,100)")
+    name, arguments = match.groups()
+    if name == "replay":
+        path = arguments.strip().strip("'\"")
+        try:
+            weights = read_weights(path)
+        except OSError as e:
+            raise WaveformError(f"replay: {e}") from None
+        if not weights:
+            raise WaveformError(f"replay: no weights in {path}")
+        return weights
+    if name not in SEGMENTS:
+        raise WaveformError(f"unknown segment '{name}', choose from {', '.join(SEGMENTS)}, replay")
+    function, required, optional = SEGMENTS[name]
+    try:
+        values = [float(value) for value in arguments.split(",")] if arguments.strip() else []
+    except ValueError:
+        raise WaveformError(f"{name}: arguments must be numbers") from None
+    if not required <= len(values) <= required + optional:
+        raise WaveformError(f"{name} takes {required}{f'-{required + optional}' if optional else ''} arguments")
+    # The frame count is always the last required argument
+    frames = values[required - 1]
+    if frames < 1 or frames != int(frames):
+        raise WaveformError(f"{name}: frame count must be a positive whole number")
+    values[required - 1] = int(frames)
+    if name == "noise" and len(values) > required:
+        values[required] = int(values[required])  # seed
+    return function(*values)
+
+
+def compile_waveform(spec):
+    """Weights (array of ints, clamped to 0..MAX_WEIGHT) for a waveform spec; raises WaveformError"""
+    if not spec.strip():
+        raise WaveformError("empty waveform")
+    weights = array('l')
+    for part in re.split(r"\+(?![^()]*\))", spec):  # '+' outside parentheses
+        weights.extend(min(MAX_WEIGHT, max(0, int(round(weight)))) for weight in _compile_segment(part))
+    return weights
+
+
+def build_frame_table(weights, make_frame):
+    """Tuple of make_frame(weight) for every weight, calling make_frame once per distinct weight"""
+    frames = {}
+    table = []
+    append = table.append
+    for weight in weights:
+        frame = frames.get(weight)
+        if frame is None:
+            frame = frames[weight] = make_frame(weight)
+        append(frame)
+    return tuple(table)
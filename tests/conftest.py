@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+# The modules live at the top of the repository, next to this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serial_bench import open_pty_pair, close_pty_pair  # noqa: E402
+from serial_simulator import DeviceSimulator  # noqa: E402
+
+
+def wait_until(condition, timeout=2.0):
+    """Poll condition() until it is true or timeout seconds passed. Returns its last value"""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = condition()
+        if value or time.monotonic() >= deadline:
+            return value
+        time.sleep(0.005)
+
+
+class Device:
+    """The far end of a pty: what a test writes here, the engine reads from the port, and back"""
+
+    def __init__(self, pair):
+        self.fd, self.slave_fd, self.port = pair
+        self.received = bytearray()
+        self.thread = None
+
+    def write(self, data):
+        os.write(self.fd, data)
+
+    def collect(self):
+        """Keep what the engine writes in self.received, on a daemon thread"""
+        def read():
+            try:
+                while True:
+                    data = os.read(self.fd, 65536)
+                    if not data:
+                        return
+                    self.received += data
+            except OSError:
+                pass
+        self.thread = threading.Thread(target=read, daemon=True)
+        self.thread.start()
+        return self
+
+
+@pytest.fixture
+def make_device():
+    """Factory of pty devices, closed after the test; skips where there are no ptys"""
+    pairs = []
+
+    def make():
+        pair = open_pty_pair()
+        if pair is None:
+            pytest.skip("needs ptys")
+        pairs.append(pair)
+        return Device(pair)
+
+    yield make
+    for pair in pairs:
+        close_pty_pair(pair)
+
+
+@pytest.fixture
+def device(make_device):
+    return make_device()
+
+
+@pytest.fixture
+def simulator():
+    simulator = DeviceSimulator()
+    yield simulator.start()
+    simulator.stop()
@@ -0,0 +1,67 @@
+import math
+
+import pytest
+
+from serial_analytics import build_index, parse_line, LogIndex, AnalyticsError, OTHER, LEVELS
+from serial_capture import RX
+
+np = pytest.importorskip("numpy")
+
+
+def log_lines(start_second, count):
+    for number in range(count):
+        second = start_second + number // 10
+        milliseconds = (number % 10) * 100
+        digits = f"{number * 10:06d}"[::-1]  # sent reversed, like transmit mode
+        yield (f"2024-01-02 03:{second // 60:02d}:{second % 60:02d},{milliseconds:03d} - INFO - "
+               f"Sent: '={digits}' (7 bytes)\n")
+
+
+def test_parse_line():
+    assert parse_line(b"2024-01-02 03:04:05,678 - INFO - [port] Received: '=654321' (9 bytes)") == \
+        (RX, LEVELS.index("INFO"), 123456.0, 9)
+    direction, level, weight, size = parse_line(b"2024-01-02 03:04:05,678 - ERROR - Port lost")
+    assert (direction, level, size) == (OTHER, LEVELS.index("ERROR"), 0) and math.isnan(weight)
+    assert parse_line(b"a continuation line") is None
+
+
+def test_index_and_queries(tmp_path):
+    path = tmp_path / "serial_transmission.log"
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(log_lines(0, 100))  # 10 frames/s for 10 s
+        f.write("2024-01-02 03:00:30,000 - ERROR - Port lost\n")
+    meta = build_index(str(path))
+    assert meta["rows"] == 101
+
+    index = LogIndex(str(path))
+    summary = index.summary()
+    assert summary["sent_frames"] == 100 and summary["received_frames"] == 0
+    assert summary["bytes"] == 700
+    assert summary["levels"] == {"INFO": 100, "ERROR": 1}
+    assert [bucket["frames"] for bucket in index.rate(bucket=5.0, direction="sent")] == [50, 50]
+    gaps = index.gaps(direction="sent")
+    assert gaps["p50_ms"] == 100.0 and gaps["max_ms"] == 100.0
+    weights = index.weights(below=10, above=900)
+    assert weights["frames"] == 100
+    assert weights["min"] == 0.0 and weights["max"] == 990.0 and weights["mean"] == 495.0
+    assert weights["excursions"] == 1 + 9  # 0 below, 910..990 above
+    assert sum(hour["errors"] for hour in index.errors_per_hour()) == 1
+
+
+def test_index_grows_with_the_log(tmp_path):
+    path = tmp_path / "serial_transmission.log"
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(log_lines(0, 20))
+        f.write("2024-01-02 03:00:10,000 - INFO - half a li")  # still being written
+    assert build_index(str(path))["rows"] == 20
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("ne\n")
+        f.writelines(log_lines(20, 30))
+    assert build_index(str(path))["rows"] == 51
+    start = LogIndex(str(path)).columns["time"][0]
+    assert len(LogIndex(str(path)).select(since=start + 2.0)._column("time")) == 31
+
+
+def test_missing_index(tmp_path):
+    with pytest.raises(AnalyticsError):
+        LogIndex(str(tmp_path / "nothing.log"))
@@ -0,0 +1,69 @@
+import asyncio
+
+from conftest import wait_until
+from serial_async import AsyncSerialSession
+from serial_engine import weight_payload
+import serial_transmitter
+
+
+def test_transmit_honours_the_batch(device):
+    device.collect()
+    session = AsyncSerialSession({"com_port": device.port, "mode": "transmit", "transmit_rate": 400, "tx_batch": 4})
+    asyncio.run(session.run(0.3))
+    engine = session.engine
+    assert engine.tx_frames > 0
+    assert engine.tx_frames == 4 * engine.tx_writes
+    assert engine.scheduler.slots == engine.tx_writes
+    assert wait_until(lambda: len(device.received) == engine.tx_bytes)
+    assert bytes(device.received) == weight_payload(5555).data * engine.tx_frames
+    assert not engine.is_open()
+
+
+def test_receive_counts_weight_frames(device):
+    session = AsyncSerialSession({"com_port": device.port, "mode": "receive", "rx_framing": "weight"})
+
+    async def scenario():
+        task = asyncio.ensure_future(session.run())
+        await asyncio.sleep(0.05)
+        device.write(b"=000200\r\n" * 20)
+        for _ in range(200):
+            if session.engine.rx_frames == 20:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    engine = session.engine
+    assert engine.rx_frames == 20 and engine.rx_weight == 2000
+    assert engine.framer.dropped == 0 and not engine.is_open()
+
+
+def test_command_returns_the_reply(simulator):
+    port = simulator.add_pty().port
+    session = AsyncSerialSession({"com_port": port, "mode": "command", "selected_command": "IP", "delay_time": 300})
+    assert asyncio.run(session.run()) == b"=555500\r\n"
+    assert session.engine.rx_frames == 1 and not session.engine.is_open()
+
+
+def test_write_and_read_line_on_loop():
+    session = AsyncSerialSession({"com_port": "loop://"})
+
+    async def scenario():
+        assert await session.write(b"first\nsecond\n") == 13
+        return [await session.read_line(1.0), await session.read_line(1.0)]
+
+    try:
+        assert asyncio.run(scenario()) == [b"first\n", b"second\n"]
+    finally:
+        session.close(None)
+
+
+def test_cli_rejects_threads_only_options(tmp_path, capsys):
+    program = tmp_path / "check.seq"
+    program.write_text("send IP\n")
+    base = ["--port", "loop://", "--transport", "asyncio"]
+    assert serial_transmitter.main(base + ["--mode", "command", "--sequence", str(program)]) == 2
+    assert "--sequence runs with the threads transport" in capsys.readouterr().err
+    assert serial_transmitter.main(base + ["--reconnect"]) == 2
+    assert serial_transmitter.main(base + ["--mode", "loopback"]) == 2
@@ -0,0 +1,56 @@
+import threading
+
+from serial_capture import CaptureWriter, CaptureReader, INDEX_INTERVAL, RX, TX
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "test.spcap")
+    sent = [(1000 + number, RX if number % 2 else TX, "COM1" if number % 3 else "COM2", b"=%06d\r\n" % number)
+            for number in range(3 * INDEX_INTERVAL + 5)]
+    with CaptureWriter(path) as writer:
+        for timestamp, direction, port, data in sent:
+            writer.write(data, direction, port, timestamp)
+
+    with CaptureReader(path) as reader:
+        assert len(reader.blocks) == 4  # the last partial block is indexed on close
+        assert [(timestamp, direction, port, bytes(data))
+                for timestamp, direction, port, data in reader.frames()] == sent
+        # A time window starting after the first index block skips it
+        window = [timestamp for timestamp, _, _, _ in reader.frames(2500, 2600)]
+        assert window == list(range(2500, 2600))
+        summary = reader.summary()
+    assert sum(stream["frames"] for stream in summary["streams"]) == len(sent)
+    assert {stream["port"] for stream in summary["streams"]} == {"COM1", "COM2"}
+
+
+def test_truncated_capture_reads_up_to_last_complete_record(tmp_path):
+    path = str(tmp_path / "cut.spcap")
+    with CaptureWriter(path) as writer:
+        for number in range(10):
+            writer.write(b"frame%d" % number, RX, "COM1", number)
+            if number == 8:
+                cut = writer.offset + 5  # into the header of the last frame
+    with open(path, "r+b") as f:
+        f.truncate(cut)
+    with CaptureReader(path) as reader:
+        assert [bytes(data) for _, _, _, data in reader.frames()] == [b"frame%d" % n for n in range(9)]
+
+
+def test_concurrent_writers_stay_in_time_order(tmp_path):
+    path = str(tmp_path / "threads.spcap")
+    writer = CaptureWriter(path)
+
+    def write(direction):
+        for _ in range(5000):
+            writer.write(b"x", direction, "COM1")
+
+    threads = [threading.Thread(target=write, args=(direction,)) for direction in (RX, TX)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+    with CaptureReader(path) as reader:
+        stamps = [timestamp for timestamp, _, _, _ in reader.frames()]
+    assert len(stamps) == 10000
+    assert stamps == sorted(stamps)
@@ -0,0 +1,81 @@
+import pytest
+import serial
+
+from conftest import wait_until
+from serial_commands import CommandClient, LatencyHistogram, encode_command, run_commands
+
+
+def open_client(port, **options):
+    ser = serial.serial_for_url(port, timeout=0.01)
+    return CommandClient(ser, **options)
+
+
+def test_pipelined_commands_are_all_matched(simulator):
+    port = simulator.add_pty(latency=0.002).port
+    client = open_client(port, timeout=1.0, window=4).start()
+    try:
+        stats = run_commands(client, ["IP", "PU"], 40)
+    finally:
+        client.close()
+        client.ser.close()
+    assert stats["sent"] == stats["answered"] == 40
+    assert stats["timeouts"] == 0 and stats["unmatched"] == 0
+    assert set(stats["commands"]) == {"IP", "PU"} and stats["commands"]["IP"]["count"] == 20
+
+
+def test_replies_resolve_to_their_commands(simulator):
+    port = simulator.add_socket().port
+    client = open_client(port, window=2).start()
+    try:
+        weight, unit = client.send("IP"), client.send("PU")
+        assert weight.result(1.0).data == b"=555500\r\n" and weight.result().command == "IP"
+        assert unit.result(1.0).data == b"kg\r\n"
+        assert 0 < weight.result().rtt < 1.0
+    finally:
+        client.close()
+        client.ser.close()
+
+
+def test_input_before_start_is_unmatched(device):
+    client = open_client(device.port, timeout=0.05)
+    device.write(b"=555500\r\n")  # e.g. the reply to a command sent with the port kept open
+    assert wait_until(lambda: client.ser.in_waiting)
+    client.start()
+    try:
+        assert client.unmatched == 1
+        reply = client.send("IP")
+        device.write(b"=000100\r\n")
+        assert reply.result(1.0).data == b"=000100\r\n"
+    finally:
+        client.close()
+        client.ser.close()
+
+
+def test_missing_reply_times_out_without_blocking_the_next(device):
+    client = open_client(device.port, timeout=0.05).start()
+    try:
+        lost = client.send("IP")
+        with pytest.raises(TimeoutError):
+            lost.result(1.0)
+        answered = client.send("IP")
+        device.write(b"=000100\r\n")
+        assert answered.result(1.0).data == b"=000100\r\n"
+        assert client.stats()["timeouts"] == 1 and client.stats()["answered"] == 1
+    finally:
+        client.close()
+        client.ser.close()
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for millis in range(1, 101):
+        histogram.record(millis / 1000.0)
+    stats = histogram.stats()
+    assert stats["count"] == 100
+    assert abs(histogram.percentile(0.5) - 0.050) < 0.005
+    assert abs(histogram.percentile(0.99) - 0.099) < 0.01
+    assert histogram.max == 0.1
+
+
+def test_encode_command():
+    assert encode_command("ip") == b"IP\r\n"
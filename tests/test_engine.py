@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+from conftest import wait_until
+from serial_engine import SerialEngine, weight_payload
+from serial_pool import PortPool
+
+
+def run_for(engine, seconds):
+    assert engine.start()
+    try:
+        time.sleep(seconds)
+    finally:
+        engine.stop()
+
+
+def test_transmit_writes_what_it_counts(device):
+    device.collect()
+    engine = SerialEngine({"com_port": device.port, "mode": "transmit", "transmit_rate": 200, "base_weight": 1234})
+    run_for(engine, 0.3)
+    frame = weight_payload(1234).data
+    assert frame == b"=432100"
+    assert wait_until(lambda: len(device.received) == engine.tx_bytes)
+    assert bytes(device.received) == frame * engine.tx_frames
+    assert engine.tx_frames > 10
+    assert engine.scheduler.frames == engine.tx_frames
+
+
+def test_transmit_batches_frames_per_write(device):
+    device.collect()
+    engine = SerialEngine({"com_port": device.port, "mode": "transmit", "transmit_rate": 400, "tx_batch": 8})
+    run_for(engine, 0.3)
+    stats = engine.throughput()
+    assert stats["tx_frames"] > 0
+    assert stats["tx_frames"] == 8 * stats["tx_writes"]
+    assert engine.scheduler.slots == stats["tx_writes"]
+
+
+def test_transmit_waveform_frames_in_order(device):
+    device.collect()
+    engine = SerialEngine({"com_port": device.port, "mode": "transmit", "transmit_rate": 0,
+                           "waveform": "ramp(1, 3, 3)", "tx_batch": 4})
+    run_for(engine, 0.1)
+    wait_until(lambda: len(device.received) == engine.tx_bytes)
+    frames = [weight_payload(weight).data for weight in (1, 2, 3)]
+    assert bytes(device.received) == b"".join(frames[n % 3] for n in range(engine.tx_frames))
+
+
+def test_receive_weight_frames_with_crlf(device):
+    engine = SerialEngine({"com_port": device.port, "mode": "receive", "rx_framing": "weight"})
+    assert engine.start()
+    try:
+        for _ in range(50):
+            device.write(b"=654321\r\n")
+        assert wait_until(lambda: engine.rx_frames == 50)
+        stats = engine.throughput()
+    finally:
+        engine.stop()
+    assert stats["rx_weights"] == 50 and stats["last_weight"] == 123456
+    assert stats["rx_dropped_bytes"] == 0 and stats["decode_errors"] == 0
+
+
+def test_receive_flushes_a_partial_line_after_the_inter_byte_timeout(device):
+    logged = []
+    engine = SerialEngine({"com_port": device.port, "mode": "receive", "inter_byte_timeout": 20},
+                          on_log=lambda message, level: logged.append(message))
+    assert engine.start()
+    try:
+        device.write(b"=000001")
+        assert wait_until(lambda: engine.rx_frames == 1)
+    finally:
+        engine.stop()
+    assert "Received: '=000001' (7 bytes), weight 100000" in logged
+
+
+def test_command_reply_is_matched(simulator):
+    port = simulator.add_pty().port
+    logged = []
+    engine = SerialEngine({"com_port": port, "mode": "command", "selected_command": "IP", "delay_time": 300},
+                          on_log=lambda message, level: logged.append(message))
+    assert engine.start()
+    engine.join(2.0)
+    assert not engine.is_open()
+    replies = [message for message in logged if message.startswith("Reply to 'IP'")]
+    assert len(replies) == 1 and replies[0].endswith("'=555500'")
+    assert engine.rx_frames == 1 and engine.tx_frames == 1
+
+
+def test_command_pool_reuses_the_handle(simulator):
+    port = simulator.add_pty().port
+    pool = PortPool()
+    engine = SerialEngine({"com_port": port, "mode": "command", "delay_time": 0},
+                          schedule=lambda delay_ms, callback: callback(), pool=pool)
+    try:
+        for _ in range(3):
+            assert engine.start()
+        assert pool.stats()["opened"] == 1 and pool.stats()["reused"] == 2
+        assert engine.disconnect()  # closes the pooled handle
+        assert not pool.idle
+    finally:
+        pool.close_all()
+
+
+@pytest.mark.parametrize("settings, title", [
+    ({"mode": "transmit", "waveform": "wobble(1)"}, "Waveform Error"),
+    ({"mode": "receive", "rx_framing": "fixed:0"}, "Framing Error"),
+    ({"mode": "command", "sequence_file": "missing.seq"}, "Sequence Error"),
+])
+def test_bad_settings_are_reported_before_opening(settings, title):
+    errors = []
+    engine = SerialEngine(dict(settings, com_port="loop://"), on_error=lambda *error: errors.append(error))
+    assert not engine.start()
+    assert errors and errors[0][0] == title
+    assert engine.ser is None
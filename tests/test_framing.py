@@ -0,0 +1,72 @@
+import pytest
+
+from serial_framing import make_framer, decode_weight, FramingError
+
+
+def feed_split(framer, data, size):
+    frames = []
+    for start in range(0, len(data), size):
+        frames += framer.feed(data[start:start + size])
+    return frames
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_line_frames_survive_any_split(size):
+    data = b"=123456\n=654321\nab\n"
+    assert feed_split(make_framer("line"), data, size) == [b"=123456\n", b"=654321\n", b"ab\n"]
+
+
+def test_multi_byte_delimiter_split_across_chunks():
+    framer = make_framer("delimiter:\\r\\n")
+    assert framer.feed(b"one\r") == []
+    assert framer.feed(b"\ntwo\r\nthr") == [b"one\r\n", b"two\r\n"]
+    assert framer.flush() == b"thr"
+    assert framer.flush() is None
+
+
+def test_fixed_length_keeps_the_rest():
+    framer = make_framer("fixed:3")
+    assert framer.feed(b"abcdefgh") == [b"abc", b"def"]
+    assert framer.feed(b"i") == [b"ghi"]
+
+
+def test_stx_strips_markers_and_counts_dropped_bytes():
+    framer = make_framer("stx")
+    assert framer.feed(b"xx\x02one\x03y\x02tw") == [b"one"]
+    assert framer.feed(b"o\x03") == [b"two"]
+    assert framer.dropped == 3
+
+
+def test_weight_frames_need_no_terminator():
+    framer = make_framer("weight")
+    assert feed_split(framer, b"junk=123456=65", 4) == [b"=123456"]
+    assert framer.feed(b"4321") == [b"=654321"]
+    assert framer.dropped == 4
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 8, 9, 1000])
+def test_weight_frames_with_crlf_drop_nothing(size):
+    framer = make_framer("weight")
+    frames = feed_split(framer, b"=123456\r\n=654321\r\n=111111\n", size)
+    assert frames == [b"=123456", b"=654321", b"=111111"]
+    assert framer.dropped == 0
+    assert not framer.buffer
+
+
+def test_weight_framer_still_drops_noise_after_a_line_ending():
+    framer = make_framer("weight")
+    assert framer.feed(b"=123456\r\nxy=654321\r\n") == [b"=123456", b"=654321"]
+    assert framer.dropped == 2
+
+
+@pytest.mark.parametrize("spec", ["fixed:0", "fixed:x", "delimiter:", "weight:0", "nonsense", "line:1"])
+def test_bad_specs(spec):
+    with pytest.raises(FramingError):
+        make_framer(spec)
+
+
+def test_decode_weight_reverses_digits():
+    assert decode_weight(b"=654321") == 123456
+    assert decode_weight(b"=5.21\r\n") == 12.5
+    assert decode_weight(b"654321") is None
+    assert decode_weight(b"=abc") is None
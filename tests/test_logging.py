@@ -0,0 +1,82 @@
+import logging
+from logging.handlers import RotatingFileHandler
+
+import pytest
+
+from conftest import wait_until
+import serial_logging
+from serial_logging import _LogWriter, configure_logging, write_log, logging_counters, shutdown_logging
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    yield tmp_path / "serial.log"
+    shutdown_logging()
+
+
+def lines(path):
+    return [line.split(" - ", 2)[2] for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_lines_queued_after_stop_are_still_written(tmp_path):
+    path = tmp_path / "serial.log"
+    writer = _LogWriter(RotatingFileHandler(path, encoding="utf-8"), None)
+    # close() logging while the writer stops: the sentinel lands in the middle of one batch
+    writer.put(1.0, "INFO", "before")
+    writer.queue.put(writer._STOP)
+    writer.put(2.0, "INFO", "after")
+    writer.start()
+    writer.join(2.0)
+    assert not writer.is_alive()
+    writer.file_handler.close()
+    assert lines(path) == ["before", "after"]
+    assert writer.written == 2 and writer.failed == 0
+
+
+def test_engine_and_logging_module_lines_share_one_file_in_order(log_file):
+    configure_logging(str(log_file), console=False)
+    write_log("first")
+    logging.getLogger("serial").warning("second")
+    write_log("third", "ERROR")
+    shutdown_logging()
+    assert lines(log_file) == ["first", "second", "third"]
+    assert log_file.read_text(encoding="utf-8").splitlines()[2].split(" - ")[1] == "ERROR"
+    assert logging_counters()["written"] == 0  # the writer is gone
+
+
+def test_rollover_counts_bytes_not_characters(tmp_path):
+    path = tmp_path / "serial.log"
+    writer = _LogWriter(RotatingFileHandler(path, maxBytes=200, backupCount=20, encoding="utf-8"), None)
+    try:
+        for n in range(30):
+            writer._write_file(f"{n:02d} weight ±0.5 kg — µ-range ✓\n")
+    finally:
+        writer.file_handler.close()
+    files = sorted(tmp_path.iterdir())
+    assert len(files) > 1
+    assert all(file.stat().st_size <= 200 for file in files)
+    assert sum(len(file.read_text(encoding="utf-8").splitlines()) for file in files) == 30
+
+
+def test_write_error_is_counted_and_the_writer_goes_on(log_file, monkeypatch, capsys):
+    configure_logging(str(log_file), console=False)
+    writer = serial_logging._writer
+    write_file = writer._write_file
+    calls = []
+
+    def failing_once(text):
+        calls.append(text)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        write_file(text)
+
+    monkeypatch.setattr(writer, "_write_file", failing_once)
+    write_log("lost")
+    assert wait_until(lambda: writer.failed == 1)
+    write_log("kept")
+    shutdown_logging()
+    assert not writer.is_alive()
+    assert lines(log_file) == ["kept"]
+    assert writer.failed == 1 and writer.written == 1
+    assert "Log writer: disk full" in capsys.readouterr().err
+
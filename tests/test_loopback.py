@@ -0,0 +1,81 @@
+import pytest
+import serial
+from serial.urlhandler import protocol_loop
+
+from serial_loopback import (LoopbackTest, LoopbackError, MAGIC, HEADER_SIZE, build_pool, encode_sequence,
+                             decode_sequence)
+
+
+class FaultyLoop(protocol_loop.Serial):
+    """loop:// that damages (flips a bit) or cuts short (drops the last byte) chosen blocks written"""
+
+    def __init__(self, *args, damage=(), cut=(), **kwargs):
+        self.damage = set(damage)
+        self.cut = set(cut)
+        self.written = 0
+        super().__init__(*args, **kwargs)
+
+    def write(self, data):
+        number = self.written
+        self.written += 1
+        if number in self.damage:
+            data = bytearray(data)
+            data[-1] ^= 0x01
+        elif number in self.cut:
+            data = data[:-1]
+        return super().write(data)
+
+
+def run(ser, block_size=16, seconds=0.2):
+    test = LoopbackTest(block_size)
+    try:
+        return test.run(ser, seconds)
+    finally:
+        ser.close()
+
+
+def test_header_bytes_fit_five_bits_and_avoid_xon_xoff():
+    assert all(byte <= 31 and byte not in (0x11, 0x13) for byte in MAGIC)
+    for number in (0, 1, 31, 32, 123456, 2 ** 30 - 1):
+        encoded = encode_sequence(number)
+        assert max(encoded) <= 31
+        assert decode_sequence(encoded) == number
+    assert decode_sequence(b"\x00\x20") is None
+
+
+def test_pool_is_masked_to_data_bits():
+    assert max(max(block) for block in build_pool("prbs", 64, data_bits=5)) <= 31
+    assert build_pool("sequence", 4)[1] == b"\x01\x02\x03\x04"
+    with pytest.raises(LoopbackError):
+        build_pool("zeros", 4)
+
+
+def test_clean_loop_passes():
+    stats = run(serial.serial_for_url("loop://", timeout=1))
+    assert stats["passed"]
+    assert stats["blocks_received"] == stats["blocks_sent"] > 0
+    assert stats["byte_errors"] == stats["blocks_dropped"] == stats["skipped_bytes"] == 0
+
+
+def test_damaged_blocks_are_counted():
+    stats = run(FaultyLoop("loop://", timeout=1, damage=(3, 10)))
+    assert not stats["passed"]
+    assert stats["blocks_damaged"] == 2
+    assert stats["byte_errors"] == 2 and stats["bit_errors"] == 2
+    assert stats["blocks_dropped"] == 0
+
+
+def test_cut_short_block_is_dropped_and_the_rest_checked():
+    stats = run(FaultyLoop("loop://", timeout=1, cut=(5,)))
+    assert stats["completed"] and not stats["passed"]
+    assert stats["blocks_dropped"] == 1
+    assert stats["blocks_received"] == stats["blocks_sent"] - 1
+    assert stats["skipped_bytes"] == HEADER_SIZE + 16 - 1
+    assert stats["byte_errors"] == 0
+
+
+def test_damaged_last_block_is_checked_at_the_end():
+    test = LoopbackTest(16)
+    stats = test.run(FaultyLoop("loop://", timeout=1, damage=(3,)), 0)  # MIN_BLOCKS blocks
+    assert stats["completed"] and stats["blocks_sent"] == 4
+    assert stats["blocks_damaged"] == 1 and stats["blocks_dropped"] == 0
@@ -0,0 +1,72 @@
+import serial
+
+from serial_pool import PortPool
+
+SETTINGS = {"baudrate": 9600}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def opener(opened):
+    def open_port():
+        ser = serial.serial_for_url("loop://", baudrate=9600)
+        opened.append(ser)
+        return ser
+    return open_port
+
+
+def test_released_handle_is_reused_and_reconfigured():
+    pool = PortPool(idle_timeout=60.0)
+    opened = []
+    try:
+        ser, reused = pool.acquire("loop://", SETTINGS, opener(opened))
+        assert not reused
+        ser.write(b"stale")
+        pool.release("loop://", ser)
+        again, reused = pool.acquire("loop://", {"baudrate": 19200}, opener(opened))
+        assert reused and again is ser and len(opened) == 1
+        assert again.baudrate == 19200 and again.in_waiting == 0  # stale input discarded
+        assert pool.stats()["reconfigured"] == 1
+    finally:
+        pool.close_all()
+
+
+def test_closed_handle_fails_the_health_check():
+    pool = PortPool(idle_timeout=60.0)
+    opened = []
+    try:
+        ser, _ = pool.acquire("loop://", SETTINGS, opener(opened))
+        pool.release("loop://", ser)
+        ser.close()
+        fresh, reused = pool.acquire("loop://", SETTINGS, opener(opened))
+        assert not reused and fresh is not ser
+        assert pool.stats()["health_failures"] == 1 and pool.stats()["opened"] == 2
+    finally:
+        pool.close_all()
+
+
+def test_idle_handles_are_evicted_and_discarded():
+    clock = Clock()
+    pool = PortPool(idle_timeout=60.0, clock=clock)
+    opened = []
+    try:
+        first, _ = pool.acquire("first", SETTINGS, opener(opened))
+        second, _ = pool.acquire("second", SETTINGS, opener(opened))
+        pool.release("first", first)
+        clock.now = 30.0
+        pool.release("second", second)
+        clock.now = 60.0
+        assert pool.evict_idle() == 1
+        assert not first.is_open and second.is_open
+        assert pool.discard("second") and not second.is_open
+        assert not pool.discard("second")
+        assert pool.stats() == {"opened": 2, "reused": 0, "reconfigured": 0, "evicted": 1,
+                                "health_failures": 0, "idle": 0}
+    finally:
+        pool.close_all()
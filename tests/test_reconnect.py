@@ -0,0 +1,58 @@
+import pytest
+
+import serial_reconnect
+from serial_reconnect import ReconnectSupervisor, PortIdentity, describe, find_port
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(serial_reconnect, "JITTER", 0.0)
+    return Clock()
+
+
+def test_backoff_doubles_up_to_the_cap(clock):
+    supervisor = ReconnectSupervisor(PortIdentity("COM4", None, None, None, ""), max_delay=3.0, clock=clock)
+    supervisor.went_down()
+    assert supervisor.until_next_attempt() == 0.5 and not supervisor.attempt_due()
+    assert [supervisor.failed() for _ in range(4)] == [1.0, 2.0, 3.0, 3.0]
+    clock.now += 3.0
+    assert supervisor.attempt_due()
+    clock.now += 1.5
+    assert supervisor.came_back() == 4.5
+    stats = supervisor.stats()
+    assert stats["outages"] == 1 and not stats["down"] and stats["downtime_s"] == 4.5
+    supervisor.went_down()
+    assert supervisor.until_next_attempt() == 0.5  # a new outage starts from the initial delay
+
+
+def test_full_queue_drops_the_oldest_frames(clock):
+    supervisor = ReconnectSupervisor(PortIdentity("COM4", None, None, None, ""), queue_size=3, clock=clock)
+    supervisor.went_down()
+    for frame in range(5):
+        supervisor.hold(frame)
+    assert list(supervisor.held) == [2, 3, 4]
+    clock.now += 2.0
+    supervisor.finish()
+    stats = supervisor.stats()
+    assert stats["frames_lost"] == 5 and stats["frames_held"] == 0 and stats["downtime_s"] == 2.0
+
+
+def test_no_queue_drops_every_frame(clock):
+    supervisor = ReconnectSupervisor(PortIdentity("COM4", None, None, None, ""), queue_size=0, clock=clock)
+    supervisor.hold(b"=555500")
+    assert not supervisor.held and supervisor.stats()["frames_lost"] == 1
+
+
+def test_ports_without_usb_identity_match_by_name():
+    identity = PortIdentity("/dev/pts/9", None, None, None, "")
+    assert find_port(identity) == "/dev/pts/9"
+    assert describe(identity) == "/dev/pts/9"
+    assert describe(PortIdentity("COM4", 0x0403, 0x6001, "A1B2C3", "")) == "USB 0403:6001 serial A1B2C3 (was COM4)"
@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+from serial_capture import CaptureWriter, RX, TX
+from serial_replay import open_recording
+
+LOG = """\
+2024-01-02 03:04:05,100 - INFO - Serial port /dev/ttyUSB0 opened.
+2024-01-02 03:04:05,250 - INFO - Sent: '=654321' (7 bytes)
+2024-01-02 03:04:05,300 - INFO - Received: '=123456' (9 bytes)
+2024-01-02 03:04:06,000 - INFO - [scale] Sent command: 'IP' → bytes [73, 80, 13, 10] (4 bytes)
+2024-01-02 03:04:06,500 - INFO - Sent: '=1111' (5 of 7 bytes)
+"""
+
+
+def test_log_lines_become_frames(tmp_path):
+    path = tmp_path / "serial_transmission.log"
+    path.write_text(LOG, encoding="utf-8")
+    frames = list(open_recording(str(path)))
+    base = time.mktime(time.strptime("2024-01-02 03:04:05", "%Y-%m-%d %H:%M:%S"))
+    assert [round(seconds - base, 3) for seconds, _ in frames] == [0.25, 0.3, 1.0, 1.5]
+    assert [data for _, data in frames] == [b"=654321", b"=123456\r\n", b"IP\r\n", b"=1111"]
+
+
+def test_log_direction_filter(tmp_path):
+    path = tmp_path / "serial_transmission.log"
+    path.write_text(LOG, encoding="utf-8")
+    assert [data for _, data in open_recording(str(path), "received")] == [b"=123456\r\n"]
+    assert len(list(open_recording(str(path), "sent"))) == 3
+
+
+def test_capture_recording(tmp_path):
+    path = str(tmp_path / "replay.spcap")
+    with CaptureWriter(path) as writer:
+        writer.write(b"=000001\r\n", RX, "COM1", 1_000_000_000)
+        writer.write(b"P\r\n", TX, "COM1", 1_500_000_000)
+    assert list(open_recording(path)) == [(1.0, b"=000001\r\n"), (1.5, b"P\r\n")]
+    assert list(open_recording(path, "sent")) == [(1.5, b"P\r\n")]
+
+
+def test_unknown_direction(tmp_path):
+    with pytest.raises(ValueError):
+        open_recording(str(tmp_path / "missing.log"), "sideways")
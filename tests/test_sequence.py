@@ -0,0 +1,49 @@
+import pytest
+
+from serial_sequence import compile_sequence, SequenceError, SEND, WAIT, REPEAT, END
+
+
+def test_compiles_steps_and_jump_targets():
+    program = compile_sequence("""
+        send IP               # tare
+        repeat 3
+          send P expect ^=\\d{6} timeout 200
+          wait 50
+        end
+        repeat 0
+          send SP expect
+        end
+    """, name="test")
+    steps = program.steps
+    assert program.name == "test"
+    assert [step[0] for step in steps] == [SEND, REPEAT, SEND, WAIT, END, REPEAT, SEND, END]
+    assert steps[0][1] == "IP" and steps[0][3] is None
+    command, pattern, timeout = steps[2][1], steps[2][3], steps[2][4]
+    assert command == "P" and pattern.search("=123456") and timeout == 0.2
+    assert steps[3] == (WAIT, 0.05)
+    assert steps[1] == (REPEAT, 3, 5)  # continues after its END
+    assert steps[4] == (END, 1)
+    assert steps[5] == (REPEAT, -1, 8)  # 0 repeats forever
+    assert steps[6][3].pattern == "."  # bare expect takes any reply
+
+
+def test_escaped_hash_is_not_a_comment():
+    program = compile_sequence("send P expect =\\#1 # comment")
+    assert program.steps[0][3].pattern == "=#1"
+
+
+@pytest.mark.parametrize("text, line", [
+    ("send IP\nbogus 1", "line 2"),
+    ("wait -5", "line 1"),
+    ("send", "line 1"),
+    ("end", "line 1"),
+    ("send P expect (", "line 1"),
+])
+def test_errors_name_the_line(text, line):
+    with pytest.raises(SequenceError, match=line):
+        compile_sequence(text)
+
+
+def test_unclosed_repeat():
+    with pytest.raises(SequenceError, match="without 'end'"):
+        compile_sequence("repeat 2\nsend P")
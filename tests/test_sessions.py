@@ -0,0 +1,62 @@
+import pytest
+
+from conftest import wait_until
+from serial_sessions import SessionManager
+
+
+@pytest.fixture
+def manager():
+    manager = SessionManager()
+    yield manager
+    manager.close()
+
+
+def test_shared_thread_receives_from_every_session(manager, make_device):
+    devices = [make_device() for _ in range(3)]
+    for device in devices:
+        manager.add_session({"com_port": device.port, "mode": "receive", "rx_framing": "weight"})
+    assert all(manager.start_all().values())
+    assert wait_until(lambda: len(manager.shared) == 3)
+    for count, device in enumerate(devices, 1):
+        device.write(b"=123400\r\n" * count)
+    for count, device in enumerate(devices, 1):
+        engine = manager.sessions[device.port]
+        assert wait_until(lambda: engine.rx_frames == count)
+        assert engine.rx_weight == 4321 and engine.framer.dropped == 0
+    assert manager.stats()["shared_sessions"] == 3
+
+
+def test_shared_thread_paces_batched_transmit(manager, device):
+    device.collect()
+    engine = manager.add_session({"com_port": device.port, "mode": "transmit", "transmit_rate": 400, "tx_batch": 4})
+    assert manager.start(device.port)
+    assert wait_until(lambda: engine.tx_frames >= 40)
+    manager.stop(device.port)
+    assert device.port not in manager.shared and not engine.is_open()
+    assert engine.tx_frames == 4 * engine.tx_writes
+    assert engine.scheduler.frames == engine.tx_frames
+    assert wait_until(lambda: len(device.received) == engine.tx_bytes)
+
+
+def test_reconnecting_session_runs_on_its_own_worker(manager, device):
+    engine = manager.add_session({"com_port": device.port, "mode": "receive", "auto_reconnect": True})
+    assert manager.start(device.port)
+    assert engine.supervisor is not None
+    assert engine.receive_thread is not None and engine.receive_thread.is_alive()
+    device.write(b"=000100\n")
+    assert wait_until(lambda: engine.rx_frames == 1)
+    assert device.port not in manager.shared and manager.thread is None
+
+
+def test_unpollable_port_falls_back_to_engine_threads(manager):
+    engine = manager.add_session({"com_port": "loop://", "mode": "transmit", "transmit_rate": 100})
+    assert manager.start("loop://")
+    assert engine.thread is not None and engine.thread.is_alive()
+    assert wait_until(lambda: engine.tx_frames > 0)
+    assert "loop://" not in manager.shared
+
+
+def test_duplicate_session_name_is_rejected(manager):
+    manager.add_session({"com_port": "loop://"}, name="scale")
+    with pytest.raises(ValueError):
+        manager.add_session({"com_port": "loop://"}, name="scale")
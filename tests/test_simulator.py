@@ -0,0 +1,68 @@
+import pytest
+import serial
+
+from serial_engine import weight_payload
+from serial_simulator import SimulatedDevice, SimulatorError, parse_faults, ERROR_REPLY, OK_REPLY
+
+
+def ask(ser, command):
+    ser.write(command + b"\r\n")
+    return ser.readline()
+
+
+@pytest.fixture(params=["pty", "socket"])
+def port(request, simulator):
+    if request.param == "pty":
+        return simulator.add_pty(weights=(1234,)).port
+    return simulator.add_socket(weights=(1234,)).port
+
+
+def test_answers_commands(port):
+    ser = serial.serial_for_url(port, timeout=1.0)
+    try:
+        assert ask(ser, b"IP") == b"=432100\r\n"
+        assert ask(ser, b"PU") == b"kg\r\n"
+        assert ask(ser, b"BOGUS") == ERROR_REPLY
+        ser.write(b"Z\r\n")  # no reply without ack
+        assert ask(ser, b"P") == b"=000000\r\n"
+        ser.write(b"200T\r\n")
+        assert ask(ser, b"PV") == weight_payload(-200).data + b"\r\n"
+        ser.write(b"\x1bR")
+        assert ser.readline().startswith(b"SPT-SIM,")
+        assert ask(ser, b"IP") == b"=432100\r\n"  # reset cleared zero and tare
+    finally:
+        ser.close()
+
+
+def test_respond_with_ack():
+    device = SimulatedDevice("scale", weights=(100,), ack=True)
+    assert device.respond(b"T", 0.0) == OK_REPLY
+    assert device.respond(b"IP", 0.0) == b"=000000\r\n"
+    assert device.respond(b"1U", 0.0) == OK_REPLY and device.respond(b"PU", 0.0) == b"kg\r\n"
+    assert device.respond(b"9U", 0.0) == ERROR_REPLY
+
+
+def test_commands_split_across_reads():
+    device = SimulatedDevice("scale")
+    assert device.commands_in(b"I") == []
+    assert device.commands_in(b"P\r\nP") == [b"IP"]
+    assert device.commands_in(b"U\n\x1bR") == [b"PU", b"ESC R"]
+
+
+def test_streams_without_being_asked(simulator):
+    device = simulator.add_pty(stream=50.0)
+    ser = serial.serial_for_url(device.port, timeout=1.0)
+    try:
+        frames = [ser.readline() for _ in range(5)]
+    finally:
+        ser.close()
+    assert frames == [b"=555500\r\n"] * 5
+
+
+def test_faults_are_injected():
+    device = SimulatedDevice("scale", faults={"drop": 1.0})
+    assert device.inject(b"=555500\r\n") == (None, 0.0, False)
+    assert device.stats()["faults"] == {"drop": 1}
+    assert parse_faults("drop=0.1,corrupt=0.2") == {"drop": 0.1, "corrupt": 0.2}
+    with pytest.raises(SimulatorError):
+        parse_faults("drop=0.6,corrupt=0.6")
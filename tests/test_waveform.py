@@ -0,0 +1,44 @@
+import pytest
+
+from serial_waveform import compile_waveform, build_frame_table, WaveformError, MAX_WEIGHT
+
+
+def test_segments_are_joined_in_order():
+    weights = compile_waveform("ramp(0, 100, 5) + const(7, 2) + step(1, 2, 2)")
+    assert list(weights) == [0, 25, 50, 75, 100, 7, 7, 1, 1, 2, 2]
+
+
+def test_weights_are_rounded_and_clamped():
+    assert list(compile_waveform("ramp(-10, 2000000, 2) + const(1.6, 1)")) == [0, MAX_WEIGHT, 2]
+
+
+def test_noise_is_repeatable_and_settle_ends_near_target():
+    assert compile_waveform("noise(5000, 20, 100)") == compile_waveform("noise(5000, 20, 100)")
+    assert compile_waveform("noise(5000, 20, 100, 1)") != compile_waveform("noise(5000, 20, 100, 2)")
+    settle = compile_waveform("settle(0, 1000, 50)")
+    assert settle[0] == 0 and abs(settle[-1] - 1000) <= 10
+
+
+def test_replay_reads_first_number_per_line(tmp_path):
+    path = tmp_path / "weights.csv"
+    path.write_text("time,weight\n1,250\nno number\n2,300.4\n")
+    assert list(compile_waveform(f"replay({path})")) == [1, 2]
+
+
+@pytest.mark.parametrize("spec", ["", "ramp(0,1)", "ramp(0,1,0)", "ramp(0,1,2.5)", "wobble(1,2)",
+                                  "const(a,2)", "ramp 0,1,2"])
+def test_bad_specs(spec):
+    with pytest.raises(WaveformError):
+        compile_waveform(spec)
+
+
+def test_frame_table_formats_each_weight_once():
+    calls = []
+
+    def make_frame(weight):
+        calls.append(weight)
+        return b"=%06d" % weight
+
+    table = build_frame_table(compile_waveform("step(1, 2, 3)"), make_frame)
+    assert table == (b"=000001",) * 3 + (b"=000002",) * 3
+    assert calls == [1, 2]